@@ -7,6 +7,8 @@ from routes.auth import auth_bp
 from routes.activities import activities_bp
 from routes.analytics import analytics_bp
 from routes.friends_routes import friends_bp
+from routes.webhooks import webhooks_bp
+from services.stats_views_service import StatsViewsService
 import os
 import traceback
 
@@ -25,6 +27,7 @@ def create_app():
     app.register_blueprint(activities_bp, url_prefix='/api/activities')
     app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
     app.register_blueprint(friends_bp)
+    app.register_blueprint(webhooks_bp, url_prefix='/webhooks')
     
     @app.route('/')
     def index():
@@ -38,7 +41,8 @@ def create_app():
                 'analytics': '/api/analytics',
                 'dashboard': '/dashboard/sport-km.html',
                 'friends': '/api/friends',
-                'friends_auth': '/auth/friends/exchange'
+                'friends_auth': '/auth/friends/exchange',
+                'strava_webhook': '/webhooks/strava'
             }
         })
     
@@ -167,5 +171,6 @@ if __name__ == '__main__':
     
     with app.app_context():
         db.create_all()
+        StatsViewsService().ensure_materialized()
     
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
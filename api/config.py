@@ -13,7 +13,68 @@ class Config:
     STRAVA_CLIENT_SECRET = os.environ.get('STRAVA_CLIENT_SECRET')
     STRAVA_REDIRECT_URI = os.environ.get('STRAVA_REDIRECT_URI')
     
+    # Nombre de requêtes détaillées Strava lancées en parallèle pendant l'enrichissement
+    STRAVA_DETAIL_FETCH_WORKERS = int(os.environ.get('STRAVA_DETAIL_FETCH_WORKERS', 4))
+    
+    # Limites de l'application Strava (resynchronisées avec les en-têtes X-RateLimit-*)
+    STRAVA_RATE_LIMIT_SHORT = int(os.environ.get('STRAVA_RATE_LIMIT_SHORT', 100))      # requêtes / 15 min
+    STRAVA_RATE_LIMIT_DAILY = int(os.environ.get('STRAVA_RATE_LIMIT_DAILY', 1000))     # requêtes / jour
+    STRAVA_RATE_LIMIT_RESERVE = int(os.environ.get('STRAVA_RATE_LIMIT_RESERVE', 5))    # marge non consommée
+    
+    # Session HTTP partagée (keep-alive, timeouts, retries 429/5xx)
+    STRAVA_HTTP_CONNECT_TIMEOUT = float(os.environ.get('STRAVA_HTTP_CONNECT_TIMEOUT', 5))
+    STRAVA_HTTP_READ_TIMEOUT = float(os.environ.get('STRAVA_HTTP_READ_TIMEOUT', 30))
+    STRAVA_HTTP_POOL_SIZE = int(os.environ.get('STRAVA_HTTP_POOL_SIZE', 10))
+    STRAVA_HTTP_MAX_RETRIES = int(os.environ.get('STRAVA_HTTP_MAX_RETRIES', 4))
+    
+    # File de synchronisation en arrière-plan (worker.py)
+    SYNC_WORKER_POLL_SECONDS = float(os.environ.get('SYNC_WORKER_POLL_SECONDS', 2))
+    SYNC_JOB_MAX_ATTEMPTS = int(os.environ.get('SYNC_JOB_MAX_ATTEMPTS', 3))
+    SYNC_JOB_STALE_SECONDS = int(os.environ.get('SYNC_JOB_STALE_SECONDS', 300))
+    SYNC_PAGE_MAX_RETRIES = int(os.environ.get('SYNC_PAGE_MAX_RETRIES', 5))               # erreurs transitoires
+    SYNC_PAGE_RETRY_BASE_SECONDS = float(os.environ.get('SYNC_PAGE_RETRY_BASE_SECONDS', 2))
+    
+    # Réconciliation périodique (activités modifiées / supprimées sur Strava)
+    SYNC_RECONCILE_DAYS = int(os.environ.get('SYNC_RECONCILE_DAYS', 30))
+    SYNC_RECONCILE_INTERVAL_HOURS = float(os.environ.get('SYNC_RECONCILE_INTERVAL_HOURS', 24))
+    SYNC_RECONCILE_CHECK_SECONDS = int(os.environ.get('SYNC_RECONCILE_CHECK_SECONDS', 600))
+    
+    # Webhook Strava (abonnement push)
+    STRAVA_WEBHOOK_VERIFY_TOKEN = os.environ.get('STRAVA_WEBHOOK_VERIFY_TOKEN')
+    STRAVA_WEBHOOK_SUBSCRIPTION_ID = int(os.environ.get('STRAVA_WEBHOOK_SUBSCRIPTION_ID', 0)) or None
+    
+    # Streams seconde par seconde (une requête Strava par activité)
+    STREAMS_INGEST_BATCH_SIZE = int(os.environ.get('STREAMS_INGEST_BATCH_SIZE', 100))
+    
+    # File des récupérations détails / streams classées par valeur (workers inoccupés)
+    FETCH_SCHEDULER_ENABLED = os.environ.get('FETCH_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    FETCH_SCHEDULER_BATCH_SIZE = int(os.environ.get('FETCH_SCHEDULER_BATCH_SIZE', 20))
+    FETCH_SCHEDULER_RETRY_SECONDS = int(os.environ.get('FETCH_SCHEDULER_RETRY_SECONDS', 3600))  # après un échec, doublé ensuite
+    FETCH_SCHEDULER_MAX_CLIENT_ERRORS = int(os.environ.get('FETCH_SCHEDULER_MAX_CLIENT_ERRORS', 3))  # 4xx avant abandon
+    
+    # Vues de statistiques matérialisées : REFRESH après ce délai sans écriture, au plus tard après le maximum
+    STATS_VIEWS_REFRESH_ENABLED = os.environ.get('STATS_VIEWS_REFRESH_ENABLED', 'true').lower() == 'true'
+    STATS_VIEWS_REFRESH_QUIET_SECONDS = int(os.environ.get('STATS_VIEWS_REFRESH_QUIET_SECONDS', 30))
+    STATS_VIEWS_REFRESH_MAX_DELAY_SECONDS = int(os.environ.get('STATS_VIEWS_REFRESH_MAX_DELAY_SECONDS', 300))
+    STATS_VIEWS_CHECK_SECONDS = int(os.environ.get('STATS_VIEWS_CHECK_SECONDS', 10))
+    
+    # Historique FTP : athlètes dont les métriques en attente sont recalculées par les workers inoccupés
+    FTP_RECOMPUTE_BATCH_ATHLETES = int(os.environ.get('FTP_RECOMPUTE_BATCH_ATHLETES', 20))
+    
+    # Archive compressée des réponses brutes Strava (re-dérivation sans appel API)
+    PAYLOAD_ARCHIVE_ENABLED = os.environ.get('PAYLOAD_ARCHIVE_ENABLED', 'true').lower() == 'true'
+    PAYLOAD_ARCHIVE_DIR = os.environ.get(
+        'PAYLOAD_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'raw')
+    )
+    
+    # Streams décodés sur disque, lus par mmap (analyses sur de nombreuses activités)
+    STREAM_STORE_ENABLED = os.environ.get('STREAM_STORE_ENABLED', 'true').lower() == 'true'
+    STREAM_STORE_DIR = os.environ.get(
+        'STREAM_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'streams')
+    )
+    
     # URLs Strava
     STRAVA_AUTHORIZE_URL = 'https://www.strava.com/oauth/authorize'
-    STRAVA_TOKEN_URL = 'https://www.strava.com/oauth/token'
-    STRAVA_API_BASE_URL = 'https://www.strava.com/api/v3'
\ No newline at end of file
+    # Surchargeables pour pointer vers le faux serveur (scripts/fake_strava_server.py)
+    STRAVA_TOKEN_URL = os.environ.get('STRAVA_TOKEN_URL', 'https://www.strava.com/oauth/token')
+    STRAVA_API_BASE_URL = os.environ.get('STRAVA_API_BASE_URL', 'https://www.strava.com/api/v3')
\ No newline at end of file
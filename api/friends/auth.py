@@ -1,6 +1,6 @@
 # Fichier: api/friends/auth.py
-import requests
 import os
+from services.http_client import get_strava_session
 from .models import save_friend_tokens
 
 def exchange_strava_code(code):
@@ -14,7 +14,7 @@ def exchange_strava_code(code):
         'grant_type': 'authorization_code'
     }
     
-    response = requests.post(token_url, data=payload)
+    response = get_strava_session().post(token_url, data=payload)
     
     if not response.ok:
         raise Exception(f"Erreur Strava: {response.status_code} - {response.text}")
@@ -0,0 +1,67 @@
+from datetime import datetime
+from models.database import db
+
+
+class ActivityClimb(db.Model):
+    """
+    Montée détectée dans une activité depuis les streams distance / altitude
+    (services/stream_analysis.py:detect_climbs), recherchable par athlète
+    """
+    __tablename__ = 'activity_climbs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), nullable=False)
+    climb_index = db.Column(db.Integer, nullable=False)         # Rang de la montée dans l'activité
+    
+    athlete_id = db.Column(db.Integer, nullable=False)
+    start_date_local = db.Column(db.DateTime, nullable=False)    # Filtres par période sans jointure
+    
+    start_distance_m = db.Column(db.Float, nullable=False)
+    end_distance_m = db.Column(db.Float, nullable=False)
+    length_m = db.Column(db.Float, nullable=False)
+    elevation_gain_m = db.Column(db.Float, nullable=False)
+    start_altitude_m = db.Column(db.Float)
+    end_altitude_m = db.Column(db.Float)
+    average_grade = db.Column(db.Float, nullable=False)          # %
+    max_grade = db.Column(db.Float)                              # % sur 100 m glissants
+    duration_s = db.Column(db.Integer)
+    vam = db.Column(db.Float)                                    # m/h
+    category = db.Column(db.String(2))                           # HC, 1 à 4, NULL si non classée
+    
+    # Pied et sommet (stream latlng, absent pour les activités sans GPS)
+    start_lat = db.Column(db.Float)
+    start_lng = db.Column(db.Float)
+    end_lat = db.Column(db.Float)
+    end_lng = db.Column(db.Float)
+    
+    calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('activity_id', 'climb_index', name='uq_activity_climbs_activity_index'),
+        db.Index('idx_activity_climbs_athlete_grade', 'athlete_id', 'average_grade'),
+        db.Index('idx_activity_climbs_athlete_gain', 'athlete_id', 'elevation_gain_m'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'activity_id': self.activity_id,
+            'climb_index': self.climb_index,
+            'start_date_local': self.start_date_local.isoformat() if self.start_date_local else None,
+            'start_distance_m': round(self.start_distance_m, 1),
+            'end_distance_m': round(self.end_distance_m, 1),
+            'length_m': round(self.length_m, 1),
+            'elevation_gain_m': round(self.elevation_gain_m, 1),
+            'start_altitude_m': round(self.start_altitude_m, 1) if self.start_altitude_m is not None else None,
+            'end_altitude_m': round(self.end_altitude_m, 1) if self.end_altitude_m is not None else None,
+            'average_grade': round(self.average_grade, 1),
+            'max_grade': round(self.max_grade, 1) if self.max_grade is not None else None,
+            'duration_s': self.duration_s,
+            'vam': round(self.vam) if self.vam is not None else None,
+            'category': self.category,
+            'start_latlng': [round(self.start_lat, 6), round(self.start_lng, 6)] if self.start_lat is not None else None,
+            'end_latlng': [round(self.end_lat, 6), round(self.end_lng, 6)] if self.end_lat is not None else None
+        }
+    
+    def __repr__(self):
+        return f'<ActivityClimb {self.activity_id}#{self.climb_index}: {self.length_m:.0f} m à {self.average_grade:.1f}%>'
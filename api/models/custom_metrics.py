@@ -15,20 +15,25 @@ class ActivityCustomMetrics(db.Model):
     
     # Paramètres utilisés pour les calculs
     user_ftp = db.Column(db.Integer, nullable=False)
+    ftp_version = db.Column(db.Integer)         # athlete_ftp_history.id utilisé (NULL : FTP imposé au calcul)
     user_weight = db.Column(db.Numeric(5, 2))
     
     # TSS et intensité personnalisés
+    normalized_power = db.Column(db.Integer)    # NP du stream watts, ou NP Strava (calculation_method)
     custom_tss = db.Column(db.Numeric(8, 2))
     intensity_factor = db.Column(db.Numeric(5, 4))
     training_load = db.Column(db.Numeric(8, 2))
+    load_duration_hours = db.Column(db.Float)   # durée retenue pour le TSS (streams : secondes en mouvement)
     
     # Records de puissance estimés
     best_1min_power = db.Column(db.Integer)
     best_5min_power = db.Column(db.Integer)
     best_20min_power = db.Column(db.Integer)
     
-    # Records de distance (temps en secondes)
+    # Records de distance (temps en secondes, meilleurs efforts depuis les streams)
+    best_400m_time = db.Column(db.Integer)
     best_1km_time = db.Column(db.Integer)
+    best_1mile_time = db.Column(db.Integer)
     best_5km_time = db.Column(db.Integer)
     best_10km_time = db.Column(db.Integer)
     best_half_marathon_time = db.Column(db.Integer)
@@ -36,7 +41,7 @@ class ActivityCustomMetrics(db.Model):
     
     # Métadonnées
     calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
-    calculation_method = db.Column(db.String(50), default='strava_based')
+    calculation_method = db.Column(db.String(50), default='strava_based')    # 'stream_np' ou 'strava_based'
     
     # Relations
     activity = db.relationship('ActivitySummary', backref='custom_metrics')
@@ -50,9 +55,11 @@ class ActivityCustomMetrics(db.Model):
             
             # Paramètres
             'user_ftp': self.user_ftp,
+            'ftp_version': self.ftp_version,
             'user_weight': float(self.user_weight) if self.user_weight else None,
             
             # Calculs personnalisés
+            'normalized_power': self.normalized_power,
             'custom_tss': float(self.custom_tss) if self.custom_tss else None,
             'intensity_factor': float(self.intensity_factor) if self.intensity_factor else None,
             'training_load': float(self.training_load) if self.training_load else None,
@@ -64,8 +71,12 @@ class ActivityCustomMetrics(db.Model):
             'best_20min_power': self.best_20min_power,
             
             # Records de distance
+            'best_400m_time': self.best_400m_time,
+            'best_400m_pace': self.format_pace(self.best_400m_time, 0.4) if self.best_400m_time else None,
             'best_1km_time': self.best_1km_time,
             'best_1km_pace': self.format_pace(self.best_1km_time, 1) if self.best_1km_time else None,
+            'best_1mile_time': self.best_1mile_time,
+            'best_1mile_pace': self.format_pace(self.best_1mile_time, 1.609) if self.best_1mile_time else None,
             'best_5km_time': self.best_5km_time,
             'best_5km_pace': self.format_pace(self.best_5km_time, 5) if self.best_5km_time else None,
             'best_10km_time': self.best_10km_time,
@@ -157,11 +168,21 @@ class ActivityCustomMetrics(db.Model):
         
         # Records de distance
         distance_records = {}
+        if self.best_400m_time:
+            distance_records['400m'] = {
+                'time_seconds': self.best_400m_time,
+                'pace': self.format_pace(self.best_400m_time, 0.4)
+            }
         if self.best_1km_time:
             distance_records['1km'] = {
                 'time_seconds': self.best_1km_time,
                 'pace': self.format_pace(self.best_1km_time, 1)
             }
+        if self.best_1mile_time:
+            distance_records['1mile'] = {
+                'time_seconds': self.best_1mile_time,
+                'pace': self.format_pace(self.best_1mile_time, 1.609)
+            }
         if self.best_5km_time:
             distance_records['5km'] = {
                 'time_seconds': self.best_5km_time,
@@ -172,6 +193,16 @@ class ActivityCustomMetrics(db.Model):
                 'time_seconds': self.best_10km_time,
                 'pace': self.format_pace(self.best_10km_time, 10)
             }
+        if self.best_half_marathon_time:
+            distance_records['half_marathon'] = {
+                'time_seconds': self.best_half_marathon_time,
+                'pace': self.format_pace(self.best_half_marathon_time, 21.1)
+            }
+        if self.best_marathon_time:
+            distance_records['marathon'] = {
+                'time_seconds': self.best_marathon_time,
+                'pace': self.format_pace(self.best_marathon_time, 42.2)
+            }
         
         if distance_records:
             summary['distance_records'] = distance_records
@@ -197,6 +228,9 @@ class AthleteSettings(db.Model):
     auto_update_ftp = db.Column(db.Boolean, default=True)
     ftp_test_detection = db.Column(db.Boolean, default=True)
     
+    # Premier jour d'activité dont les métriques peuvent utiliser une version de FTP périmée
+    ftp_dirty_from = db.Column(db.Date)
+    
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
@@ -208,6 +242,7 @@ class AthleteSettings(db.Model):
             'weight': float(self.weight) if self.weight else None,
             'auto_update_ftp': self.auto_update_ftp,
             'ftp_test_detection': self.ftp_test_detection,
+            'ftp_recompute_pending_from': self.ftp_dirty_from.isoformat() if self.ftp_dirty_from else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
@@ -304,4 +339,40 @@ class AthleteSettings(db.Model):
         return recommendations
     
     def __repr__(self):
-        return f'<AthleteSettings {self.athlete_id}: FTP={self.current_ftp}W>'
\ No newline at end of file
+        return f'<AthleteSettings {self.athlete_id}: FTP={self.current_ftp}W>'
+
+
+class AthleteFtpHistory(db.Model):
+    """
+    Historique des seuils d'un athlète : chaque ligne s'applique de effective_date
+    jusqu'à la ligne suivante (la plus ancienne s'applique aussi avant sa date)
+    Les lignes ne sont jamais modifiées : leur id sert de version de FTP
+    (activity_custom_metrics.ftp_version), une correction crée une nouvelle ligne
+    """
+    __tablename__ = 'athlete_ftp_history'
+    __table_args__ = (
+        db.UniqueConstraint('athlete_id', 'effective_date', name='uq_athlete_ftp_history_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    athlete_id = db.Column(db.Integer, nullable=False)
+    effective_date = db.Column(db.Date, nullable=False)
+    
+    ftp = db.Column(db.Integer, nullable=False)
+    threshold_heartrate = db.Column(db.Integer)
+    source = db.Column(db.String(20), default='manual')    # 'manual', 'settings', 'initial' (reprise des métriques)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'version': self.id,
+            'effective_date': self.effective_date.isoformat(),
+            'ftp': self.ftp,
+            'threshold_heartrate': self.threshold_heartrate,
+            'source': self.source,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<AthleteFtpHistory {self.athlete_id} {self.effective_date}: FTP={self.ftp}W>'
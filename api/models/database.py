@@ -68,6 +68,9 @@ class ActivitySummary(db.Model):
     max_heartrate = db.Column(db.Integer)
     calories = db.Column(db.Numeric(8, 2))
     
+    # Empreinte des champs modifiables sur Strava (détection des éditions)
+    sync_hash = db.Column(db.String(32))
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relations avec métriques (seront disponibles après imports)
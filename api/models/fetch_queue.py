@@ -0,0 +1,62 @@
+from datetime import datetime
+from models.database import db
+
+
+class ActivityView(db.Model):
+    """
+    Consultations d'une activité par l'utilisateur (streams, courbe de puissance...)
+    Une activité consultée récemment passe en tête de la file des récupérations Strava
+    """
+    __tablename__ = 'activity_views'
+    
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), primary_key=True)
+    athlete_id = db.Column(db.Integer, nullable=False)
+    
+    view_count = db.Column(db.Integer, nullable=False, default=1)
+    last_viewed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_activity_views_athlete', 'athlete_id', 'last_viewed_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'activity_id': self.activity_id,
+            'view_count': self.view_count,
+            'last_viewed_at': self.last_viewed_at.isoformat() if self.last_viewed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ActivityView {self.activity_id}: {self.view_count} vues>'
+
+
+class ActivityFetchFailure(db.Model):
+    """
+    Récupération Strava en échec (détail ou streams) : reportée avec un délai croissant,
+    abandonnée (next_retry_at NULL) après plusieurs erreurs 4xx (activité privée ou supprimée)
+    Persistée : un redémarrage de worker ne remet pas ces éléments en tête de file
+    """
+    __tablename__ = 'activity_fetch_failures'
+    
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)          # 'detail' ou 'streams'
+    athlete_id = db.Column(db.Integer, nullable=False)
+    
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    last_status = db.Column(db.Integer)                         # NULL : erreur réseau ou token
+    last_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_retry_at = db.Column(db.DateTime)                      # NULL : abandonnée
+    
+    def to_dict(self):
+        return {
+            'activity_id': self.activity_id,
+            'kind': self.kind,
+            'attempts': self.attempts,
+            'last_status': self.last_status,
+            'last_attempt_at': self.last_attempt_at.isoformat() if self.last_attempt_at else None,
+            'next_retry_at': self.next_retry_at.isoformat() if self.next_retry_at else None,
+            'abandoned': self.next_retry_at is None
+        }
+    
+    def __repr__(self):
+        return f'<ActivityFetchFailure {self.kind} {self.activity_id}: {self.attempts} échec(s)>'
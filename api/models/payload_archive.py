@@ -0,0 +1,27 @@
+from datetime import datetime
+from models.database import db
+
+class StravaRawPayload(db.Model):
+    """
+    Index de l'archive des réponses JSON brutes de Strava
+    Le contenu est stocké compressé sur disque (data/raw/objects), adressé par son SHA-256 :
+    une réponse identique récupérée plusieurs fois n'est écrite qu'une fois.
+    """
+    __tablename__ = 'strava_raw_payloads'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    strava_id = db.Column(db.BigInteger, nullable=False)      # strava_id de l'activité
+    owner_id = db.Column(db.BigInteger)                       # strava_id de l'athlète
+    kind = db.Column(db.String(20), nullable=False)           # summary, detail
+    sha256 = db.Column(db.String(64), nullable=False)
+    size_bytes = db.Column(db.Integer)                        # Taille compressée
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('strava_id', 'kind', 'sha256', name='uq_strava_raw_payload'),
+        db.Index('idx_strava_raw_payloads_lookup', 'strava_id', 'kind', 'fetched_at'),
+        db.Index('idx_strava_raw_payloads_owner', 'owner_id'),
+    )
+    
+    def __repr__(self):
+        return f'<StravaRawPayload {self.kind} {self.strava_id} ({self.sha256[:12]})>'
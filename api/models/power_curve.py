@@ -0,0 +1,68 @@
+from datetime import datetime
+from models.database import db
+
+class ActivityPowerCurve(db.Model):
+    """
+    Courbe de puissance moyenne maximale d'une activité (une ligne par durée)
+    Calculée depuis le stream watts (services/stream_analysis.py)
+    """
+    __tablename__ = 'activity_power_curve'
+    
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), primary_key=True)
+    duration_seconds = db.Column(db.Integer, primary_key=True)
+    
+    athlete_id = db.Column(db.Integer, nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)    # Fenêtres glissantes sans jointure
+    watts = db.Column(db.Integer, nullable=False)
+    
+    calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_activity_power_curve_athlete', 'athlete_id', 'duration_seconds', 'start_date'),
+    )
+    
+    def to_dict(self):
+        return {
+            'activity_id': self.activity_id,
+            'duration_seconds': self.duration_seconds,
+            'watts': self.watts,
+            'start_date': self.start_date.isoformat() if self.start_date else None
+        }
+    
+    def __repr__(self):
+        return f'<ActivityPowerCurve {self.activity_id}: {self.duration_seconds}s {self.watts}W>'
+
+
+class AthletePowerEnvelope(db.Model):
+    """
+    Enveloppe puissance-durée de l'athlète : meilleure puissance par durée et par fenêtre
+    (0 = historique complet, sinon N derniers jours) avec l'activité source
+    Mise à jour à l'ingestion, reconstruite à la suppression ou à l'expiration d'une source
+    """
+    __tablename__ = 'athlete_power_envelope'
+    
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athletes.id'), primary_key=True)
+    window_days = db.Column(db.Integer, primary_key=True)
+    duration_seconds = db.Column(db.Integer, primary_key=True)
+    
+    watts = db.Column(db.Integer, nullable=False)
+    activity_id = db.Column(db.Integer, nullable=False)    # Activité source (sans FK : reconstruite à la suppression)
+    start_date = db.Column(db.DateTime, nullable=False)    # Date de la source (expiration des fenêtres)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_athlete_power_envelope_activity', 'activity_id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'window_days': self.window_days,
+            'duration_seconds': self.duration_seconds,
+            'watts': self.watts,
+            'activity_id': self.activity_id,
+            'start_date': self.start_date.isoformat() if self.start_date else None
+        }
+    
+    def __repr__(self):
+        return f'<AthletePowerEnvelope {self.athlete_id} {self.window_days}j {self.duration_seconds}s: {self.watts}W>'
@@ -0,0 +1,26 @@
+from datetime import datetime
+from models.database import db
+
+class StravaRateLimitState(db.Model):
+    """
+    Budget de requêtes Strava partagé entre tous les processus (workers gunicorn, synchroniseurs)
+    Une ligne par application Strava, verrouillée avec SELECT ... FOR UPDATE à chaque requête
+    """
+    __tablename__ = 'strava_rate_limit'
+    
+    bucket = db.Column(db.String(50), primary_key=True)
+    
+    # Fenêtre courte Strava (15 minutes alignées sur :00, :15, :30, :45)
+    short_window_start = db.Column(db.DateTime, nullable=False)
+    short_count = db.Column(db.Integer, nullable=False, default=0)
+    short_limit = db.Column(db.Integer, nullable=False, default=100)
+    
+    # Fenêtre journalière Strava (remise à zéro à minuit UTC)
+    daily_window_start = db.Column(db.DateTime, nullable=False)
+    daily_count = db.Column(db.Integer, nullable=False, default=0)
+    daily_limit = db.Column(db.Integer, nullable=False, default=1000)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StravaRateLimitState {self.bucket}: {self.short_count}/{self.short_limit} (15min), {self.daily_count}/{self.daily_limit} (jour)>'
@@ -0,0 +1,40 @@
+from datetime import datetime
+from models.database import db
+
+# Granularités des agrégats : period_start = jour, lundi de la semaine ou 1er du mois
+ROLLUP_PERIODS = ('day', 'week', 'month')
+
+
+class AthleteActivityRollup(db.Model):
+    """
+    Agrégats d'activités par athlète, période et type de sport
+    Tenus à jour à chaque écriture d'activité ou de TSS (services/rollup_service.py) :
+    les lectures du tableau de bord ne parcourent plus activity_summary
+    """
+    __tablename__ = 'athlete_activity_rollups'
+    
+    athlete_id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(5), primary_key=True)
+    period_start = db.Column(db.Date, primary_key=True)
+    activity_type = db.Column(db.String(50), primary_key=True)
+    
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+    distance_km = db.Column(db.Float, nullable=False, default=0)
+    moving_hours = db.Column(db.Float, nullable=False, default=0)
+    elevation_m = db.Column(db.Float, nullable=False, default=0)
+    tss = db.Column(db.Float, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'activity_type': self.activity_type,
+            'activities': self.activity_count,
+            'distance_km': round(self.distance_km, 2),
+            'moving_hours': round(self.moving_hours, 2),
+            'elevation_m': round(self.elevation_m),
+            'tss': round(self.tss, 1)
+        }
+    
+    def __repr__(self):
+        return f'<AthleteActivityRollup {self.athlete_id} {self.period} {self.period_start} {self.activity_type}>'
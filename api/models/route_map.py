@@ -0,0 +1,78 @@
+from datetime import datetime
+from models.database import db
+
+# Niveau de zoom de l'index spatial (tuiles d'environ 2,4 km à l'équateur, 1,7 km à 45°)
+ROUTE_INDEX_ZOOM = 14
+
+
+class ActivityRoute(db.Model):
+    """
+    Tracé d'une activité (map.summary_polyline des résumés Strava)
+    La polyline est décodée une fois en int32 [lat, lng] entrelacés (services/geo.py)
+    """
+    __tablename__ = 'activity_routes'
+    
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), primary_key=True)
+    athlete_id = db.Column(db.Integer, nullable=False, index=True)
+    
+    summary_polyline = db.Column(db.Text, nullable=False)
+    coords = db.Column(db.LargeBinary, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    
+    # Emprise du tracé (requêtes sur de grandes zones sans passer par les tuiles)
+    min_lat = db.Column(db.Float, nullable=False)
+    min_lng = db.Column(db.Float, nullable=False)
+    max_lat = db.Column(db.Float, nullable=False)
+    max_lng = db.Column(db.Float, nullable=False)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'activity_id': self.activity_id,
+            'summary_polyline': self.summary_polyline,
+            'point_count': self.point_count,
+            'bbox': [self.min_lat, self.min_lng, self.max_lat, self.max_lng]
+        }
+    
+    def __repr__(self):
+        return f'<ActivityRoute {self.activity_id}: {self.point_count} points>'
+
+
+class ActivityRouteTile(db.Model):
+    """Index spatial : une ligne par tuile (zoom ROUTE_INDEX_ZOOM) traversée par un tracé"""
+    __tablename__ = 'activity_route_tiles'
+    
+    athlete_id = db.Column(db.Integer, primary_key=True)
+    tile_x = db.Column(db.Integer, primary_key=True)
+    tile_y = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), primary_key=True)
+    
+    __table_args__ = (
+        db.Index('idx_activity_route_tiles_activity', 'activity_id'),
+    )
+    
+    def __repr__(self):
+        return f'<ActivityRouteTile {ROUTE_INDEX_ZOOM}/{self.tile_x}/{self.tile_y}: {self.activity_id}>'
+
+
+class AthleteHeatmapTile(db.Model):
+    """
+    Tuile de heatmap d'un athlète (PNG 256x256 pré-calculé)
+    Invalidée quand un tracé qui la traverse est ajouté, modifié ou supprimé
+    """
+    __tablename__ = 'athlete_heatmap_tiles'
+    
+    athlete_id = db.Column(db.Integer, primary_key=True)
+    zoom = db.Column(db.Integer, primary_key=True)
+    tile_x = db.Column(db.Integer, primary_key=True)
+    tile_y = db.Column(db.Integer, primary_key=True)
+    
+    png = db.Column(db.LargeBinary, nullable=False)
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+    max_count = db.Column(db.Integer, nullable=False, default=0)     # Passages sur le pixel le plus fréquenté
+    
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AthleteHeatmapTile {self.athlete_id} {self.zoom}/{self.tile_x}/{self.tile_y}: {self.activity_count} activités>'
@@ -0,0 +1,43 @@
+from datetime import datetime
+from models.database import db
+
+
+class StatsViewRefresh(db.Model):
+    """
+    Dernier REFRESH d'une vue matérialisée de statistiques (services/stats_views_service.py)
+    Écrite uniquement par le worker qui rafraîchit : les écritures d'activités ne touchent
+    que le journal stats_view_changes
+    """
+    __tablename__ = 'stats_view_refresh'
+    
+    view_name = db.Column(db.String(64), primary_key=True)
+    
+    last_refreshed_at = db.Column(db.DateTime)
+    last_refresh_ms = db.Column(db.Float)
+    refresh_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'view': self.view_name,
+            'last_refreshed_at': self.last_refreshed_at.isoformat() if self.last_refreshed_at else None,
+            'last_refresh_ms': round(self.last_refresh_ms, 1) if self.last_refresh_ms is not None else None,
+            'refresh_count': self.refresh_count
+        }
+    
+    def __repr__(self):
+        return f'<StatsViewRefresh {self.view_name}: {self.refresh_count} REFRESH>'
+
+
+class StatsViewChange(db.Model):
+    """
+    Journal des écritures pas encore reflétées par les vues matérialisées : une ligne
+    insérée par transaction d'écriture (aucune ligne partagée entre les workers),
+    supprimée par le REFRESH qui l'a prise en compte
+    """
+    __tablename__ = 'stats_view_changes'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StatsViewChange {self.id} {self.changed_at}>'
@@ -11,7 +11,7 @@ class ActivityStravaMetrics(db.Model):
     __tablename__ = 'activity_strava_metrics'
     
     id = db.Column(db.Integer, primary_key=True)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), nullable=False, unique=True)
     
     # 💪 Données de puissance natives Strava
     average_watts = db.Column(db.Numeric(6, 1))                 # Puissance moyenne
@@ -0,0 +1,44 @@
+from datetime import datetime
+from models.database import db
+
+class ActivityStreams(db.Model):
+    """
+    Streams Strava seconde par seconde (puissance, FC, cadence, altitude, distance...)
+    stockés en tableaux typés compressés (services/stream_codec.py), relus en NumPy
+    """
+    __tablename__ = 'activity_streams'
+    
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), primary_key=True)
+    strava_id = db.Column(db.BigInteger, nullable=False)
+    
+    # Vide (sample_count = 0) pour les activités sans streams (saisie manuelle) : pas de nouvel appel
+    data = db.Column(db.LargeBinary)
+    stream_types = db.Column(db.String(200))        # 'time,watts,heartrate,...'
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    json_size_bytes = db.Column(db.Integer)          # Taille de la réponse JSON Strava
+    stored_size_bytes = db.Column(db.Integer)
+    
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relations
+    activity = db.relationship('ActivitySummary', backref=db.backref('streams', uselist=False))
+    
+    def get_types(self):
+        return self.stream_types.split(',') if self.stream_types else []
+    
+    def to_dict(self):
+        return {
+            'activity_id': self.activity_id,
+            'strava_id': self.strava_id,
+            'stream_types': self.get_types(),
+            'sample_count': self.sample_count,
+            'json_size_bytes': self.json_size_bytes,
+            'stored_size_bytes': self.stored_size_bytes,
+            'compression_ratio': round(self.json_size_bytes / self.stored_size_bytes, 1)
+                if self.json_size_bytes and self.stored_size_bytes else None,
+            'fetched_at': self.fetched_at.isoformat() if self.fetched_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ActivityStreams {self.activity_id}: {self.sample_count} échantillons ({self.stored_size_bytes} o)>'
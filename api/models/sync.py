@@ -0,0 +1,107 @@
+from datetime import datetime
+from models.database import db
+
+class SyncJob(db.Model):
+    """
+    File de travaux de synchronisation en arrière-plan
+    Les workers (un ou plusieurs nœuds) se partagent les jobs avec SELECT ... FOR UPDATE SKIP LOCKED
+    """
+    __tablename__ = 'sync_jobs'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athletes.id'), nullable=False)
+    job_type = db.Column(db.String(30), nullable=False, default='athlete_sync')
+    payload = db.Column(db.JSON)
+    
+    # queued -> running -> completed | failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)   # Report après échec
+    worker_id = db.Column(db.String(100))
+    
+    # Progression
+    pages_fetched = db.Column(db.Integer, nullable=False, default=0)
+    activities_inserted = db.Column(db.Integer, nullable=False, default=0)
+    activities_enriched = db.Column(db.Integer, nullable=False, default=0)
+    
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('idx_sync_jobs_claim', 'status', 'run_after', 'created_at'),
+        db.Index('idx_sync_jobs_athlete', 'athlete_id', 'job_type', 'status'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'athlete_id': self.athlete_id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'progress': {
+                'pages_fetched': self.pages_fetched,
+                'activities_inserted': self.activities_inserted,
+                'activities_enriched': self.activities_enriched
+            },
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<SyncJob {self.id}: {self.job_type} athlete={self.athlete_id} ({self.status})>'
+
+class AthleteSyncState(db.Model):
+    """
+    Curseur persistant de synchronisation incrémentale par athlète
+    """
+    __tablename__ = 'athlete_sync_state'
+    
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athletes.id'), primary_key=True)
+    
+    # Epoch (UTC) de la dernière activité vue : paramètre 'after' de la prochaine sync
+    last_after_epoch = db.Column(db.BigInteger)
+    last_page = db.Column(db.Integer)                # Dernière page validée (checkpoint)
+    # Curseur de départ d'une synchronisation en cours : non NULL tant qu'elle n'est pas terminée
+    resume_after_epoch = db.Column(db.BigInteger)
+    
+    last_run_started_at = db.Column(db.DateTime)
+    last_run_duration_seconds = db.Column(db.Float)
+    last_success_at = db.Column(db.DateTime)
+    last_reconcile_at = db.Column(db.DateTime)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def get_or_create(cls, athlete_id):
+        """Récupérer l'état de synchronisation d'un athlète (créé si absent)"""
+        state = cls.query.get(athlete_id)
+        if not state:
+            state = cls(athlete_id=athlete_id)
+            db.session.add(state)
+            db.session.flush()
+        return state
+    
+    def to_dict(self):
+        return {
+            'athlete_id': self.athlete_id,
+            'last_after_epoch': self.last_after_epoch,
+            'last_page': self.last_page,
+            'resume_after_epoch': self.resume_after_epoch,
+            'last_run_started_at': self.last_run_started_at.isoformat() if self.last_run_started_at else None,
+            'last_run_duration_seconds': self.last_run_duration_seconds,
+            'last_success_at': self.last_success_at.isoformat() if self.last_success_at else None,
+            'last_reconcile_at': self.last_reconcile_at.isoformat() if self.last_reconcile_at else None
+        }
+    
+    def __repr__(self):
+        return f'<AthleteSyncState athlete={self.athlete_id} after={self.last_after_epoch}>'
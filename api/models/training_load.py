@@ -0,0 +1,53 @@
+from datetime import datetime
+from models.database import db
+
+# Constantes de temps des moyennes exponentielles (jours) : forme (CTL) et fatigue (ATL)
+CTL_DAYS = 42
+ATL_DAYS = 7
+
+
+class AthleteDailyLoad(db.Model):
+    """
+    Charge quotidienne d'un athlète : TSS du jour et moyennes exponentielles
+    CTL (fitness), ATL (fatigue), TSB (forme = CTL - ATL de la veille)
+    Une ligne par jour, du premier jour d'activité à aujourd'hui, sans trou
+    """
+    __tablename__ = 'athlete_daily_load'
+    
+    athlete_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    
+    tss = db.Column(db.Float, nullable=False, default=0)
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+    ctl = db.Column(db.Float, nullable=False)
+    atl = db.Column(db.Float, nullable=False)
+    tsb = db.Column(db.Float, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'date': self.day.isoformat(),
+            'tss': round(self.tss, 1),
+            'activities': self.activity_count,
+            'ctl': round(self.ctl, 1),
+            'atl': round(self.atl, 1),
+            'tsb': round(self.tsb, 1)
+        }
+    
+    def __repr__(self):
+        return f'<AthleteDailyLoad {self.athlete_id} {self.day}: CTL {self.ctl:.1f} ATL {self.atl:.1f}>'
+
+
+class AthleteLoadState(db.Model):
+    """
+    Avancement de la série de charge d'un athlète : dernier jour calculé et premier
+    jour à recalculer (TSS modifié, activité ajoutée ou supprimée)
+    """
+    __tablename__ = 'athlete_load_state'
+    
+    athlete_id = db.Column(db.Integer, primary_key=True)
+    computed_through = db.Column(db.Date)
+    dirty_from = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AthleteLoadState {self.athlete_id}: {self.computed_through}, à recalculer depuis {self.dirty_from}>'
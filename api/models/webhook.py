@@ -0,0 +1,62 @@
+from datetime import datetime
+from models.database import db
+
+class StravaWebhookEvent(db.Model):
+    """
+    Événements reçus de l'abonnement push Strava (webhook)
+    Enregistrés tels quels à la réception puis traités par les workers (job 'webhook_event')
+    """
+    __tablename__ = 'strava_webhook_events'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    subscription_id = db.Column(db.BigInteger)
+    
+    object_type = db.Column(db.String(20), nullable=False)    # activity, athlete
+    object_id = db.Column(db.BigInteger, nullable=False)      # strava_id de l'activité ou de l'athlète
+    aspect_type = db.Column(db.String(20), nullable=False)    # create, update, delete
+    owner_id = db.Column(db.BigInteger, nullable=False)       # strava_id de l'athlète
+    updates = db.Column(db.JSON)
+    event_time = db.Column(db.BigInteger, nullable=False)     # epoch Strava
+    
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athletes.id'))
+    job_id = db.Column(db.BigInteger)
+    
+    # received -> queued -> processed | ignored | failed
+    status = db.Column(db.String(20), nullable=False, default='received')
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        # Strava renvoie l'événement s'il n'est pas acquitté en 2 s : dédoublonnage
+        db.UniqueConstraint('object_type', 'object_id', 'aspect_type', 'event_time',
+                            name='uq_strava_webhook_event'),
+        db.Index('idx_strava_webhook_events_status', 'status', 'received_at'),
+    )
+    
+    def is_deauthorization(self):
+        """Révocation de l'accès de l'application par l'athlète"""
+        return self.object_type == 'athlete' and str((self.updates or {}).get('authorized', '')).lower() == 'false'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'object_type': self.object_type,
+            'object_id': self.object_id,
+            'aspect_type': self.aspect_type,
+            'owner_id': self.owner_id,
+            'updates': self.updates,
+            'event_time': self.event_time,
+            'athlete_id': self.athlete_id,
+            'job_id': self.job_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'received_at': self.received_at.isoformat() if self.received_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<StravaWebhookEvent {self.id}: {self.object_type} {self.aspect_type} {self.object_id}>'
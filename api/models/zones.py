@@ -0,0 +1,53 @@
+from datetime import datetime
+from models.database import db
+
+# Bornes hautes des zones en fraction du seuil (FTP, FC max) - zone 5 au-delà
+POWER_ZONE_FRACTIONS = (0.55, 0.75, 0.90, 1.05)
+HEARTRATE_ZONE_FRACTIONS = (0.68, 0.83, 0.94, 1.05)
+
+ZONE_COLUMNS = ['zone_1_seconds', 'zone_2_seconds', 'zone_3_seconds', 'zone_4_seconds', 'zone_5_seconds']
+
+
+class ActivityZoneTime(db.Model):
+    """
+    Temps passé dans chaque zone (puissance ou FC) d'une activité, en secondes
+    Calculé depuis les streams avec les seuils de l'athlète (services/zones_service.py) :
+    zones de puissance d'après le FTP en vigueur à la date de l'activité (historique FTP)
+    """
+    __tablename__ = 'activity_zone_time'
+    
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity_summary.id'), primary_key=True)
+    zone_type = db.Column(db.String(10), primary_key=True)    # 'power' ou 'heartrate'
+    
+    athlete_id = db.Column(db.Integer, nullable=False)
+    start_date_local = db.Column(db.DateTime, nullable=False)    # Agrégats semaine/mois sans jointure
+    threshold = db.Column(db.Integer, nullable=False)            # FTP ou FC max utilisé
+    ftp_version = db.Column(db.Integer)                          # athlete_ftp_history.id (zones de puissance)
+    
+    zone_1_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone_2_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone_3_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone_4_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone_5_seconds = db.Column(db.Integer, nullable=False, default=0)
+    
+    calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_activity_zone_time_athlete', 'athlete_id', 'zone_type', 'start_date_local'),
+    )
+    
+    def get_seconds(self):
+        return [getattr(self, column) for column in ZONE_COLUMNS]
+    
+    def to_dict(self):
+        return {
+            'activity_id': self.activity_id,
+            'zone_type': self.zone_type,
+            'threshold': self.threshold,
+            'ftp_version': self.ftp_version,
+            'zones_seconds': self.get_seconds(),
+            'calculated_at': self.calculated_at.isoformat() if self.calculated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ActivityZoneTime {self.activity_id} {self.zone_type}: {self.get_seconds()}>'
@@ -1,9 +1,19 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from models.database import db, Athlete, ActivitySummary
 from models.strava_metrics import ActivityStravaMetrics
 from models.custom_metrics import ActivityCustomMetrics, AthleteSettings
+from models.sync import AthleteSyncState
 from services.strava_service import StravaService
 from services.custom_calculations import CustomCalculationsService
+from services.sync_queue import SyncQueueService
+from services.streams_service import StreamsService
+from services.power_curve_service import PowerCurveService
+from services.zones_service import ZonesService
+from services.climbs_service import ClimbsService, CLIMB_SORTS
+from services.training_load_service import TrainingLoadService
+from services.ftp_history_service import FtpHistoryService
+from services.fetch_scheduler import FetchScheduler
+from services.route_map_service import RouteMapService, HEATMAP_MAX_ZOOM
 from sqlalchemy import and_, func, desc
 from datetime import datetime, timedelta
 
@@ -107,28 +117,149 @@ def get_athlete_activities(athlete_id):
 
 @activities_bp.route('/athlete/<int:athlete_id>/sync')
 def sync_athlete_activities(athlete_id):
-    """Synchronisation enrichie des activités avec métriques Strava"""
+    """Mettre en file la synchronisation enrichie (exécutée par worker.py)"""
     athlete = Athlete.query.get(athlete_id)
     if not athlete:
         return jsonify({'error': 'Athlete not found'}), 404
     
     try:
-        strava_service = StravaService()
-        result = strava_service.sync_athlete_activities(athlete_id)
+        job = SyncQueueService().enqueue(athlete_id)
         
-        if 'error' in result:
-            return jsonify(result), 400
+        return jsonify({
+            'message': 'Synchronisation enrichie mise en file',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/activities/sync-jobs/{job.id}',
+            'athlete': f"{athlete.firstname} {athlete.lastname}"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/reconcile')
+def reconcile_athlete_activities(athlete_id):
+    """Mettre en file une réconciliation (activités modifiées / supprimées sur les N derniers jours)"""
+    athlete = Athlete.query.get(athlete_id)
+    if not athlete:
+        return jsonify({'error': 'Athlete not found'}), 404
+    
+    try:
+        days = request.args.get('days', type=int)
+        job = SyncQueueService().enqueue(
+            athlete_id,
+            job_type='athlete_reconcile',
+            payload={'days': days} if days else None
+        )
         
         return jsonify({
-            'message': 'Synchronisation enrichie terminée',
-            'synchronized_activities': result['synchronized_activities'],
-            'enriched_activities': result.get('enriched_activities', 0),
+            'message': 'Réconciliation mise en file',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/activities/sync-jobs/{job.id}',
             'athlete': f"{athlete.firstname} {athlete.lastname}"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/sync-state')
+def get_athlete_sync_state(athlete_id):
+    """Curseur et horodatages de la synchronisation incrémentale"""
+    try:
+        state = AthleteSyncState.query.get(athlete_id)
+        if not state:
+            return jsonify({'error': 'No sync state for this athlete'}), 404
+        
+        return jsonify(state.to_dict())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/streams/ingest')
+def ingest_athlete_streams(athlete_id):
+    """Mettre en file la récupération des streams des activités qui n'en ont pas encore"""
+    athlete = Athlete.query.get(athlete_id)
+    if not athlete:
+        return jsonify({'error': 'Athlete not found'}), 404
+    
+    try:
+        job = SyncQueueService().enqueue(athlete_id, job_type='streams_ingest')
+        
+        return jsonify({
+            'message': 'Récupération des streams mise en file',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/activities/sync-jobs/{job.id}',
+            'streams': StreamsService.get_athlete_streams_stats(athlete_id)
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/<int:activity_id>/streams')
+def get_activity_streams(activity_id):
+    """Streams d'une activité (?types=watts,heartrate&step=5 pour sous-échantillonner)"""
+    try:
+        types = request.args.get('types')
+        step = max(1, request.args.get('step', 1, type=int))
+        
+        # Activité consultée : ses streams passent en tête de la file s'ils manquent encore
+        activity = ActivitySummary.query.get(activity_id)
+        if activity:
+            FetchScheduler.record_view(activity)
+        
+        streams = StreamsService.load_streams(activity_id, types.split(',') if types else None)
+        if streams is None:
+            return jsonify({'error': 'Streams not fetched yet'}), 404
+        
+        return jsonify({
+            'activity_id': activity_id,
+            'step': step,
+            'streams': {name: values[::step].tolist() for name, values in streams.items()}
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@activities_bp.route('/<int:activity_id>/viewed', methods=['POST'])
+def record_activity_view(activity_id):
+    """Signaler une consultation (pages qui n'appellent pas les endpoints streams / courbe)"""
+    activity = ActivitySummary.query.get(activity_id)
+    if not activity:
+        return jsonify({'error': 'Activity not found'}), 404
+    
+    try:
+        FetchScheduler.record_view(activity)
+        return jsonify({'activity_id': activity_id, 'status': 'recorded'})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/fetch-queue')
+def get_fetch_queue():
+    """File des récupérations détails / streams : contenu classé, budget et temps estimé (?athlete_id=)"""
+    try:
+        athlete_id = request.args.get('athlete_id', type=int)
+        top = min(100, max(1, request.args.get('top', 10, type=int)))
+        
+        return jsonify(FetchScheduler().get_queue_status(athlete_id, top))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/sync-jobs/<int:job_id>')
+def get_sync_job_status(job_id):
+    """Statut et progression d'un job de synchronisation"""
+    try:
+        job = SyncQueueService.get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job.to_dict())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @activities_bp.route('/athlete/<int:athlete_id>/summary')
 def get_athlete_summary(athlete_id):
     """Résumé complet d'un athlète avec métriques avancées"""
@@ -319,7 +450,9 @@ def set_athlete_settings(athlete_id):
         # Récupérer ou créer les paramètres
         settings = AthleteSettings.query.get(athlete_id)
         if settings:
-            settings.current_ftp = ftp
+            if ftp != settings.current_ftp:
+                # Nouveau FTP à partir d'aujourd'hui : les activités passées gardent le leur
+                FtpHistoryService().set_ftp(athlete_id, ftp, source='settings')
             settings.max_heartrate = data.get('max_heartrate')
             settings.resting_heartrate = data.get('resting_heartrate')
             settings.weight = data.get('weight')
@@ -352,13 +485,12 @@ def calculate_custom_metrics(athlete_id):
         if not athlete:
             return jsonify({'error': 'Athlete not found'}), 404
         
-        # Récupérer FTP depuis paramètres ou requête
+        # FTP de l'historique à la date de chaque activité ; un FTP passé dans la requête
+        # devient celui de tout l'historique (même résultat que update-ftp + recalculate_all)
         data = request.get_json() if request.is_json else {}
         user_ftp = data.get('ftp')
-        
-        if not user_ftp:
-            settings = AthleteSettings.query.get(athlete_id)
-            user_ftp = settings.current_ftp if settings else 245
+        if user_ftp is not None and (not isinstance(user_ftp, int) or user_ftp <= 0):
+            return jsonify({'error': 'FTP doit être un entier positif'}), 400
         
         # Lancer les calculs
         calc_service = CustomCalculationsService()
@@ -368,6 +500,7 @@ def calculate_custom_metrics(athlete_id):
             'message': 'Calculs personnalisés terminés',
             'athlete': f"{athlete.firstname} {athlete.lastname}",
             'ftp_used': user_ftp,
+            'ftp_history': [entry.to_dict() for entry in FtpHistoryService().get_history(athlete_id)],
             'results': result
         })
         
@@ -383,6 +516,7 @@ def get_custom_metrics(athlete_id):
         per_page = min(request.args.get('per_page', 50, type=int), 200)
         year = request.args.get('year', type=int)
         month = request.args.get('month', type=int)
+        CustomCalculationsService().ensure_ftp_current(athlete_id)
         
         # Requête avec jointures
         query = db.session.query(ActivitySummary, ActivityStravaMetrics, ActivityCustomMetrics)\
@@ -463,6 +597,7 @@ def get_training_summary_custom(athlete_id):
     try:
         days = request.args.get('days', 30, type=int)
         cutoff_date = datetime.utcnow() - timedelta(days=days)
+        CustomCalculationsService().ensure_ftp_current(athlete_id)
         
         # Statistiques avec métriques personnalisées
         stats = db.session.query(
@@ -615,6 +750,7 @@ def get_training_load_analysis(athlete_id):
         days = request.args.get('days', 90, type=int)
         
         calc_service = CustomCalculationsService()
+        calc_service.ensure_ftp_current(athlete_id)
         analysis = calc_service.get_training_load_analysis(athlete_id, days)
         
         if not analysis:
@@ -628,6 +764,39 @@ def get_training_load_analysis(athlete_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@activities_bp.route('/athlete/<int:athlete_id>/training-load/daily')
+def get_daily_training_load(athlete_id):
+    """
+    Série quotidienne CTL (fitness) / ATL (fatigue) / TSB (forme)
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD ou ?days=365 (tout l'historique sans paramètre)
+    """
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        days = request.args.get('days', type=int)
+        try:
+            start_day = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+            end_day = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+        except ValueError:
+            return jsonify({'error': 'start et end au format YYYY-MM-DD'}), 400
+        if start_day is None and days:
+            start_day = (end_day or datetime.utcnow().date()) - timedelta(days=days - 1)
+        CustomCalculationsService().ensure_ftp_current(athlete_id)
+        
+        series = TrainingLoadService().get_range(athlete_id, start_day, end_day)
+        
+        return jsonify({
+            'athlete_id': athlete_id,
+            'start': series[0]['date'] if series else None,
+            'end': series[-1]['date'] if series else None,
+            'days': len(series),
+            'current': TrainingLoadService().get_current(athlete_id),
+            'series': series
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @activities_bp.route('/athlete/<int:athlete_id>/compare-tss')
 def compare_tss_metrics(athlete_id):
     """Comparer TSS personnel vs Strava"""
@@ -635,6 +804,7 @@ def compare_tss_metrics(athlete_id):
         limit = request.args.get('limit', 20, type=int)
         
         calc_service = CustomCalculationsService()
+        calc_service.ensure_ftp_current(athlete_id)
         comparison = calc_service.compare_with_strava_metrics(athlete_id, limit)
         
         if not comparison:
@@ -668,10 +838,10 @@ def detect_ftp_tests(athlete_id):
 
 @activities_bp.route('/athlete/<int:athlete_id>/power-curve')
 def get_power_curve(athlete_id):
-    """Courbe de puissance de l'athlète"""
+    """Courbe de puissance de l'athlète (?days=90 pour une fenêtre glissante)"""
     try:
         calc_service = CustomCalculationsService()
-        power_curve = calc_service.get_power_curve_data(athlete_id)
+        power_curve = calc_service.get_power_curve_data(athlete_id, request.args.get('days', type=int))
         
         if not power_curve:
             return jsonify({
@@ -684,6 +854,254 @@ def get_power_curve(athlete_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@activities_bp.route('/athlete/<int:athlete_id>/power-curve/recompute', methods=['POST'])
+def recompute_power_curves(athlete_id):
+    """
+    Calculer les courbes de puissance des activités dont les streams sont déjà stockés
+    puis reconstruire l'enveloppe de l'athlète
+    """
+    try:
+        power_curve_service = PowerCurveService()
+        computed = power_curve_service.compute_missing_for_athlete(athlete_id)
+        power_curve_service.rebuild_envelope(athlete_id)
+        db.session.commit()
+        
+        return jsonify({
+            'message': f'{computed} courbes de puissance calculées',
+            'activities_computed': computed
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/zones/distribution')
+def get_zone_distribution(athlete_id):
+    """Temps par zone (puissance ou FC) agrégé par semaine ou par mois"""
+    try:
+        period = request.args.get('period', 'week')
+        days = request.args.get('days', 90, type=int)
+        zone_type = request.args.get('type', 'power')
+        
+        if period not in ('week', 'month') or zone_type not in ('power', 'heartrate'):
+            return jsonify({'error': 'period doit valoir week ou month, type power ou heartrate'}), 400
+        
+        return jsonify({
+            'period': period,
+            'days': days,
+            'zone_type': zone_type,
+            'distribution': ZonesService.get_zone_distribution(athlete_id, period, days, zone_type)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/zones/recompute', methods=['POST'])
+def recompute_zones(athlete_id):
+    """Calculer les temps en zones manquants ou calculés avec d'anciens seuils (?all=true : tout)"""
+    try:
+        only_stale = request.args.get('all', 'false').lower() != 'true'
+        computed = ZonesService().recompute_for_athlete(athlete_id, only_stale=only_stale)
+        
+        return jsonify({
+            'message': f'{computed} activités analysées par zone',
+            'activities_computed': computed
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/stream-metrics/recompute', methods=['POST'])
+def recompute_stream_metrics(athlete_id):
+    """Recalculer NP / TSS / IF depuis les streams watts pour tout l'historique"""
+    try:
+        started = datetime.utcnow()
+        updated = CustomCalculationsService().recompute_stream_metrics(athlete_id)
+        
+        return jsonify({
+            'message': f'{updated} activités recalculées depuis les streams',
+            'activities_updated': updated,
+            'duration_seconds': round((datetime.utcnow() - started).total_seconds(), 2)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/distance-records/recompute', methods=['POST'])
+def recompute_distance_records(athlete_id):
+    """Recalculer les meilleurs efforts (400 m -> marathon) des courses dont les streams sont stockés"""
+    try:
+        updated = CustomCalculationsService().recompute_distance_records(athlete_id)
+        
+        return jsonify({
+            'message': f'{updated} activités analysées',
+            'activities_analyzed': updated
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/<int:activity_id>/power-curve')
+def get_activity_power_curve(activity_id):
+    """Courbe de puissance moyenne maximale d'une activité"""
+    try:
+        activity = ActivitySummary.query.get(activity_id)
+        if activity:
+            FetchScheduler.record_view(activity)
+        
+        power_curve = PowerCurveService.get_activity_power_curve(activity_id)
+        if not power_curve:
+            return jsonify({'error': 'No power curve for this activity'}), 404
+        
+        return jsonify({
+            'activity_id': activity_id,
+            'power_curve': power_curve
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/<int:activity_id>/route')
+def get_activity_route(activity_id):
+    """Tracé d'une activité (polyline résumée et emprise)"""
+    try:
+        route = RouteMapService.get_route(activity_id)
+        if not route:
+            return jsonify({'error': 'No route for this activity'}), 404
+        
+        return jsonify(route)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/routes/bbox')
+def find_routes_in_bbox(athlete_id):
+    """Activités dont le tracé traverse une emprise (?south=&west=&north=&east=)"""
+    try:
+        bounds = [request.args.get(name, type=float) for name in ('south', 'west', 'north', 'east')]
+        if None in bounds or bounds[0] > bounds[2] or bounds[1] > bounds[3]:
+            return jsonify({'error': 'Paramètres south, west, north, east requis (south <= north, west <= east)'}), 400
+        limit = min(1000, max(1, request.args.get('limit', 200, type=int)))
+        
+        result = RouteMapService().find_in_bbox(athlete_id, *bounds, limit=limit)
+        return jsonify({'athlete_id': athlete_id, 'bbox': bounds, **result})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/routes/near')
+def find_routes_near(athlete_id):
+    """Activités passées près d'un point (?lat=&lng=&radius=200 en mètres)"""
+    try:
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        if lat is None or lng is None:
+            return jsonify({'error': 'Paramètres lat et lng requis'}), 400
+        radius = min(50000.0, max(1.0, request.args.get('radius', 200, type=float)))
+        limit = min(1000, max(1, request.args.get('limit', 200, type=int)))
+        
+        result = RouteMapService().find_near(athlete_id, lat, lng, radius, limit=limit)
+        return jsonify({'athlete_id': athlete_id, 'point': [lat, lng], 'radius_m': radius, **result})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/heatmap/<int:zoom>/<int:x>/<int:y>.png')
+def get_heatmap_tile(athlete_id, zoom, x, y):
+    """Tuile de heatmap PNG (z/x/y Web Mercator, superposable sur Leaflet / Mapbox)"""
+    if zoom > HEATMAP_MAX_ZOOM or x >= 2 ** zoom or y >= 2 ** zoom:
+        return jsonify({'error': 'Tile out of range'}), 404
+    
+    try:
+        png = RouteMapService().get_heatmap_tile(athlete_id, zoom, x, y)
+        return Response(png, mimetype='image/png', headers={'Cache-Control': 'private, max-age=300'})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/heatmap/precompute', methods=['POST'])
+def precompute_heatmap(athlete_id):
+    """Pré-calculer les tuiles de heatmap manquantes ou invalidées"""
+    try:
+        built = RouteMapService().precompute_heatmap(athlete_id)
+        
+        return jsonify({
+            'message': f'{built} tuiles de heatmap calculées',
+            'tiles_built': built
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/<int:activity_id>/climbs')
+def get_activity_climbs(activity_id):
+    """Montées détectées dans une activité"""
+    try:
+        return jsonify({
+            'activity_id': activity_id,
+            'climbs': ClimbsService.get_activity_climbs(activity_id)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/climbs')
+def search_climbs(athlete_id):
+    """
+    Rechercher les montées d'un athlète
+    ?min_grade=&min_gain=&min_length=&category=&days=&lat=&lng=&radius=&sort=gain&limit=50
+    """
+    try:
+        sort = request.args.get('sort', 'gain')
+        if sort not in CLIMB_SORTS:
+            return jsonify({'error': f"sort doit valoir {', '.join(CLIMB_SORTS)}"}), 400
+        limit = min(500, max(1, request.args.get('limit', 50, type=int)))
+        
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        near = None
+        if lat is not None and lng is not None:
+            near = (lat, lng, min(50000.0, max(1.0, request.args.get('radius', 500, type=float))))
+        
+        climbs = ClimbsService.search_climbs(
+            athlete_id,
+            min_grade=request.args.get('min_grade', type=float),
+            min_gain=request.args.get('min_gain', type=float),
+            min_length=request.args.get('min_length', type=float),
+            category=request.args.get('category'),
+            days=request.args.get('days', type=int),
+            near=near,
+            sort=sort,
+            limit=limit
+        )
+        
+        return jsonify({
+            'athlete_id': athlete_id,
+            'summary': ClimbsService.get_climbs_summary(athlete_id),
+            'count': len(climbs),
+            'climbs': climbs
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/climbs/recompute', methods=['POST'])
+def recompute_climbs(athlete_id):
+    """Détecter les montées de tout l'historique dont les streams sont stockés"""
+    try:
+        result = ClimbsService().recompute_for_athlete(athlete_id)
+        
+        return jsonify({
+            'message': f"{result['climbs']} montées détectées dans {result['activities']} activités",
+            'activities_analyzed': result['activities'],
+            'climbs_detected': result['climbs'],
+            'duration_seconds': result['seconds']
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @activities_bp.route('/athlete/<int:athlete_id>/training-patterns')
 def analyze_training_patterns(athlete_id):
     """Analyser les patterns d'entraînement"""
@@ -731,6 +1149,7 @@ def get_custom_dashboard(athlete_id):
             }), 400
         
         calc_service = CustomCalculationsService()
+        calc_service.ensure_ftp_current(athlete_id)
         
         # Records personnels
         records = calc_service.get_athlete_records_summary(athlete_id)
@@ -764,7 +1183,12 @@ def get_custom_dashboard(athlete_id):
 
 @activities_bp.route('/athlete/<int:athlete_id>/update-ftp', methods=['POST'])
 def update_ftp_and_recalculate(athlete_id):
-    """Mettre à jour le FTP et recalculer les métriques affectées"""
+    """
+    Nouveau FTP dans l'historique, à partir d'aujourd'hui ou d'une date d'effet :
+    recalculate_recent (30 derniers jours), recalculate_from / recalculate_to (YYYY-MM-DD,
+    bornes incluses), recalculate_all (tout l'historique) ; ces options recalculent IF / TSS
+    tout de suite (une requête SQL), sinon à la prochaine lecture ou par les workers
+    """
     try:
         data = request.get_json()
         new_ftp = data.get('new_ftp')
@@ -772,54 +1196,131 @@ def update_ftp_and_recalculate(athlete_id):
         if not new_ftp or not isinstance(new_ftp, int) or new_ftp <= 0:
             return jsonify({'error': 'FTP valide requis'}), 400
         
-        # Mettre à jour les paramètres
-        settings = AthleteSettings.get_or_create_for_athlete(athlete_id, new_ftp)
-        old_ftp = settings.current_ftp
-        settings.current_ftp = new_ftp
-        settings.updated_at = datetime.utcnow()
-        db.session.commit()
-        
-        # Optionnel : recalculer les métriques récentes (30 derniers jours)
-        recalculate = data.get('recalculate_recent', False)
+        try:
+            recalculate_from = data.get('recalculate_from')
+            recalculate_to = data.get('recalculate_to')
+            effective_date = datetime.strptime(recalculate_from, '%Y-%m-%d').date() if recalculate_from else None
+            until = datetime.strptime(recalculate_to, '%Y-%m-%d').date() if recalculate_to else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'recalculate_from et recalculate_to au format YYYY-MM-DD'}), 400
+        if until and not effective_date:
+            return jsonify({'error': 'recalculate_to nécessite recalculate_from'}), 400
+        
+        ftp_history = FtpHistoryService()
+        if data.get('recalculate_all', False):
+            effective_date = ftp_history.first_activity_day(athlete_id)
+        elif data.get('recalculate_recent', False) and not effective_date:
+            effective_date = datetime.utcnow().date() - timedelta(days=30)
+        recalculate = effective_date is not None
+        
+        old_ftp = AthleteSettings.get_or_create_for_athlete(athlete_id, new_ftp).current_ftp
+        try:
+            entry = ftp_history.set_ftp(athlete_id, new_ftp, effective_date, until)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Recalcul ensembliste des métriques dont la version de FTP a changé
         recalculated_count = 0
-        
+        started = datetime.utcnow()
         if recalculate:
-            cutoff_date = datetime.utcnow() - timedelta(days=30)
-            
-            # Supprimer les calculs récents pour recalculer avec nouveau FTP
-            recent_custom_metrics = db.session.query(ActivityCustomMetrics)\
-                .join(ActivitySummary, ActivityCustomMetrics.activity_id == ActivitySummary.id)\
-                .filter(ActivitySummary.athlete_id == athlete_id)\
-                .filter(ActivitySummary.start_date_local >= cutoff_date).all()
-            
-            for metrics in recent_custom_metrics:
-                db.session.delete(metrics)
-            
-            db.session.commit()
-            
-            # Recalculer avec nouveau FTP
-            calc_service = CustomCalculationsService()
-            recent_activities = ActivitySummary.query\
-                .filter_by(athlete_id=athlete_id)\
-                .filter(ActivitySummary.start_date_local >= cutoff_date).all()
-            
-            for activity in recent_activities:
-                try:
-                    calc_service.calculate_activity_custom_metrics(
-                        activity.id, athlete_id, new_ftp
-                    )
-                    recalculated_count += 1
-                except Exception as e:
-                    continue
+            recalculated_count = CustomCalculationsService().recalculate_ftp_versions(athlete_id)
+        settings = AthleteSettings.query.get(athlete_id)
         
         return jsonify({
             'message': 'FTP mis à jour avec succès',
             'old_ftp': old_ftp,
             'new_ftp': new_ftp,
             'difference': new_ftp - old_ftp,
-            'recalculated_activities': recalculated_count if recalculate else 0,
+            'ftp_history_entry': entry.to_dict(),
+            'recalculated_activities': recalculated_count,
+            'recalculation_seconds': round((datetime.utcnow() - started).total_seconds(), 3),
             'settings': settings.to_dict()
         })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/ftp-history', methods=['GET'])
+def get_ftp_history(athlete_id):
+    """Historique des FTP par date d'effet (version = id utilisé par les métriques)"""
+    try:
+        entries = FtpHistoryService().get_history(athlete_id)
+        settings = AthleteSettings.query.get(athlete_id)
+        
+        return jsonify({
+            'athlete_id': athlete_id,
+            'current_ftp': settings.current_ftp,
+            'recompute_pending_from': settings.ftp_dirty_from.isoformat() if settings.ftp_dirty_from else None,
+            'history': [entry.to_dict() for entry in entries]
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/ftp-history', methods=['POST'])
+def add_ftp_history_entry(athlete_id):
+    """
+    Ajouter un FTP à l'historique : {ftp, effective_date (YYYY-MM-DD, aujourd'hui par défaut),
+    until (optionnel, inclus), threshold_heartrate} ; métriques recalculées à la lecture
+    """
+    try:
+        data = request.get_json() or {}
+        ftp = data.get('ftp')
+        if not isinstance(ftp, int) or ftp <= 0:
+            return jsonify({'error': 'FTP doit être un entier positif'}), 400
+        
+        try:
+            effective_date = datetime.strptime(data['effective_date'], '%Y-%m-%d').date() if data.get('effective_date') else None
+            until = datetime.strptime(data['until'], '%Y-%m-%d').date() if data.get('until') else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'effective_date et until au format YYYY-MM-DD'}), 400
+        
+        try:
+            entry = FtpHistoryService().set_ftp(
+                athlete_id, ftp, effective_date, until, threshold_heartrate=data.get('threshold_heartrate')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'message': 'Historique FTP mis à jour',
+            'entry': entry.to_dict()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/ftp-history/<int:version>', methods=['DELETE'])
+def delete_ftp_history_entry(athlete_id, version):
+    """Supprimer un FTP de l'historique (la valeur précédente s'étend à sa période)"""
+    try:
+        try:
+            entry = FtpHistoryService().delete_entry(athlete_id, version)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if entry is None:
+            return jsonify({'error': 'Version FTP inconnue'}), 404
+        
+        return jsonify({
+            'message': 'Valeur supprimée de l\'historique FTP',
+            'entry': entry.to_dict()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@activities_bp.route('/athlete/<int:athlete_id>/ftp-history/recompute', methods=['POST'])
+def recompute_ftp_metrics(athlete_id):
+    """Recalculer maintenant IF / TSS des métriques dont la version de FTP a changé"""
+    try:
+        started = datetime.utcnow()
+        updated = CustomCalculationsService().recalculate_ftp_versions(athlete_id)
         
+        return jsonify({
+            'message': f'{updated} activités recalculées',
+            'recalculated_activities': updated,
+            'duration_seconds': round((datetime.utcnow() - started).total_seconds(), 3)
+        })
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
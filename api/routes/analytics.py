@@ -1,4 +1,8 @@
 from flask import Blueprint, request, jsonify
+from services.custom_calculations import CustomCalculationsService
+from services.rollup_service import ActivityRollupService
+from services.stats_views_service import StatsViewsService
+from services.training_load_service import TrainingLoadService
 
 analytics_bp = Blueprint('analytics', __name__)
 
@@ -8,18 +12,76 @@ def test():
 
 @analytics_bp.route('/athlete/<int:athlete_id>/monthly')
 def monthly_stats(athlete_id):
-    """Statistiques mensuelles - Version simplifiée"""
-    return jsonify({
-        'athlete_id': athlete_id,
-        'message': 'Monthly stats endpoint - TODO: implement with database',
-        'status': 'ok'
-    })
+    """Statistiques mensuelles par type de sport (?months=12 ou ?year=2024)"""
+    try:
+        year = request.args.get('year', type=int)
+        months = min(120, max(1, request.args.get('months', 12, type=int)))
+        CustomCalculationsService().ensure_ftp_current(athlete_id)
+        
+        stats = ActivityRollupService().get_monthly_stats(athlete_id, months, year)
+        
+        return jsonify({
+            'athlete_id': athlete_id,
+            'year': year,
+            'months': stats,
+            'status': 'ok'
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/athlete/<int:athlete_id>/dashboard')
 def dashboard(athlete_id):
-    """Dashboard simplifié"""
-    return jsonify({
-        'athlete_id': athlete_id,
-        'message': 'Dashboard endpoint - TODO: implement with database',
-        'status': 'ok'
-    })
\ No newline at end of file
+    """Dashboard : semaine, mois et année en cours, tendance hebdomadaire, forme du jour"""
+    try:
+        CustomCalculationsService().ensure_ftp_current(athlete_id)
+        dashboard = ActivityRollupService().get_dashboard(athlete_id)
+        dashboard['fitness'] = TrainingLoadService().get_current(athlete_id)
+        
+        return jsonify({
+            'athlete_id': athlete_id,
+            **dashboard,
+            'status': 'ok'
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/athlete/<int:athlete_id>/rollups/rebuild', methods=['POST'])
+def rebuild_rollups(athlete_id):
+    """Reconstruire les agrégats jour / semaine / mois depuis activity_summary"""
+    try:
+        rows = ActivityRollupService().rebuild_for_athlete(athlete_id)
+        
+        return jsonify({
+            'message': f'{rows} lignes d\'agrégats reconstruites',
+            'rollup_rows': rows
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/stats-views')
+def stats_views_status():
+    """Fraîcheur des vues de statistiques matérialisées (retard, dernier REFRESH)"""
+    try:
+        return jsonify({**StatsViewsService().get_status(), 'status': 'ok'})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/stats-views/refresh', methods=['POST'])
+def refresh_stats_views():
+    """Rafraîchir immédiatement les vues en retard (sans attendre la fenêtre de regroupement)"""
+    try:
+        refreshed = StatsViewsService().refresh_due(force=True)
+        if refreshed is None:
+            return jsonify({'message': 'Rafraîchissement déjà en cours', 'refreshed': {}}), 409
+        
+        return jsonify({
+            'message': f'{len(refreshed)} vue(s) rafraîchie(s)',
+            'refreshed': refreshed
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, redirect, session, jsonify, current_app
 from models.database import db, Athlete
 from services.strava_service import StravaService
+from services.sync_queue import SyncQueueService
 from datetime import datetime, timedelta
 
 auth_bp = Blueprint('auth', __name__)
@@ -71,9 +72,9 @@ def strava_callback():
         
         db.session.commit()
         
-        # Déclencher la synchronisation des activités
-        print(f"Démarrage de la synchronisation pour l'athlète {athlete.firstname} {athlete.lastname}")
-        sync_result = strava_service.sync_athlete_activities(athlete.id)
+        # Mettre en file la synchronisation des activités (exécutée par worker.py)
+        print(f"Synchronisation mise en file pour l'athlète {athlete.firstname} {athlete.lastname}")
+        sync_job = SyncQueueService().enqueue(athlete.id)
         
         return jsonify({
             'message': 'Authentification réussie !',
@@ -85,8 +86,13 @@ def strava_callback():
                 'city': athlete.city,
                 'country': athlete.country
             },
-            'sync_result': sync_result,
+            'sync_job': {
+                'job_id': sync_job.id,
+                'status': sync_job.status,
+                'status_url': f'/api/activities/sync-jobs/{sync_job.id}'
+            },
             'next_steps': [
+                f'Suivre la synchronisation: /api/activities/sync-jobs/{sync_job.id}',
                 f'Voir vos activités: /api/activities/athlete/{athlete.id}',
                 f'Statistiques mensuelles: /api/analytics/athlete/{athlete.id}/monthly',
                 f'Analyse par jour: /api/analytics/athlete/{athlete.id}/day-of-week'
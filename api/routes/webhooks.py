@@ -0,0 +1,54 @@
+from flask import Blueprint, jsonify, request
+from services.webhook_service import StravaWebhookService
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+@webhooks_bp.route('/strava', methods=['GET'])
+def validate_strava_subscription():
+    """Validation de l'abonnement push Strava (écho de hub.challenge)"""
+    challenge = StravaWebhookService().validate_subscription(
+        request.args.get('hub.mode'),
+        request.args.get('hub.verify_token'),
+        request.args.get('hub.challenge')
+    )
+    if not challenge:
+        return jsonify({'error': 'Invalid verify token'}), 403
+    
+    return jsonify({'hub.challenge': challenge})
+
+@webhooks_bp.route('/strava', methods=['POST'])
+def receive_strava_event():
+    """
+    Réception d'un événement Strava : enregistrement + mise en file, acquittement immédiat
+    (Strava attend un 200 en moins de 2 secondes et relivre sinon)
+    """
+    payload = request.get_json(silent=True)
+    if not payload:
+        return jsonify({'error': 'JSON body required'}), 400
+    
+    try:
+        event = StravaWebhookService().record_event(payload)
+        if event is None:
+            return jsonify({'status': 'duplicate'})
+        
+        return jsonify({'status': event.status, 'event_id': event.id, 'job_id': event.job_id})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@webhooks_bp.route('/strava/events')
+def list_strava_events():
+    """Derniers événements reçus et leur statut de traitement"""
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        events = StravaWebhookService.get_recent_events(limit)
+        
+        return jsonify({
+            'events': [event.to_dict() for event in events],
+            'total': len(events)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,5 @@
+# api/scripts/__init__.py
+"""
+Scripts d'exploitation et de benchmark pour Strava Analytics
+(à lancer depuis api/ : python -m scripts.<nom>)
+"""
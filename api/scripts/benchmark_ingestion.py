@@ -0,0 +1,90 @@
+# Fichier: api/scripts/benchmark_ingestion.py
+"""
+Benchmark d'ingestion : process_activity (1 SELECT + 1 INSERT + 1 COMMIT par activité)
+contre process_activities_batch (1 INSERT ... ON CONFLICT par page de 200)
+
+Usage (depuis api/) : python -m scripts.benchmark_ingestion --count 2000
+Les données synthétiques sont supprimées en fin de benchmark.
+"""
+import argparse
+import time
+from sqlalchemy import event
+
+from app import create_app
+from models.database import db, Athlete, ActivitySummary
+from services.strava_service import StravaService
+from scripts.synthetic_activities import generate_activity_summaries
+
+PAGE_SIZE = 200
+
+
+class StatementCounter:
+    """Compter les requêtes SQL envoyées à PostgreSQL"""
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+    
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+    
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+    
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def cleanup(athlete_id):
+    ActivitySummary.query.filter_by(athlete_id=athlete_id).delete()
+    db.session.commit()
+
+
+def run_benchmark(count):
+    service = StravaService()
+    activities = generate_activity_summaries(count)
+    
+    athlete = Athlete(strava_id=-int(time.time()), firstname='Benchmark', lastname='Ingestion')
+    db.session.add(athlete)
+    db.session.commit()
+    
+    results = {}
+    try:
+        # Chemin historique : une activité à la fois
+        with StatementCounter(db.engine) as counter:
+            started = time.perf_counter()
+            inserted = sum(1 for a in activities if service.process_activity(a, athlete.id))
+            elapsed = time.perf_counter() - started
+        results['process_activity'] = (inserted, elapsed, counter.count)
+        cleanup(athlete.id)
+        
+        # Chemin batch : une requête par page
+        with StatementCounter(db.engine) as counter:
+            started = time.perf_counter()
+            inserted = 0
+            for offset in range(0, len(activities), PAGE_SIZE):
+                batch = service.process_activities_batch(activities[offset:offset + PAGE_SIZE], athlete.id)
+                inserted += batch['inserted']
+            elapsed = time.perf_counter() - started
+        results['process_activities_batch'] = (inserted, elapsed, counter.count)
+    finally:
+        cleanup(athlete.id)
+        db.session.delete(athlete)
+        db.session.commit()
+    
+    print(f"Ingestion de {count} activités synthétiques")
+    print(f"{'Méthode':<28}{'Insérées':>10}{'Durée (s)':>12}{'Act/s':>10}{'Requêtes SQL':>14}")
+    for name, (inserted, elapsed, statements) in results.items():
+        print(f"{name:<28}{inserted:>10}{elapsed:>12.2f}{inserted / elapsed if elapsed else 0:>10.0f}{statements:>14}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=2000, help="Nombre d'activités synthétiques")
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        run_benchmark(args.count)
@@ -0,0 +1,111 @@
+# Fichier: api/scripts/benchmark_stats_views.py
+"""
+Benchmark des vues de statistiques : lecture par athlète sur la définition de la vue
+(comportement d'une vue simple : jointures recalculées à chaque requête) contre la vue
+matérialisée indexée, puis durée d'un REFRESH MATERIALIZED VIEW CONCURRENTLY
+
+Usage (depuis api/) : python -m scripts.benchmark_stats_views --athletes 20 --activities 365
+Nécessite les vues de database/init.sql. Les données synthétiques sont supprimées en fin de benchmark.
+"""
+import argparse
+import statistics
+import time
+from sqlalchemy import text
+
+from app import create_app
+from models.database import db, Athlete, ActivitySummary
+from models.custom_metrics import AthleteFtpHistory, AthleteSettings
+from services.custom_calculations import CustomCalculationsService
+from services.stats_views_service import StatsViewsService, MATERIALIZED_STATS_VIEWS
+from services.strava_service import StravaService
+from scripts.benchmark_sync import cleanup
+from scripts.synthetic_activities import generate_activity_summaries
+
+PAGE_SIZE = 200
+
+
+def create_athletes(count, activities_per_athlete):
+    """Athlètes synthétiques avec activités, métriques Strava et métriques personnalisées"""
+    service = StravaService()
+    calculations = CustomCalculationsService()
+    athletes = []
+    for i in range(count):
+        athlete = Athlete(strava_id=-int(time.time()) * 1000 - i, firstname='Benchmark', lastname=f'Vues {i}')
+        db.session.add(athlete)
+        db.session.commit()
+        athletes.append(athlete)
+        
+        activities = generate_activity_summaries(activities_per_athlete, seed=i,
+                                                 first_strava_id=8_000_000_000 + i * 100_000)
+        for offset in range(0, len(activities), PAGE_SIZE):
+            service.process_activities_batch(activities[offset:offset + PAGE_SIZE], athlete.id)
+        activity_ids = dict(db.session.query(ActivitySummary.strava_id, ActivitySummary.id)
+                            .filter_by(athlete_id=athlete.id))
+        service.insert_strava_metrics_rows([
+            service.build_strava_metrics_row(activity_ids[activity['id']], activity) for activity in activities
+        ])
+        calculations.calculate_all_athlete_activities(athlete.id, user_ftp=250)
+    return athletes
+
+
+def time_reads(query, athlete_ids, rounds):
+    """Durées (ms) de `rounds` passes de lecture sur tous les athlètes"""
+    durations = []
+    for _ in range(rounds):
+        for athlete_id in athlete_ids:
+            started = time.perf_counter()
+            db.session.execute(query, {'athlete_id': athlete_id}).fetchall()
+            durations.append((time.perf_counter() - started) * 1000)
+    db.session.rollback()
+    return durations
+
+
+def run_benchmark(athletes_count, activities_per_athlete, rounds):
+    stats_views = StatsViewsService()
+    stats_views.ensure_materialized()
+    kinds = stats_views.view_kinds()
+    if any(kinds.get(view_name) != 'm' for view_name in MATERIALIZED_STATS_VIEWS):
+        print("Vues de statistiques absentes : appliquer database/init.sql avant le benchmark")
+        return
+    
+    print(f"Création de {athletes_count} athlètes x {activities_per_athlete} activités synthétiques...")
+    athletes = create_athletes(athletes_count, activities_per_athlete)
+    athlete_ids = [athlete.id for athlete in athletes]
+    try:
+        refreshed = stats_views.refresh_due(force=True)
+        
+        print(f"{'Vue':<32}{'Simple méd.':>12}{'p95':>9}{'Matér. méd.':>13}{'p95':>9}{'Gain':>8}{'REFRESH (ms)':>14}")
+        for view_name in MATERIALIZED_STATS_VIEWS:
+            definition = db.session.execute(
+                text("SELECT pg_get_viewdef(CAST(:name AS regclass), true)"), {'name': view_name}
+            ).scalar().rstrip().rstrip(';')
+            before = time_reads(
+                text(f"SELECT * FROM ({definition}) AS v WHERE athlete_id = :athlete_id"), athlete_ids, rounds
+            )
+            after = time_reads(
+                text(f"SELECT * FROM {view_name} WHERE athlete_id = :athlete_id"), athlete_ids, rounds
+            )
+            before_median, after_median = statistics.median(before), statistics.median(after)
+            print(f"{view_name:<32}{before_median:>12.2f}{statistics.quantiles(before, n=20)[18]:>9.2f}"
+                  f"{after_median:>13.2f}{statistics.quantiles(after, n=20)[18]:>9.2f}"
+                  f"{before_median / after_median if after_median else 0:>7.1f}x"
+                  f"{(refreshed or {}).get(view_name, 0):>14.1f}")
+    finally:
+        for athlete in athletes:
+            AthleteFtpHistory.query.filter_by(athlete_id=athlete.id).delete()
+            AthleteSettings.query.filter_by(athlete_id=athlete.id).delete()
+            cleanup(athlete)
+        stats_views.refresh_due(force=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--athletes', type=int, default=20, help="Nombre d'athlètes synthétiques")
+    parser.add_argument('--activities', type=int, default=365, help="Activités par athlète")
+    parser.add_argument('--rounds', type=int, default=5, help="Passes de lecture sur tous les athlètes")
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        run_benchmark(args.athletes, args.activities, args.rounds)
@@ -0,0 +1,124 @@
+# Fichier: api/scripts/benchmark_sync.py
+"""
+Benchmark de bout en bout de StravaService.sync_athlete_activities contre le faux serveur Strava
+
+Mesure : activités/s, appels API (par route, 429 compris), requêtes SQL et pic mémoire.
+Le limiteur utilise un bucket dédié ('benchmark') pour ne pas consommer le budget réel,
+et l'archive des réponses est écrite dans un dossier temporaire.
+
+Usage (depuis api/) :
+    python -m scripts.benchmark_sync --activities 5000 --latency-ms 30
+    # Réponses 429 + Retry-After du serveur (limiteur client aveugle aux en-têtes X-RateLimit-*)
+    python -m scripts.benchmark_sync --activities 300 --short-limit 60 --window-seconds 3 --ignore-rate-headers
+"""
+import argparse
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app import create_app
+from models.database import db, Athlete, ActivitySummary
+from models.sync import AthleteSyncState
+from services.rate_limiter import StravaRateLimiter
+from services.strava_service import StravaService
+from scripts.benchmark_ingestion import StatementCounter
+from scripts.fake_strava_server import BASE_ATHLETE_ID, add_server_arguments, start_server, state_from_arguments
+
+
+def cleanup(athlete):
+    # Suppression des activités avec toutes leurs données dérivées
+    strava_ids = [strava_id for (strava_id,) in
+                  db.session.query(ActivitySummary.strava_id).filter_by(athlete_id=athlete.id)]
+    StravaService().delete_activities_by_strava_ids(strava_ids)
+    AthleteSyncState.query.filter_by(athlete_id=athlete.id).delete()
+    db.session.delete(athlete)
+    db.session.commit()
+
+
+def run_benchmark(app, fake_state, base_url, short_limit, daily_limit, ignore_rate_headers=False):
+    app.config['STRAVA_API_BASE_URL'] = f'{base_url}/api/v3'
+    app.config['STRAVA_TOKEN_URL'] = f'{base_url}/oauth/token'
+    limiter = StravaRateLimiter(
+        db.engine, bucket='benchmark', short_limit=short_limit, daily_limit=daily_limit, reserve=0
+    )
+    if ignore_rate_headers:
+        # Sinon le limiteur adopte les limites du serveur et attend la fin du quart d'heure Strava
+        limiter.update_from_headers = lambda headers: None
+    app.extensions['strava_rate_limiter'] = limiter
+    # Remise à zéro du bucket dédié (compteurs d'une exécution précédente)
+    db.session.execute(db.text("DELETE FROM strava_rate_limit WHERE bucket = 'benchmark'"))
+    db.session.commit()
+    
+    athlete_strava_id = BASE_ATHLETE_ID + 1
+    existing = Athlete.query.filter_by(strava_id=athlete_strava_id).first()
+    if existing:
+        cleanup(existing)
+    athlete = Athlete(
+        strava_id=athlete_strava_id, firstname='Benchmark', lastname='Sync',
+        access_token=f'fake-{athlete_strava_id}', refresh_token=f'refresh-{athlete_strava_id}',
+        token_expires_at=datetime.utcnow() + timedelta(hours=6)
+    )
+    db.session.add(athlete)
+    db.session.commit()
+    
+    fake_state.reset_stats()
+    service = StravaService()
+    try:
+        tracemalloc.start()
+        with StatementCounter(db.engine) as counter:
+            started = time.perf_counter()
+            result = service.sync_athlete_activities(athlete.id)
+            elapsed = time.perf_counter() - started
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        if 'error' in result:
+            print(f"❌ Synchronisation en erreur: {result['error']}")
+            return
+        
+        stats = fake_state.get_stats()
+        inserted = result['synchronized_activities']
+        print(f"Synchronisation de {inserted} activités ({len(result['pages'])} pages) contre {base_url}")
+        print(f"{'Durée':<28}{elapsed:>12.2f} s")
+        print(f"{'Activités / s':<28}{inserted / elapsed if elapsed else 0:>12.0f}")
+        print(f"{'Activités enrichies':<28}{result['enriched_activities']:>12}")
+        print(f"{'Appels API':<28}{stats['total_requests']:>12}")
+        for route, count in sorted(stats['requests'].items()):
+            print(f"{'  ' + route:<28}{count:>12}")
+        print(f"{'Réponses 429':<28}{stats['throttled']:>12}")
+        print(f"{'Erreurs 5xx simulées':<28}{stats['errors']:>12}")
+        print(f"{'Requêtes SQL':<28}{counter.count:>12}")
+        print(f"{'Pic mémoire Python':<28}{peak_traced / 1024 / 1024:>12.1f} Mo")
+        print(f"{'RSS max du processus':<28}{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>12.1f} Mo")
+    finally:
+        db.session.rollback()
+        cleanup(athlete)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_server_arguments(parser)
+    parser.add_argument('--client-short-limit', type=int, default=100000,
+                        help="Limite 15 min initiale du limiteur client (resynchronisée par les en-têtes)")
+    parser.add_argument('--ignore-rate-headers', action='store_true',
+                        help="Ne pas resynchroniser le limiteur client avec les en-têtes du serveur")
+    args = parser.parse_args()
+    
+    fake_state = state_from_arguments(args)
+    server, base_url = start_server(fake_state)
+    archive_dir = tempfile.mkdtemp(prefix='strava-archive-')
+    
+    app = create_app()
+    app.config['PAYLOAD_ARCHIVE_DIR'] = archive_dir
+    try:
+        with app.app_context():
+            db.create_all()
+            run_benchmark(app, fake_state, base_url,
+                          args.client_short_limit, args.daily_limit,
+                          args.ignore_rate_headers)
+    finally:
+        server.shutdown()
+        shutil.rmtree(archive_dir, ignore_errors=True)
@@ -0,0 +1,306 @@
+# Fichier: api/scripts/fake_strava_server.py
+"""
+Faux serveur d'API Strava pour les benchmarks et tests de charge de la synchronisation
+
+Sert des athlètes synthétiques (des milliers d'activités chacun) avec :
+- pagination /athlete/activities (page, per_page <= 200, before / after)
+- activités détaillées /activities/<id> et streams /activities/<id>/streams
+- échange / rafraîchissement de token /oauth/token
+- latence configurable, erreurs 5xx aléatoires
+- en-têtes X-RateLimit-Limit / X-RateLimit-Usage et réponses 429 (Retry-After) à la limite
+
+Jeton d'accès : "fake-<strava_id de l'athlète>" (les athlètes ont les ids BASE_ATHLETE_ID + 1..N)
+
+Usage (depuis api/) :
+    python -m scripts.fake_strava_server --athletes 3 --activities 5000 --latency-ms 40
+    STRAVA_API_BASE_URL=http://localhost:8765/api/v3 STRAVA_TOKEN_URL=http://localhost:8765/oauth/token ...
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scripts.synthetic_activities import generate_activity_summaries, generate_activity_streams
+
+BASE_ATHLETE_ID = 990_000_000
+# Champs absents des résumés Strava (présents uniquement dans l'activité détaillée)
+DETAIL_ONLY_FIELDS = ('suffer_score', 'device_watts')
+
+
+class FakeStravaState:
+    """Données synthétiques, compteurs de requêtes et fenêtres de rate limit du faux serveur"""
+    
+    def __init__(self, athletes=1, activities=2000, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 short_limit=600, daily_limit=30000, window_seconds=900, detail_ratio=0.3, seed=42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.window_seconds = window_seconds
+        self.detail_ratio = detail_ratio
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        
+        self.athletes = {}
+        self.activities = {}
+        for n in range(1, athletes + 1):
+            athlete_id = BASE_ATHLETE_ID + n
+            summaries = generate_activity_summaries(
+                activities, seed=seed + n, first_strava_id=10_000_000_000 + n * 10_000_000,
+                athlete_strava_id=athlete_id
+            )
+            for summary in summaries:
+                summary['epoch'] = int(datetime.strptime(summary['start_date'], '%Y-%m-%dT%H:%M:%SZ')
+                                       .replace(tzinfo=timezone.utc).timestamp())
+                self.activities[summary['id']] = summary
+            self.athletes[athlete_id] = sorted(summaries, key=lambda a: a['epoch'])
+        
+        self.reset_stats()
+    
+    def reset_stats(self):
+        with self.lock:
+            self.requests = {}
+            self.throttled = 0
+            self.errors = 0
+            self.short_window_start = time.time()
+            self.daily_window_start = time.time()
+            self.short_count = 0
+            self.daily_count = 0
+    
+    def consume(self):
+        """Compter une requête ; retourne (accordée, en-têtes rate limit, secondes avant nouvelle fenêtre)"""
+        with self.lock:
+            now = time.time()
+            if now - self.short_window_start >= self.window_seconds:
+                self.short_window_start, self.short_count = now, 0
+            if now - self.daily_window_start >= 86400:
+                self.daily_window_start, self.daily_count = now, 0
+            
+            allowed = self.short_count < self.short_limit and self.daily_count < self.daily_limit
+            if allowed:
+                self.short_count += 1
+                self.daily_count += 1
+            else:
+                self.throttled += 1
+            
+            headers = {
+                'X-RateLimit-Limit': f'{self.short_limit},{self.daily_limit}',
+                'X-RateLimit-Usage': f'{self.short_count},{self.daily_count}'
+            }
+            retry_after = max(1, int(self.window_seconds - (now - self.short_window_start)) + 1)
+            return allowed, headers, retry_after
+    
+    def record(self, route):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+    
+    def summary_view(self, activity):
+        """Format résumé : sans l'époque interne ni (pour une partie) les champs du détail"""
+        summary = {key: value for key, value in activity.items() if key != 'epoch'}
+        # Répartition déterministe (hachage multiplicatif de l'id)
+        if (activity['id'] * 2654435761 % 1000) / 1000 < self.detail_ratio:
+            for field in DETAIL_ONLY_FIELDS:
+                summary.pop(field, None)
+        return summary
+    
+    def detail_view(self, activity):
+        detail = {key: value for key, value in activity.items() if key != 'epoch'}
+        detail.update({
+            'resource_state': 3,
+            'calories': round(activity['moving_time'] * 0.18, 1),
+            'perceived_exertion': None,
+            'description': None,
+            'device_name': 'Synthetic device'
+        })
+        return detail
+    
+    def get_stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'total_requests': sum(self.requests.values()),
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'short_usage': self.short_count,
+                'daily_usage': self.daily_count
+            }
+
+
+class FakeStravaHandler(BaseHTTPRequestHandler):
+    state = None
+    protocol_version = 'HTTP/1.1'
+    
+    ACTIVITY_PATH = re.compile(r'^/api/v3/activities/(\d+)$')
+    STREAMS_PATH = re.compile(r'^/api/v3/activities/(\d+)/streams$')
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def authenticated_athlete(self):
+        token = self.headers.get('Authorization', '').replace('Bearer ', '')
+        if token.startswith('fake-') and token[5:].isdigit() and int(token[5:]) in self.state.athletes:
+            return int(token[5:])
+        return None
+    
+    def simulate_network(self):
+        delay = self.state.latency_ms + self.state.rng.uniform(-1, 1) * self.state.jitter_ms
+        if delay > 0:
+            time.sleep(delay / 1000)
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        
+        if url.path == '/_stats':
+            return self.send_json(200, self.state.get_stats())
+        
+        self.simulate_network()
+        allowed, headers, retry_after = self.state.consume()
+        if not allowed:
+            self.state.record('429')
+            headers['Retry-After'] = str(retry_after)
+            return self.send_json(429, {'message': 'Rate Limit Exceeded', 'errors': []}, headers)
+        
+        if self.state.error_rate and self.state.rng.random() < self.state.error_rate:
+            with self.state.lock:
+                self.state.errors += 1
+            return self.send_json(503, {'message': 'Service Unavailable'}, headers)
+        
+        athlete_id = self.authenticated_athlete()
+        if athlete_id is None:
+            return self.send_json(401, {'message': 'Authorization Error', 'errors': [
+                {'resource': 'Athlete', 'field': 'access_token', 'code': 'invalid'}]}, headers)
+        
+        if url.path == '/api/v3/athlete':
+            self.state.record('athlete')
+            return self.send_json(200, {'id': athlete_id, 'firstname': 'Synthetic', 'lastname': str(athlete_id),
+                                        'username': f'synthetic{athlete_id}'}, headers)
+        
+        if url.path == '/api/v3/athlete/activities':
+            self.state.record('activities')
+            return self.send_json(200, self.list_activities(athlete_id, params), headers)
+        
+        match = self.ACTIVITY_PATH.match(url.path)
+        if match:
+            self.state.record('activity_detail')
+            activity = self.state.activities.get(int(match.group(1)))
+            if not activity or activity['athlete']['id'] != athlete_id:
+                return self.send_json(404, {'message': 'Record Not Found'}, headers)
+            return self.send_json(200, self.state.detail_view(activity), headers)
+        
+        match = self.STREAMS_PATH.match(url.path)
+        if match:
+            self.state.record('activity_streams')
+            activity = self.state.activities.get(int(match.group(1)))
+            if not activity or activity['athlete']['id'] != athlete_id:
+                return self.send_json(404, {'message': 'Record Not Found'}, headers)
+            streams = generate_activity_streams(activity)
+            keys = params.get('keys')
+            if keys:
+                streams = {name: stream for name, stream in streams.items() if name in keys.split(',')}
+            return self.send_json(200, streams, headers)
+        
+        self.send_json(404, {'message': 'Not Found'}, headers)
+    
+    def list_activities(self, athlete_id, params):
+        page = max(1, int(params.get('page', 1)))
+        per_page = min(200, max(1, int(params.get('per_page', 30))))
+        activities = self.state.athletes[athlete_id]
+        
+        if 'after' in params:
+            activities = [a for a in activities if a['epoch'] > int(params['after'])]
+        if 'before' in params:
+            activities = [a for a in activities if a['epoch'] < int(params['before'])]
+        # Comme Strava : plus récentes d'abord, sauf avec 'after' seul (plus anciennes d'abord)
+        if not ('after' in params and 'before' not in params):
+            activities = list(reversed(activities))
+        
+        window = activities[(page - 1) * per_page:page * per_page]
+        return [self.state.summary_view(a) for a in window]
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == '/_reset':
+            self.state.reset_stats()
+            return self.send_json(200, {'status': 'reset'})
+        
+        if url.path == '/oauth/token':
+            self.state.record('token')
+            length = int(self.headers.get('Content-Length', 0))
+            form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+            athlete_id = int(form.get('code') or str(form.get('refresh_token', '')).replace('refresh-', '') or
+                             BASE_ATHLETE_ID + 1)
+            return self.send_json(200, {
+                'token_type': 'Bearer',
+                'access_token': f'fake-{athlete_id}',
+                'refresh_token': f'refresh-{athlete_id}',
+                'expires_at': int(time.time()) + 21600,
+                'expires_in': 21600,
+                'athlete': {'id': athlete_id, 'firstname': 'Synthetic', 'lastname': str(athlete_id)}
+            })
+        
+        self.send_json(404, {'message': 'Not Found'})
+
+
+def start_server(state, host='127.0.0.1', port=0):
+    """Démarrer le faux serveur dans un thread ; retourne (serveur, URL de base)"""
+    handler = type('BoundFakeStravaHandler', (FakeStravaHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--athletes', type=int, default=1, help="Nombre d'athlètes synthétiques")
+    parser.add_argument('--activities', type=int, default=2000, help="Activités par athlète")
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Proportion de réponses 503")
+    parser.add_argument('--short-limit', type=int, default=600, help="Requêtes par fenêtre courte")
+    parser.add_argument('--daily-limit', type=int, default=30000)
+    parser.add_argument('--window-seconds', type=int, default=900, help="Durée de la fenêtre courte")
+    parser.add_argument('--detail-ratio', type=float, default=0.3,
+                        help="Part des résumés sans suffer_score (enrichissement par /activities/<id>)")
+
+
+def state_from_arguments(args):
+    return FakeStravaState(
+        athletes=args.athletes, activities=args.activities, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, error_rate=args.error_rate, short_limit=args.short_limit,
+        daily_limit=args.daily_limit, window_seconds=args.window_seconds, detail_ratio=args.detail_ratio
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    
+    server, base_url = start_server(state_from_arguments(args), args.host, args.port)
+    print(f"🧪 Faux serveur Strava : {base_url}/api/v3 ({args.athletes} athlète(s) x {args.activities} activités)")
+    print(f"   Jetons : fake-{BASE_ATHLETE_ID + 1} ... fake-{BASE_ATHLETE_ID + args.athletes}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
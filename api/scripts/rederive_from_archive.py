@@ -0,0 +1,91 @@
+# Fichier: api/scripts/rederive_from_archive.py
+"""
+Reconstruire activity_summary, activity_strava_metrics et les tracés depuis l'archive des réponses
+Strava brutes (data/raw), sans aucun appel API : à lancer après l'ajout d'une métrique
+ou la correction d'une colonne dérivée (week, day_name...).
+
+Usage (depuis api/) :
+    python -m scripts.rederive_from_archive
+    python -m scripts.rederive_from_archive --athlete-id 3 --batch-size 1000
+"""
+import argparse
+import time
+
+from app import create_app
+from models.database import db, Athlete
+from services.payload_archive import get_payload_archive
+from services.strava_service import StravaService
+
+
+def rederive_athlete(strava_service, archive, athlete, batch_size):
+    """Ré-appliquer les payloads archivés les plus récents d'un athlète, par lots"""
+    summaries = archive.latest_index('summary', owner_id=athlete.strava_id)
+    details = archive.latest_index('detail', owner_id=athlete.strava_id)
+    strava_ids = sorted(set(summaries) | set(details))
+    
+    activities_written = 0
+    metrics_written = 0
+    for offset in range(0, len(strava_ids), batch_size):
+        chunk = strava_ids[offset:offset + batch_size]
+        activity_payloads = []
+        metrics_payloads = {}
+        for strava_id in chunk:
+            summary = summaries.get(strava_id)
+            detail = details.get(strava_id)
+            detail_payload = archive.load(detail[0]) if detail else None
+            
+            # Ligne activité : réponse la plus récente (résumé ou détail)
+            if detail and (not summary or detail[1] >= summary[1]):
+                activity_payloads.append(detail_payload)
+            else:
+                activity_payloads.append(archive.load(summary[0]))
+            # Métriques : activité détaillée si disponible
+            metrics_payloads[strava_id] = detail_payload or activity_payloads[-1]
+        
+        batch = strava_service.process_activities_batch(
+            activity_payloads, athlete.id, update_existing=True, force_update=True
+        )
+        activity_ids = {**batch['inserted_ids'], **batch['updated_ids']}
+        activities_written += len(activity_ids)
+        
+        rows = [strava_service.build_strava_metrics_row(activity_ids[strava_id], payload)
+                for strava_id, payload in metrics_payloads.items() if strava_id in activity_ids]
+        metrics_written += strava_service.insert_strava_metrics_rows(rows, update_existing=True)
+    
+    return activities_written, metrics_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-dériver les activités depuis l'archive Strava")
+    parser.add_argument('--athlete-id', type=int)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        archive = get_payload_archive()
+        if archive is None:
+            print("❌ Archive désactivée (PAYLOAD_ARCHIVE_ENABLED=false)")
+            return
+        
+        strava_service = StravaService()
+        query = Athlete.query.order_by(Athlete.id)
+        if args.athlete_id:
+            query = query.filter(Athlete.id == args.athlete_id)
+        
+        started = time.perf_counter()
+        total_activities = 0
+        for athlete in query.all():
+            activities, metrics = rederive_athlete(strava_service, archive, athlete, args.batch_size)
+            total_activities += activities
+            print(f"Athlète {athlete.id} ({athlete.firstname} {athlete.lastname}): "
+                  f"{activities} activités, {metrics} lignes de métriques")
+        
+        elapsed = time.perf_counter() - started
+        rate = total_activities / elapsed if elapsed else 0
+        print(f"✅ {total_activities} activités re-dérivées en {elapsed:.1f}s ({rate:.0f} activités/s), 0 appel API")
+        db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Fichier: api/scripts/replay_webhook_events.py
+"""
+Rejouer des événements webhook Strava enregistrés contre l'API locale
+(stand-in de l'abonnement push : validation de l'abonnement puis POST de chaque événement)
+
+Usage (depuis api/) :
+    python -m scripts.replay_webhook_events --verify-token mon-token
+    python -m scripts.replay_webhook_events --file events.json --owner-id 134815 --activity-id 12345678
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+import requests
+
+DEFAULT_EVENTS_FILE = os.path.join(os.path.dirname(__file__), 'sample_webhook_events.json')
+
+
+def validate_subscription(url, verify_token):
+    """Reproduire la requête GET de validation envoyée par Strava à la création de l'abonnement"""
+    challenge = uuid.uuid4().hex
+    response = requests.get(url, params={
+        'hub.mode': 'subscribe',
+        'hub.verify_token': verify_token,
+        'hub.challenge': challenge
+    }, timeout=5)
+    
+    ok = response.status_code == 200 and response.json().get('hub.challenge') == challenge
+    print(f"Validation abonnement: {'OK' if ok else 'ÉCHEC'} ({response.status_code})")
+    return ok
+
+
+def load_events(path, owner_id=None, activity_id=None):
+    with open(path) as f:
+        events = json.load(f)
+    
+    # Cibler un athlète / une activité réels de la base locale
+    for event in events:
+        if owner_id:
+            if event['object_type'] == 'athlete':
+                event['object_id'] = owner_id
+            event['owner_id'] = owner_id
+        if activity_id and event['object_type'] == 'activity':
+            event['object_id'] = activity_id
+    return events
+
+
+def replay(url, events, delay=0.0):
+    """Poster les événements dans l'ordre ; Strava exige un acquittement en moins de 2 s"""
+    slow = 0
+    for event in events:
+        started = time.perf_counter()
+        response = requests.post(url, json=event, timeout=5)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms > 2000:
+            slow += 1
+        
+        print(f"{event['object_type']:<8} {event['aspect_type']:<7} {event['object_id']:<12} "
+              f"-> {response.status_code} {response.text.strip()} ({elapsed_ms:.0f} ms)")
+        if delay:
+            time.sleep(delay)
+    
+    if slow:
+        print(f"⚠️  {slow} événement(s) acquitté(s) en plus de 2 s : Strava les relivrerait")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rejouer des événements webhook Strava')
+    parser.add_argument('--url', default='http://localhost:5000/webhooks/strava')
+    parser.add_argument('--file', default=DEFAULT_EVENTS_FILE)
+    parser.add_argument('--verify-token', default=os.environ.get('STRAVA_WEBHOOK_VERIFY_TOKEN'))
+    parser.add_argument('--owner-id', type=int, help='strava_id de l\'athlète cible')
+    parser.add_argument('--activity-id', type=int, help='strava_id de l\'activité cible')
+    parser.add_argument('--delay', type=float, default=0.0, help='pause entre deux événements (s)')
+    args = parser.parse_args()
+    
+    if args.verify_token and not validate_subscription(args.url, args.verify_token):
+        return
+    
+    replay(args.url, load_events(args.file, args.owner_id, args.activity_id), args.delay)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Fichier: api/scripts/stream_store.py
+"""
+Maintenance du store mmap des streams (data/streams) :
+
+    export   copier dans les packs les streams en base qui n'y sont pas encore
+    verify   contrôle d'intégrité (structure, bornes, CRC de chaque enregistrement)
+    compact  réécrire les packs sans les versions remplacées ni les suppressions
+    bench    parcourir tous les streams d'un athlète : store mmap vs décodage en base
+
+Usage (depuis api/) :
+    python -m scripts.stream_store export
+    python -m scripts.stream_store verify --athlete-id 3
+    python -m scripts.stream_store compact
+    python -m scripts.stream_store bench --athlete-id 3
+"""
+import argparse
+import sys
+import time
+
+from app import create_app
+from models.database import db, Athlete, ActivitySummary
+from models.streams import ActivityStreams
+from services.stream_codec import decode_streams
+from services.stream_store import get_stream_store
+from services.streams_service import StreamsService
+
+
+def export(store, athlete_ids):
+    service = StreamsService()
+    for athlete_id in athlete_ids:
+        started = time.perf_counter()
+        exported = service.export_athlete_streams(athlete_id)
+        print(f"Athlète {athlete_id}: {exported} activités exportées en {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def verify(store, athlete_ids):
+    failures = 0
+    for athlete_id in athlete_ids:
+        report = store.verify(athlete_id)
+        status = 'OK' if report['ok'] else 'ERREUR'
+        print(f"Athlète {athlete_id}: {status} - {report['live_activities']} activités, "
+              f"{report['dead_records']} enregistrements morts, {report['size_bytes'] / 1024 / 1024:.1f} Mo")
+        if report['corrupted_activities']:
+            print(f"   CRC invalide: {report['corrupted_activities']}")
+        for error in report['errors']:
+            print(f"   Offset {error['offset']}: {error['error']} ({report['trailing_bytes']} octets ignorés)")
+        failures += 0 if report['ok'] else 1
+    return 1 if failures else 0
+
+
+def compact(store, athlete_ids):
+    for athlete_id in athlete_ids:
+        result = store.compact(athlete_id)
+        print(f"Athlète {athlete_id}: {result['live_activities']} activités conservées, "
+              f"{result['reclaimed_bytes'] / 1024 / 1024:.1f} Mo récupérés"
+              + (f", {result['dropped_corrupted']} corrompues écartées" if result['dropped_corrupted'] else ''))
+    return 0
+
+
+def bench(store, athlete_ids):
+    """Somme du stream watts de toutes les activités : même résultat, deux chemins de lecture"""
+    for athlete_id in athlete_ids:
+        started = time.perf_counter()
+        total_store = 0
+        activities_store = 0
+        for _, streams in store.iter_activities(athlete_id, ('watts',)):
+            if 'watts' in streams:
+                total_store += int(streams['watts'].sum(dtype='int64'))
+                activities_store += 1
+        store_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        total_db = 0
+        rows = db.session.query(ActivityStreams.data)\
+            .join(ActivitySummary, ActivitySummary.id == ActivityStreams.activity_id)\
+            .filter(ActivitySummary.athlete_id == athlete_id)\
+            .filter(ActivityStreams.stream_types.like('%watts%'))
+        for (data,) in rows.yield_per(100):
+            total_db += int(decode_streams(bytes(data), ('watts',))['watts'].sum(dtype='int64'))
+        db_seconds = time.perf_counter() - started
+        
+        print(f"Athlète {athlete_id}: {activities_store} activités avec puissance")
+        print(f"   store mmap : {store_seconds * 1000:.1f} ms (total {total_store} J)")
+        print(f"   base + zlib: {db_seconds * 1000:.1f} ms (total {total_db} J)")
+    return 0
+
+
+COMMANDS = {'export': export, 'verify': verify, 'compact': compact, 'bench': bench}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance du store mmap des streams")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--athlete-id', type=int)
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        store = get_stream_store()
+        if store is None:
+            print("❌ Store désactivé (STREAM_STORE_ENABLED=false)")
+            return 1
+        
+        if args.athlete_id:
+            athlete_ids = [args.athlete_id]
+        elif args.command == 'export':
+            athlete_ids = [athlete_id for (athlete_id,) in db.session.query(Athlete.id).order_by(Athlete.id)]
+        else:
+            athlete_ids = store.athlete_ids()
+        
+        return COMMANDS[args.command](store, athlete_ids)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
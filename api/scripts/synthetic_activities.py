@@ -0,0 +1,160 @@
+# Fichier: api/scripts/synthetic_activities.py
+"""
+Générateur d'activités Strava synthétiques (format résumé /athlete/activities)
+pour les benchmarks et les tests de charge sans compte Strava réel
+"""
+import math
+import random
+from datetime import datetime, timedelta
+
+from services.geo import encode_polyline
+
+ACTIVITY_TYPES = [
+    ('Ride', 'Ride', 0.45),
+    ('VirtualRide', 'VirtualRide', 0.15),
+    ('Run', 'Run', 0.30),
+    ('Walk', 'Walk', 0.10),
+]
+
+
+def generate_activity_summaries(count, seed=42, first_strava_id=9_000_000_000, end_date=None,
+                                athlete_strava_id=134815):
+    """
+    Générer `count` résumés d'activités, du plus ancien au plus récent,
+    espacés d'environ une activité par jour
+    """
+    rng = random.Random(seed)
+    # Générateur séparé : les tracés ne changent pas les autres valeurs d'une graine donnée
+    route_rng = random.Random(seed + 1_000_003)
+    end_date = end_date or datetime(2024, 12, 31, 18, 0, 0)
+    start = end_date - timedelta(days=count)
+    
+    activities = []
+    for i in range(count):
+        activity_type, sport_type, _ = rng.choices(ACTIVITY_TYPES, weights=[t[2] for t in ACTIVITY_TYPES])[0]
+        start_date = start + timedelta(days=i, minutes=rng.randint(0, 600))
+        
+        if activity_type in ('Ride', 'VirtualRide'):
+            moving_time = rng.randint(1800, 5 * 3600)
+            speed = rng.uniform(6.5, 10.5)
+        elif activity_type == 'Run':
+            moving_time = rng.randint(1200, 3 * 3600)
+            speed = rng.uniform(2.6, 4.2)
+        else:
+            moving_time = rng.randint(1200, 2 * 3600)
+            speed = rng.uniform(1.1, 1.6)
+        
+        has_power = activity_type == 'VirtualRide' or (activity_type == 'Ride' and rng.random() < 0.7)
+        average_watts = round(rng.uniform(140, 260), 1) if has_power else None
+        
+        activities.append({
+            'id': first_strava_id + i,
+            'athlete': {'id': athlete_strava_id, 'resource_state': 1},
+            'name': f"{activity_type} synthétique #{i}",
+            'type': activity_type,
+            'sport_type': sport_type,
+            'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'start_date_local': (start_date + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'distance': round(moving_time * speed, 1),
+            'moving_time': moving_time,
+            'elapsed_time': moving_time + rng.randint(0, 900),
+            'total_elevation_gain': round(rng.uniform(0, 1500 if activity_type == 'Ride' else 300), 1),
+            'average_speed': round(speed, 3),
+            'max_speed': round(speed * rng.uniform(1.3, 2.0), 3),
+            'average_heartrate': round(rng.uniform(120, 165), 1),
+            'max_heartrate': rng.randint(165, 195),
+            'has_heartrate': True,
+            'average_watts': average_watts,
+            'weighted_average_watts': round(average_watts * rng.uniform(1.02, 1.15), 1) if has_power else None,
+            'max_watts': rng.randint(500, 1100) if has_power else None,
+            'device_watts': has_power and activity_type == 'Ride',
+            'average_cadence': round(rng.uniform(75, 95), 1) if activity_type != 'Walk' else None,
+            'suffer_score': rng.randint(10, 250),
+            'trainer': activity_type == 'VirtualRide',
+            'commute': rng.random() < 0.05,
+            'gear_id': None,
+            'external_id': f"synthetic_{i}.fit",
+            'upload_id': first_strava_id + i,
+            'map': {
+                'id': f"a{first_strava_id + i}",
+                'summary_polyline': '' if activity_type == 'VirtualRide' else
+                    generate_loop_polyline(route_rng, moving_time * speed),
+                'resource_state': 2
+            },
+        })
+    
+    return activities
+
+
+def generate_loop_polyline(rng, distance_m, points=80):
+    """Boucle simplifiée (format map.summary_polyline) autour de Grenoble, longueur ~ distance"""
+    center_lat = 45.19 + rng.uniform(-0.12, 0.12)
+    center_lng = 5.72 + rng.uniform(-0.18, 0.18)
+    radius_m = distance_m / (2 * math.pi)
+    phase = rng.uniform(0, 2 * math.pi)
+    coords = []
+    for k in range(points + 1):
+        angle = phase + 2 * math.pi * k / points
+        wobble = 1 + 0.15 * math.sin(3 * angle + phase)
+        coords.append((
+            center_lat + radius_m * wobble * math.sin(angle) / 111_000,
+            center_lng + radius_m * wobble * math.cos(angle) / 78_000
+        ))
+    return encode_polyline(coords)
+
+
+def generate_activity_streams(activity, seed=None):
+    """
+    Streams 1 Hz synthétiques cohérents avec un résumé généré ci-dessus
+    (format Strava key_by_type : {type: {'data': [...], 'series_type': 'time', ...}})
+    """
+    import numpy as np
+    
+    rng = np.random.default_rng(activity['id'] if seed is None else seed)
+    n = int(activity['moving_time'])
+    time_s = np.arange(n)
+    
+    # Vitesse lissée autour de la moyenne, distance cumulée
+    speed = np.clip(activity['average_speed'] * (1 + np.convolve(rng.normal(0, 0.15, n), np.ones(30) / 30, 'same')),
+                    0.5, activity['max_speed'])
+    distance = np.cumsum(speed)
+    grade = np.convolve(rng.normal(0, 4, n), np.ones(60) / 60, 'same')
+    # Relief : collines de quelques kilomètres (montées détectables par services/stream_analysis.py)
+    if activity['type'] != 'VirtualRide':
+        hill_period = rng.uniform(3000, 9000)
+        grade += rng.uniform(3, 7) * np.sin(2 * np.pi * distance / hill_period + rng.uniform(0, 2 * np.pi))
+    altitude = 200 + np.cumsum(speed * grade / 100)
+    
+    heartrate = np.clip(activity['average_heartrate'] + 12 * np.sin(time_s / 420)
+                        + rng.normal(0, 2, n), 60, activity['max_heartrate'])
+    streams = {
+        'time': time_s,
+        'distance': np.round(distance, 1),
+        'altitude': np.round(altitude, 1),
+        'velocity_smooth': np.round(speed, 2),
+        'grade_smooth': np.round(grade, 1),
+        'heartrate': np.rint(heartrate).astype(int),
+        'moving': np.ones(n, dtype=bool),
+        'latlng': np.round(np.column_stack([
+            45.19 + np.cumsum(speed * np.cos(time_s / 900)) / 111_000,
+            5.72 + np.cumsum(speed * np.sin(time_s / 900)) / 78_000
+        ]), 6)
+    }
+    
+    if activity.get('average_watts'):
+        # Efforts par intervalles au-dessus de la moyenne + bruit pédalage
+        efforts = np.repeat(rng.choice([0.6, 0.9, 1.0, 1.2, 1.5], size=n // 120 + 1, p=[.1, .3, .35, .2, .05]), 120)[:n]
+        watts = np.clip(activity['average_watts'] * efforts + rng.normal(0, 25, n), 0, activity['max_watts'])
+        streams['watts'] = np.rint(watts).astype(int)
+    if activity.get('average_cadence'):
+        streams['cadence'] = np.rint(np.clip(activity['average_cadence'] + rng.normal(0, 4, n), 0, 130)).astype(int)
+    
+    return {
+        name: {
+            'data': values.tolist(),
+            'series_type': 'time',
+            'original_size': n,
+            'resolution': 'high'
+        }
+        for name, values in streams.items()
+    }
@@ -0,0 +1,177 @@
+import time
+from datetime import datetime, timedelta
+from models.database import db, ActivitySummary
+from models.climbs import ActivityClimb
+from services.stream_analysis import detect_climbs, CLIMB_CATEGORIES
+
+# Streams lus par la détection (latlng : pied et sommet des montées)
+CLIMB_STREAM_TYPES = ('time', 'distance', 'altitude', 'latlng')
+
+CLIMB_SORTS = {
+    'gain': ActivityClimb.elevation_gain_m,
+    'grade': ActivityClimb.average_grade,
+    'length': ActivityClimb.length_m,
+    'vam': ActivityClimb.vam,
+    'date': ActivityClimb.start_date_local
+}
+
+
+class ClimbsService:
+    """
+    Montées détectées dans les streams distance / altitude de chaque activité,
+    enregistrées par activité et recherchables sur tout l'historique d'un athlète
+    """
+    
+    @staticmethod
+    def compute_climbs(streams):
+        """Streams décodés -> liste de montées (vide sans distance / altitude)"""
+        if not streams or 'distance' not in streams or 'altitude' not in streams:
+            return []
+        
+        climbs = detect_climbs(streams['distance'], streams['altitude'], streams.get('time'))
+        latlng = streams.get('latlng')
+        if latlng is not None and len(latlng) == len(streams['distance']):
+            for climb in climbs:
+                climb['start_lat'], climb['start_lng'] = (float(value) for value in latlng[climb['start_index']])
+                climb['end_lat'], climb['end_lng'] = (float(value) for value in latlng[climb['end_index']])
+        return climbs
+    
+    @staticmethod
+    def store_climbs(climbs_by_activity):
+        """
+        Remplacer les montées de {activity_id: montées} (un DELETE et un INSERT pour le lot)
+        Une activité sans montée est conservée dans le lot : ses anciennes lignes sont effacées
+        """
+        if not climbs_by_activity:
+            return 0
+        
+        activities = dict(
+            db.session.query(ActivitySummary.id, ActivitySummary)
+            .filter(ActivitySummary.id.in_(list(climbs_by_activity.keys()))).all()
+        )
+        now = datetime.utcnow()
+        columns = {column.name for column in ActivityClimb.__table__.columns} - {'id'}
+        
+        rows = []
+        for activity_id, climbs in climbs_by_activity.items():
+            activity = activities.get(activity_id)
+            if activity is None:
+                continue
+            for climb_index, climb in enumerate(climbs):
+                row = {key: value for key, value in climb.items() if key in columns}
+                row.update({
+                    'activity_id': activity_id,
+                    'climb_index': climb_index,
+                    'athlete_id': activity.athlete_id,
+                    'start_date_local': activity.start_date_local,
+                    'calculated_at': now
+                })
+                rows.append(row)
+        
+        try:
+            ActivityClimb.query.filter(ActivityClimb.activity_id.in_(list(activities.keys())))\
+                .delete(synchronize_session=False)
+            if rows:
+                db.session.execute(ActivityClimb.__table__.insert(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return len(rows)
+    
+    def recompute_for_athlete(self, athlete_id, batch_size=200):
+        """
+        Détecter les montées de tout l'historique d'un athlète : streams lus dans
+        le store mmap (base en secours), enregistrement par lots
+        """
+        # Import local : StreamsService importe ce service pour l'ingestion
+        from services.streams_service import StreamsService
+        
+        started = time.perf_counter()
+        activities = 0
+        climbs = 0
+        batch = {}
+        for activity_id, streams in StreamsService.iter_athlete_streams(athlete_id, CLIMB_STREAM_TYPES):
+            batch[activity_id] = self.compute_climbs(streams)
+            if len(batch) >= batch_size:
+                climbs += self.store_climbs(batch)
+                activities += len(batch)
+                batch = {}
+        if batch:
+            climbs += self.store_climbs(batch)
+            activities += len(batch)
+        
+        return {
+            'activities': activities,
+            'climbs': climbs,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    @staticmethod
+    def search_climbs(athlete_id, min_grade=None, min_gain=None, min_length=None, category=None,
+                      days=None, near=None, sort='gain', limit=50):
+        """
+        Montées d'un athlète filtrées (pente, dénivelé, longueur, catégorie, période,
+        pied à moins de near=(lat, lng, rayon m)) et triées par ordre décroissant
+        """
+        if sort not in CLIMB_SORTS:
+            raise ValueError(f'Tri inconnu: {sort}')
+        
+        query = db.session.query(ActivityClimb, ActivitySummary.name, ActivitySummary.type)\
+            .join(ActivitySummary, ActivitySummary.id == ActivityClimb.activity_id)\
+            .filter(ActivityClimb.athlete_id == athlete_id)
+        if min_grade is not None:
+            query = query.filter(ActivityClimb.average_grade >= min_grade)
+        if min_gain is not None:
+            query = query.filter(ActivityClimb.elevation_gain_m >= min_gain)
+        if min_length is not None:
+            query = query.filter(ActivityClimb.length_m >= min_length)
+        if category is not None:
+            # Catégorie donnée ou plus dure (HC, 1, 2...)
+            categories = [name for name, _ in CLIMB_CATEGORIES]
+            if category not in categories:
+                raise ValueError(f'Catégorie inconnue: {category}')
+            query = query.filter(ActivityClimb.category.in_(categories[:categories.index(category) + 1]))
+        if days is not None:
+            query = query.filter(ActivityClimb.start_date_local >= datetime.utcnow() - timedelta(days=days))
+        if near is not None:
+            lat, lng, radius_m = near
+            dlat = radius_m / 110_540.0
+            query = query.filter(ActivityClimb.start_lat.between(lat - dlat, lat + dlat))
+            query = query.filter(db.func.power((ActivityClimb.start_lat - lat) * 110_540.0, 2)
+                                 + db.func.power((ActivityClimb.start_lng - lng) * 111_320.0
+                                                 * db.func.cos(db.func.radians(lat)), 2) <= radius_m ** 2)
+        
+        rows = query.order_by(CLIMB_SORTS[sort].desc().nullslast(), ActivityClimb.id).limit(limit).all()
+        results = []
+        for climb, name, activity_type in rows:
+            result = climb.to_dict()
+            result['activity_name'] = name
+            result['activity_type'] = activity_type
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def get_activity_climbs(activity_id):
+        climbs = ActivityClimb.query.filter_by(activity_id=activity_id)\
+            .order_by(ActivityClimb.climb_index).all()
+        return [climb.to_dict() for climb in climbs]
+    
+    @staticmethod
+    def get_climbs_summary(athlete_id):
+        """Nombre de montées, dénivelé cumulé et répartition par catégorie"""
+        totals = db.session.query(
+            db.func.count(ActivityClimb.id),
+            db.func.coalesce(db.func.sum(ActivityClimb.elevation_gain_m), 0),
+            db.func.count(db.distinct(ActivityClimb.activity_id))
+        ).filter(ActivityClimb.athlete_id == athlete_id).first()
+        by_category = db.session.query(ActivityClimb.category, db.func.count(ActivityClimb.id))\
+            .filter(ActivityClimb.athlete_id == athlete_id)\
+            .group_by(ActivityClimb.category).all()
+        return {
+            'climbs': totals[0],
+            'elevation_gain_m': round(float(totals[1]), 1),
+            'activities': totals[2],
+            'by_category': {category or 'non classée': count for category, count in by_category}
+        }
@@ -1,9 +1,34 @@
 from models.database import db, ActivitySummary
 from models.strava_metrics import ActivityStravaMetrics
-from models.custom_metrics import ActivityCustomMetrics, AthleteSettings
+from models.custom_metrics import ActivityCustomMetrics, AthleteSettings, AthleteFtpHistory
+from models.power_curve import ActivityPowerCurve
+from models.streams import ActivityStreams
+from services.ftp_history_service import FtpHistoryService
+from services.power_curve_service import PowerCurveService
+from services.rollup_service import ActivityRollupService
+from services.stream_analysis import BEST_EFFORT_DISTANCES, best_efforts, moving_1hz, normalized_power
+from services.stream_codec import decode_streams
+from services.training_load_service import TrainingLoadService
+from services.stats_views_service import StatsViewsService
+from services.zones_service import ZonesService
 from datetime import datetime
+from sqlalchemy import case, select, update
 import math
 
+# Colonnes activity_custom_metrics des meilleurs efforts (services/stream_analysis.py)
+DISTANCE_RECORD_COLUMNS = {
+    '400m': 'best_400m_time',
+    '1km': 'best_1km_time',
+    '1mile': 'best_1mile_time',
+    '5km': 'best_5km_time',
+    '10km': 'best_10km_time',
+    'half_marathon': 'best_half_marathon_time',
+    'marathon': 'best_marathon_time'
+}
+
+# Au-delà du record du monde du 400 m (~9,3 m/s) : saut GPS
+MAX_RUNNING_SPEED = 10.0
+
 class CustomCalculationsService:
     """
     Service pour calculs personnalisés basés sur données Strava existantes
@@ -42,128 +67,296 @@ class CustomCalculationsService:
         # ✅ CORRECTION : Conversion en float
         return round(float(normalized_power) / float(user_ftp), 4)
     
-    def estimate_power_records(self, activity, strava_metrics):
+    @staticmethod
+    def stream_power_metrics(streams):
         """
-        Estimer les records de puissance basés sur la durée et NP
-        AVEC FILTRES INTELLIGENTS pour éviter les données aberrantes
+        Normalized Power calculée depuis le stream watts (pauses exclues, roue libre conservée)
+        Retourne {'normalized_power', 'duration_hours'} ou None sans stream exploitable
         """
-        # ✅ FILTRE 1: Seulement activités avec puissance (vélo)
-        if activity.type not in ['Ride', 'VirtualRide', 'EBikeRide']:
-            return {
-                'best_1min_power': None,
-                'best_5min_power': None,
-                'best_20min_power': None
-            }
-        
-        if not strava_metrics or not strava_metrics.weighted_average_watts:
-            return {
-                'best_1min_power': None,
-                'best_5min_power': None,
-                'best_20min_power': None
-            }
+        if not streams or 'watts' not in streams or 'time' not in streams:
+            return None
         
-        np = float(strava_metrics.weighted_average_watts)
-        duration_minutes = float(activity.moving_time_hours or 0) * 60
+        watts = moving_1hz(streams['time'], streams['watts'])
+        np_value = normalized_power(watts)
+        if not np_value:
+            return None
+        return {'normalized_power': int(round(np_value)), 'duration_hours': watts.size / 3600}
+    
+    def calculate_load_metrics(self, stream_metrics, strava_metrics, activity, user_ftp):
+        """
+        TSS / IF depuis la NP du stream si disponible, sinon depuis la NP Strava
+        (weighted_average_watts) ; calculation_method indique la source
+        """
+        if stream_metrics:
+            np_value = stream_metrics['normalized_power']
+            duration_hours = stream_metrics['duration_hours']
+            method = 'stream_np'
+        elif strava_metrics and strava_metrics.weighted_average_watts:
+            np_value = float(strava_metrics.weighted_average_watts)
+            # ✅ CORRECTION : Gestion des valeurs None
+            duration_hours = float(activity.moving_time_hours or 0)
+            method = 'strava_based'
+        else:
+            return {'normalized_power': None, 'custom_tss': None, 'intensity_factor': None,
+                    'load_duration_hours': None, 'calculation_method': 'strava_based'}
         
-        # ✅ FILTRE 2: Ignorer puissances aberrantes
-        # Plus de 600W soutenu = niveau pro/données suspectes
-        if np > 600:
-            return {
-                'best_1min_power': None,
-                'best_5min_power': None,
-                'best_20min_power': None
-            }
+        return {
+            'normalized_power': int(round(np_value)),
+            'custom_tss': self.calculate_custom_tss(np_value, duration_hours, user_ftp),
+            'intensity_factor': self.calculate_intensity_factor(np_value, user_ftp),
+            'load_duration_hours': round(duration_hours, 4),
+            'calculation_method': method
+        }
+    
+    def store_stream_power_metrics(self, metrics_by_activity):
+        """
+        Reporter la NP des streams {activity_id: stream_power_metrics} dans les métriques
+        déjà calculées (TSS/IF recalculés avec le FTP de chaque ligne), mise à jour groupée
+        """
+        metrics_by_activity = {activity_id: m for activity_id, m in metrics_by_activity.items() if m}
+        if not metrics_by_activity:
+            return 0
         
-        # ✅ FILTRE 3: Ignorer puissances trop faibles (< 50W = erreur)
-        if np < 50:
-            return {
-                'best_1min_power': None,
-                'best_5min_power': None,
-                'best_20min_power': None
-            }
+        existing = db.session.query(
+            ActivityCustomMetrics.id, ActivityCustomMetrics.activity_id, ActivityCustomMetrics.user_ftp
+        ).filter(ActivityCustomMetrics.activity_id.in_(list(metrics_by_activity.keys()))).all()
+        
+        updates = []
+        for metrics_id, activity_id, user_ftp in existing:
+            load = self.calculate_load_metrics(metrics_by_activity[activity_id], None, None, user_ftp)
+            updates.append({
+                'id': metrics_id,
+                'normalized_power': load['normalized_power'],
+                'custom_tss': load['custom_tss'],
+                'intensity_factor': load['intensity_factor'],
+                'training_load': load['custom_tss'],
+                'load_duration_hours': load['load_duration_hours'],
+                'calculation_method': load['calculation_method'],
+                'calculated_at': datetime.utcnow()
+            })
         
-        # ✅ FILTRE 4: Ignorer activités sans durée
-        if duration_minutes <= 0:
-            return {
-                'best_1min_power': None,
-                'best_5min_power': None,
-                'best_20min_power': None
-            }
+        try:
+            if updates:
+                db.session.execute(update(ActivityCustomMetrics), updates)
+                TrainingLoadService.mark_activities_dirty(activity_id for _, activity_id, _ in existing)
+                ActivityRollupService().refresh_activities(activity_id for _, activity_id, _ in existing)
+                StatsViewsService.mark_stale()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(updates)
+    
+    def recalculate_ftp_versions(self, athlete_id):
+        """
+        Recalculer IF / TSS des métriques dont la version de FTP n'est plus celle en vigueur
+        à la date de l'activité, à partir du premier jour marqué par l'historique FTP,
+        en une requête UPDATE ... FROM (FTP de chaque activité par LATERAL sur l'historique)
+        NP : celle du stream pour 'stream_np', sinon la NP Strava (comme calculate_load_metrics)
+        """
+        metrics = ActivityCustomMetrics.__table__
+        activities = ActivitySummary.__table__
+        strava_metrics = ActivityStravaMetrics.__table__
+        history = AthleteFtpHistory.__table__
+        FtpHistoryService().ensure_history(athlete_id)
+        
+        try:
+            # Verrou des paramètres : une modification d'historique attend la fin du recalcul
+            settings = AthleteSettings.query.filter_by(athlete_id=athlete_id).with_for_update().first()
+            if settings is None or settings.ftp_dirty_from is None:
+                db.session.rollback()
+                return 0
+            
+            # Ligne en vigueur : la plus récente avant la date, sinon la plus ancienne de l'historique
+            day = db.func.date(activities.c.start_date_local)
+            entry = select(history.c.id, history.c.ftp)\
+                .where(history.c.athlete_id == activities.c.athlete_id)\
+                .order_by(history.c.effective_date > day, db.func.abs(day - history.c.effective_date))\
+                .limit(1).lateral()
+            source = select(
+                activities.c.id, activities.c.start_date_local, activities.c.moving_time_hours,
+                strava_metrics.c.weighted_average_watts, entry.c.id.label('ftp_version'), entry.c.ftp
+            ).select_from(
+                activities.outerjoin(strava_metrics, strava_metrics.c.activity_id == activities.c.id)
+                .join(entry, db.true())
+            ).where(activities.c.athlete_id == athlete_id)\
+             .where(activities.c.start_date_local >= settings.ftp_dirty_from).subquery()
+            
+            is_stream = metrics.c.calculation_method == 'stream_np'
+            np_value = db.cast(case((is_stream, metrics.c.normalized_power), else_=source.c.weighted_average_watts), db.Float)
+            # Lignes antérieures à load_duration_hours : durée déduite du TSS et de l'IF stockés
+            stored_if = db.cast(metrics.c.intensity_factor, db.Float)
+            duration_hours = db.func.coalesce(
+                metrics.c.load_duration_hours,
+                case((is_stream & (stored_if > 0), db.cast(metrics.c.custom_tss, db.Float) / (stored_if * stored_if * 100)),
+                     else_=db.cast(source.c.moving_time_hours, db.Float))
+            )
+            computable = (np_value > 0) & (duration_hours > 0)
+            ftp = db.cast(source.c.ftp, db.Float)
+            tss = case((computable, db.func.round(db.cast(duration_hours * np_value * np_value / (ftp * ftp) * 100, db.Numeric), 1)))
+            
+            stmt = update(metrics).where(metrics.c.activity_id == source.c.id)\
+                .where(metrics.c.ftp_version.is_distinct_from(source.c.ftp_version)).values(
+                    user_ftp=source.c.ftp,
+                    ftp_version=source.c.ftp_version,
+                    intensity_factor=case((computable, db.func.round(db.cast(np_value / ftp, db.Numeric), 4))),
+                    custom_tss=tss,
+                    training_load=tss,
+                    load_duration_hours=case((computable, duration_hours)),
+                    calculated_at=datetime.utcnow()
+                ).returning(metrics.c.activity_id, source.c.start_date_local)
+            
+            updated = db.session.execute(stmt).fetchall()
+            settings.ftp_dirty_from = None
+            if updated:
+                days = {row.start_date_local.date() for row in updated}
+                TrainingLoadService.mark_dirty(athlete_id, min(days))
+                ActivityRollupService().refresh_days({(athlete_id, day) for day in days})
+                StatsViewsService.mark_stale()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(updated)
+    
+    def ensure_ftp_current(self, athlete_id):
+        """Avant une lecture de TSS / IF : recalcul des métriques en attente (sinon une lecture par clé)"""
+        settings = AthleteSettings.query.get(athlete_id)
+        if settings is None or settings.ftp_dirty_from is None:
+            return 0
+        return self.recalculate_ftp_versions(athlete_id)
+    
+    def recalculate_pending_ftp(self, limit=20):
+        """Recalcul en tâche de fond des athlètes dont l'historique FTP a changé (workers inoccupés)"""
+        athlete_ids = [athlete_id for (athlete_id,) in db.session.query(AthleteSettings.athlete_id)
+                       .filter(AthleteSettings.ftp_dirty_from.isnot(None))
+                       .order_by(AthleteSettings.ftp_dirty_from).limit(limit)]
+        db.session.rollback()
+        return {athlete_id: self.recalculate_ftp_versions(athlete_id) for athlete_id in athlete_ids}
+    
+    def recompute_stream_metrics(self, athlete_id, batch_size=500):
+        """
+        Recalculer NP / TSS / IF depuis les streams watts pour tout l'historique de l'athlète
+        (décodage et calcul vectorisés, mises à jour groupées par lot)
+        """
+        updated = 0
+        last_activity_id = 0
+        while True:
+            batch = db.session.query(ActivityStreams.activity_id, ActivityStreams.data)\
+                .join(ActivityCustomMetrics, ActivityCustomMetrics.activity_id == ActivityStreams.activity_id)\
+                .filter(ActivityCustomMetrics.athlete_id == athlete_id)\
+                .filter(ActivityStreams.stream_types.like('%watts%'))\
+                .filter(ActivityStreams.activity_id > last_activity_id)\
+                .order_by(ActivityStreams.activity_id)\
+                .limit(batch_size).all()
+            if not batch:
+                break
+            
+            updated += self.store_stream_power_metrics({
+                activity_id: self.stream_power_metrics(decode_streams(bytes(data), ('time', 'watts')))
+                for activity_id, data in batch
+            })
+            last_activity_id = batch[-1].activity_id
         
-        # Facteurs d'estimation basés sur courbes de puissance typiques
-        if duration_minutes >= 20:
-            # Activité de 20+ min, NP est proche de la puissance 20min
-            best_20min = int(np)
-            best_5min = int(np * 1.15)   # ~15% plus élevé pour 5min
-            best_1min = int(np * 1.35)   # ~35% plus élevé pour 1min
-        elif duration_minutes >= 5:
-            # Activité de 5-20min
-            best_20min = int(np * 0.95)  # Légèrement en dessous
-            best_5min = int(np)
-            best_1min = int(np * 1.20)
-        else:
-            # Activité courte < 5min
-            best_20min = int(np * 0.85)
-            best_5min = int(np * 0.95)
-            best_1min = int(np)
+        return updated
+    
+    def get_power_records(self, activity):
+        """
+        Records de puissance 1/5/20 min réels de l'activité : puissance moyenne maximale
+        calculée depuis le stream watts (activity_power_curve) ; None sans stream de puissance
+        """
+        curve = dict(
+            db.session.query(ActivityPowerCurve.duration_seconds, ActivityPowerCurve.watts)
+            .filter(ActivityPowerCurve.activity_id == activity.id)
+            .filter(ActivityPowerCurve.duration_seconds.in_([60, 300, 1200]))
+            .all()
+        )
         
-        # ✅ FILTRE 5: Vérification finale des valeurs
         return {
-            'best_1min_power': best_1min if 100 <= best_1min <= 800 else None,
-            'best_5min_power': best_5min if 100 <= best_5min <= 600 else None,
-            'best_20min_power': best_20min if 100 <= best_20min <= 500 else None
+            'best_1min_power': curve.get(60),
+            'best_5min_power': curve.get(300),
+            'best_20min_power': curve.get(1200)
+        }
+    
+    def detect_distance_records(self, activity, streams=None):
+        """
+        Meilleurs efforts 400 m -> marathon trouvés n'importe où dans l'activité
+        depuis les streams distance/temps (course et marche uniquement)
+        Sans streams : estimation depuis le résumé de l'activité
+        """
+        records = {column: None for column in DISTANCE_RECORD_COLUMNS.values()}
+        if activity.type not in ['Run', 'Walk']:
+            return records
+        
+        if streams is None:
+            row = db.session.query(ActivityStreams.data)\
+                .filter(ActivityStreams.activity_id == activity.id).first()
+            streams = decode_streams(bytes(row.data), ('time', 'distance')) if row and row.data else None
+        
+        if not streams or 'time' not in streams or 'distance' not in streams:
+            records.update(self.estimate_distance_records(activity))
+            return records
+        
+        for name, seconds in best_efforts(streams['time'], streams['distance']).items():
+            # Vitesse impossible = saut GPS, effort ignoré
+            if seconds <= 0 or BEST_EFFORT_DISTANCES[name] / seconds > MAX_RUNNING_SPEED:
+                continue
+            records[DISTANCE_RECORD_COLUMNS[name]] = seconds
+        
+        return records
+    
+    def store_distance_records(self, records_by_activity):
+        """Reporter les meilleurs efforts {activity_id: records} dans les métriques déjà calculées"""
+        try:
+            for activity_id, records in records_by_activity.items():
+                ActivityCustomMetrics.query.filter_by(activity_id=activity_id)\
+                    .update(records, synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(records_by_activity)
+    
+    def recompute_distance_records(self, athlete_id):
+        """Recalculer les meilleurs efforts des courses de l'athlète dont les streams sont stockés"""
+        activities = db.session.query(ActivitySummary, ActivityStreams.data)\
+            .join(ActivityStreams, ActivitySummary.id == ActivityStreams.activity_id)\
+            .filter(ActivitySummary.athlete_id == athlete_id)\
+            .filter(ActivitySummary.type.in_(['Run', 'Walk']))\
+            .filter(ActivityStreams.stream_types.like('%distance%')).all()
+        
+        records_by_activity = {
+            activity.id: self.detect_distance_records(activity, decode_streams(bytes(data), ('time', 'distance')))
+            for activity, data in activities
         }
+        return self.store_distance_records(records_by_activity)
     
-    def detect_distance_records(self, activity):
+    def estimate_distance_records(self, activity):
         """
-        Détecter les records de distance basés sur distance exacte et temps
-        AVEC FILTRES INTELLIGENTS pour éviter les données aberrantes
+        Estimation des records de distance sans streams : activité entière proche
+        d'une distance standard, AVEC FILTRES INTELLIGENTS pour éviter les données aberrantes
         """
         # ✅ FILTRE 1: Seulement course/marche pour les records de distance
         if activity.type not in ['Run', 'Walk']:
-            return {
-                'best_1km_time': None,
-                'best_5km_time': None,
-                'best_10km_time': None,
-                'best_half_marathon_time': None,
-                'best_marathon_time': None
-            }
+            return {}
         
         distance_km = float(activity.distance_km or 0)
         time_seconds = activity.moving_time_seconds or 0
         
         # ✅ FILTRE 2: Ignorer distance nulle ou temps invalide
         if distance_km <= 0 or time_seconds <= 0:
-            return {
-                'best_1km_time': None,
-                'best_5km_time': None,
-                'best_10km_time': None,
-                'best_half_marathon_time': None,
-                'best_marathon_time': None
-            }
+            return {}
         
         # ✅ FILTRE 3: Ignorer les allures aberrantes
         pace_per_km_seconds = time_seconds / distance_km
         # Plus rapide que 2:30/km = suspect (record mondial marathon ~2:55/km)
         if pace_per_km_seconds < 150:  # 2:30/km
-            return {
-                'best_1km_time': None,
-                'best_5km_time': None,
-                'best_10km_time': None,
-                'best_half_marathon_time': None,
-                'best_marathon_time': None
-            }
+            return {}
         
         # ✅ FILTRE 4: Ignorer les allures trop lentes (marche très lente)
         # Plus lent que 12:00/km = probablement une erreur
         if pace_per_km_seconds > 720:  # 12:00/km
-            return {
-                'best_1km_time': None,
-                'best_5km_time': None,
-                'best_10km_time': None,
-                'best_half_marathon_time': None,
-                'best_marathon_time': None
-            }
+            return {}
         
         # Vérifier les distances standard avec tolérance
         records = {}
@@ -188,17 +381,12 @@ class CustomCalculationsService:
         elif 40.0 <= distance_km <= 43.0:
             records['best_marathon_time'] = int(time_seconds * (42.2 / distance_km))
         
-        # Remplir les autres avec None
-        for distance in ['best_1km_time', 'best_5km_time', 'best_10km_time', 
-                        'best_half_marathon_time', 'best_marathon_time']:
-            if distance not in records:
-                records[distance] = None
-                
         return records
     
-    def calculate_activity_custom_metrics(self, activity_id, athlete_id, user_ftp=None):
+    def calculate_activity_custom_metrics(self, activity_id, athlete_id):
         """
         Calculer toutes les métriques personnalisées pour une activité
+        (FTP en vigueur à sa date dans l'historique FTP, version enregistrée)
         """
         # Récupérer l'activité et ses métriques Strava
         activity = ActivitySummary.query.get(activity_id)
@@ -207,10 +395,9 @@ class CustomCalculationsService:
         
         strava_metrics = ActivityStravaMetrics.query.filter_by(activity_id=activity_id).first()
         
-        # Récupérer ou utiliser FTP par défaut
-        if not user_ftp:
-            settings = AthleteSettings.query.get(athlete_id)
-            user_ftp = settings.current_ftp if settings else self.default_ftp
+        # FTP en vigueur à la date de l'activité (historique FTP)
+        entry = FtpHistoryService().entry_for_day(athlete_id, activity.start_date_local.date())
+        user_ftp, ftp_version = entry.ftp, entry.id
         
         # Vérifier si calculs déjà existants
         existing = ActivityCustomMetrics.query.filter_by(
@@ -221,34 +408,36 @@ class CustomCalculationsService:
         if existing:
             return existing
         
-        # Calculs TSS personnalisés
-        custom_tss = None
-        intensity_factor = None
+        # Streams stockés (NP, records de distance)
+        row = db.session.query(ActivityStreams.data)\
+            .filter(ActivityStreams.activity_id == activity_id).first()
+        streams = decode_streams(bytes(row.data), ('time', 'watts', 'distance')) if row and row.data else None
         
-        if strava_metrics and strava_metrics.weighted_average_watts:
-            np = float(strava_metrics.weighted_average_watts)
-            # ✅ CORRECTION : Gestion des valeurs None
-            duration_hours = float(activity.moving_time_hours or 0)
-            
-            custom_tss = self.calculate_custom_tss(np, duration_hours, user_ftp)
-            intensity_factor = self.calculate_intensity_factor(np, user_ftp)
+        # Calculs TSS personnalisés (NP du stream watts, sinon NP Strava)
+        load = self.calculate_load_metrics(
+            self.stream_power_metrics(streams), strava_metrics, activity, user_ftp
+        )
         
-        # Records de puissance estimés
-        power_records = self.estimate_power_records(activity, strava_metrics)
+        # Records de puissance (courbe de puissance du stream watts)
+        power_records = self.get_power_records(activity)
         
         # Records de distance
-        distance_records = self.detect_distance_records(activity)
+        distance_records = self.detect_distance_records(activity, streams or {})
         
         # Créer l'enregistrement
         custom_metrics = ActivityCustomMetrics(
             activity_id=activity_id,
             athlete_id=athlete_id,
             user_ftp=user_ftp,
+            ftp_version=ftp_version,
             
             # Calculs TSS
-            custom_tss=custom_tss,
-            intensity_factor=intensity_factor,
-            training_load=custom_tss,  # Équivalent pour l'instant
+            normalized_power=load['normalized_power'],
+            custom_tss=load['custom_tss'],
+            intensity_factor=load['intensity_factor'],
+            training_load=load['custom_tss'],  # Équivalent pour l'instant
+            load_duration_hours=load['load_duration_hours'],
+            calculation_method=load['calculation_method'],
             
             # Records de puissance
             best_1min_power=power_records['best_1min_power'],
@@ -256,7 +445,9 @@ class CustomCalculationsService:
             best_20min_power=power_records['best_20min_power'],
             
             # Records de distance
+            best_400m_time=distance_records['best_400m_time'],
             best_1km_time=distance_records['best_1km_time'],
+            best_1mile_time=distance_records['best_1mile_time'],
             best_5km_time=distance_records['best_5km_time'],
             best_10km_time=distance_records['best_10km_time'],
             best_half_marathon_time=distance_records['best_half_marathon_time'],
@@ -264,6 +455,10 @@ class CustomCalculationsService:
         )
         
         db.session.add(custom_metrics)
+        db.session.flush()
+        TrainingLoadService.mark_dirty(athlete_id, activity.start_date_local.date())
+        ActivityRollupService().refresh_days({(athlete_id, activity.start_date_local.date())})
+        StatsViewsService.mark_stale()
         db.session.commit()
         
         return custom_metrics
@@ -271,10 +466,13 @@ class CustomCalculationsService:
     def calculate_all_athlete_activities(self, athlete_id, user_ftp=None):
         """
         Calculer les métriques personnalisées pour toutes les activités d'un athlète
+        avec le FTP en vigueur à la date de chaque activité (historique FTP)
+        user_ftp : devient le FTP de tout l'historique (une ligne depuis la première
+        activité) ; les métriques déjà calculées sont recalculées avec cette version
         """
-        if not user_ftp:
-            settings = AthleteSettings.get_or_create_for_athlete(athlete_id, self.default_ftp)
-            user_ftp = settings.current_ftp
+        if user_ftp:
+            ftp_history = FtpHistoryService()
+            ftp_history.set_ftp(athlete_id, user_ftp, ftp_history.first_activity_day(athlete_id))
         
         # Récupérer toutes les activités de l'athlète
         activities = ActivitySummary.query.filter_by(athlete_id=athlete_id).all()
@@ -298,8 +496,7 @@ class CustomCalculationsService:
                 # Calculer
                 result = self.calculate_activity_custom_metrics(
                     activity.id, 
-                    athlete_id, 
-                    user_ftp
+                    athlete_id
                 )
                 
                 if result:
@@ -312,9 +509,15 @@ class CustomCalculationsService:
                 error_count += 1
                 continue
         
+        if calculated_count:
+            TrainingLoadService().refresh(athlete_id)
+        # Métriques existantes : version de FTP remplacée par la nouvelle ligne
+        recalculated_count = self.recalculate_ftp_versions(athlete_id) if user_ftp else 0
+        
         return {
             'calculated': calculated_count,
             'skipped': skipped_count,
+            'recalculated': recalculated_count,
             'errors': error_count,
             'total_activities': len(activities),
             'user_ftp': user_ftp
@@ -328,7 +531,9 @@ class CustomCalculationsService:
             db.func.max(ActivityCustomMetrics.best_1min_power).label('best_1min_power'),
             db.func.max(ActivityCustomMetrics.best_5min_power).label('best_5min_power'),
             db.func.max(ActivityCustomMetrics.best_20min_power).label('best_20min_power'),
+            db.func.min(db.func.nullif(ActivityCustomMetrics.best_400m_time, 0)).label('best_400m_time'),
             db.func.min(db.func.nullif(ActivityCustomMetrics.best_1km_time, 0)).label('best_1km_time'),
+            db.func.min(db.func.nullif(ActivityCustomMetrics.best_1mile_time, 0)).label('best_1mile_time'),
             db.func.min(db.func.nullif(ActivityCustomMetrics.best_5km_time, 0)).label('best_5km_time'),
             db.func.min(db.func.nullif(ActivityCustomMetrics.best_10km_time, 0)).label('best_10km_time'),
             db.func.min(db.func.nullif(ActivityCustomMetrics.best_half_marathon_time, 0)).label('best_half_marathon_time'),
@@ -350,8 +555,12 @@ class CustomCalculationsService:
                 'estimated_ftp_from_20min': int(float(records.best_20min_power) * 0.95) if records.best_20min_power else None
             },
             'distance_records': {
+                'best_400m_time': records.best_400m_time,
+                'best_400m_pace': self.format_pace(records.best_400m_time, 0.4) if records.best_400m_time else None,
                 'best_1km_time': records.best_1km_time,
                 'best_1km_pace': self.format_pace(records.best_1km_time, 1) if records.best_1km_time else None,
+                'best_1mile_time': records.best_1mile_time,
+                'best_1mile_pace': self.format_pace(records.best_1mile_time, 1.609) if records.best_1mile_time else None,
                 'best_5km_time': records.best_5km_time,
                 'best_5km_pace': self.format_pace(records.best_5km_time, 5) if records.best_5km_time else None,
                 'best_10km_time': records.best_10km_time,
@@ -423,6 +632,10 @@ class CustomCalculationsService:
                 else:
                     zones['recovery'] += 1
         
+        # Temps réel passé par zone (streams), au lieu d'une zone par activité
+        power_zone_seconds = ZonesService.get_total_zone_seconds(athlete_id, days, 'power')
+        heartrate_zone_seconds = ZonesService.get_total_zone_seconds(athlete_id, days, 'heartrate')
+        
         # TSS par semaine pour analyser la progression
         weekly_tss = {}
         for activity, cm in activities:
@@ -447,12 +660,16 @@ class CustomCalculationsService:
                 'zones_percentage': {
                     zone: round((count / len(activities)) * 100, 1) 
                     for zone, count in zones.items()
-                }
+                },
+                'power_zones_seconds': power_zone_seconds,
+                'heartrate_zones_seconds': heartrate_zone_seconds
             },
             'weekly_progression': [
                 {'week': week, 'tss': round(tss, 1)} 
                 for week, tss in sorted(weekly_tss.items())
-            ]
+            ],
+            # CTL / ATL / TSB du jour (série complète : /training-load/daily)
+            'fitness': TrainingLoadService().get_current(athlete_id)
         }
     
     def compare_with_strava_metrics(self, athlete_id, limit=20):
@@ -563,41 +780,26 @@ class CustomCalculationsService:
         
         return ftp_tests
     
-    def get_power_curve_data(self, athlete_id):
+    def get_power_curve_data(self, athlete_id, days=None):
         """
-        Construire une courbe de puissance basée sur les records
+        Courbe de puissance moyenne maximale de l'athlète (1 s -> 5 h)
+        construite depuis les courbes par activité (streams watts)
         """
-        records = db.session.query(
-            ActivityCustomMetrics.best_1min_power,
-            ActivityCustomMetrics.best_5min_power,
-            ActivityCustomMetrics.best_20min_power
-        ).filter_by(athlete_id=athlete_id)\
-         .filter(ActivityCustomMetrics.best_1min_power.isnot(None)).all()
-        
-        if not records:
+        power_curve = PowerCurveService().get_athlete_power_curve(athlete_id, days)
+        if not power_curve:
             return None
         
-        # Extraire les meilleures valeurs
-        best_1min = max((r.best_1min_power for r in records if r.best_1min_power), default=0)
-        best_5min = max((r.best_5min_power for r in records if r.best_5min_power), default=0)
-        best_20min = max((r.best_20min_power for r in records if r.best_20min_power), default=0)
-        
-        # Points de la courbe de puissance
-        power_curve = [
-            {'duration_seconds': 60, 'power': best_1min},
-            {'duration_seconds': 300, 'power': best_5min},
-            {'duration_seconds': 1200, 'power': best_20min}
-        ]
+        best = {point['duration_seconds']: point['power'] for point in power_curve}
         
         # Estimation FTP
-        estimated_ftp = int(float(best_20min) * 0.95) if best_20min else None
+        estimated_ftp = int(float(best[1200]) * 0.95) if best.get(1200) else None
         
         return {
             'power_curve': power_curve,
             'estimated_ftp': estimated_ftp,
-            'peak_power_1min': best_1min,
-            'peak_power_5min': best_5min,
-            'peak_power_20min': best_20min
+            'peak_power_1min': best.get(60),
+            'peak_power_5min': best.get(300),
+            'peak_power_20min': best.get(1200)
         }
     
     def analyze_training_patterns(self, athlete_id, days=90):
@@ -0,0 +1,313 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, Athlete, ActivitySummary
+from models.fetch_queue import ActivityFetchFailure, ActivityView
+from models.strava_metrics import ActivityStravaMetrics
+from models.streams import ActivityStreams
+from services.rate_limiter import SHORT_WINDOW, get_rate_limiter
+
+# Récupérations en attente : activité détaillée (métriques Strava) et streams
+FETCH_KINDS = ('detail', 'streams')
+
+# Types d'activité susceptibles d'avoir un capteur de puissance (device_watts inconnu)
+POWER_ACTIVITY_TYPES = ('Ride', 'VirtualRide', 'EBikeRide', 'GravelRide', 'MountainBikeRide')
+
+# Pondérations du score de priorité (voir FetchScheduler.ranked_query)
+RECENCY_WEIGHT = 100          # décroissance exponentielle, constante de 30 jours
+RECENCY_DAYS = 30
+VIEW_WEIGHT = 150             # activité consultée, constante de 7 jours
+VIEW_DAYS = 7
+POWER_METER_WEIGHT = 60       # capteur de puissance confirmé par les métriques
+POWER_TYPE_WEIGHT = 20        # sortie vélo, capteur encore inconnu
+DETAIL_WEIGHT = 10            # le détail renseigne device_watts avant les streams
+
+# Échecs de récupération : délai doublé à chaque essai, plafonné ; 401 (token) et 429 restent transitoires
+MAX_RETRY_DELAY = timedelta(days=1)
+TRANSIENT_CLIENT_STATUSES = (401, 429)
+
+
+class FetchScheduler:
+    """
+    File des récupérations Strava en attente (détails et streams), classées par valeur
+    Une requête par élément : le lot suivant est dimensionné sur le budget restant
+    du limiteur partagé, et le temps restant est simulé fenêtre par fenêtre.
+    """
+    
+    def __init__(self):
+        self.batch_size = current_app.config['FETCH_SCHEDULER_BATCH_SIZE']
+        self.retry_delay = timedelta(seconds=current_app.config['FETCH_SCHEDULER_RETRY_SECONDS'])
+        self.max_client_errors = current_app.config['FETCH_SCHEDULER_MAX_CLIENT_ERRORS']
+        self.rate_limiter = get_rate_limiter()
+    
+    @staticmethod
+    def decay(days, constant):
+        """exp(-jours / constante), borné : PostgreSQL refuse l'underflow de exp()"""
+        return db.func.exp(-db.func.least(db.func.greatest(days, 0) / constant, 50))
+    
+    @staticmethod
+    def failure_join(kind):
+        return db.and_(ActivityFetchFailure.activity_id == ActivitySummary.id, ActivityFetchFailure.kind == kind)
+    
+    @staticmethod
+    def retry_allowed(now):
+        """Aucun échec enregistré, ou délai de nouvel essai écoulé (jamais pour un élément abandonné)"""
+        return db.or_(ActivityFetchFailure.activity_id.is_(None), ActivityFetchFailure.next_retry_at <= now)
+    
+    def ranked_query(self, athlete_id=None, kinds=FETCH_KINDS, now=None):
+        """
+        Éléments en attente (kind, activity_id, strava_id, athlete_id, score), un SELECT par type
+        réunis par UNION ALL : récence + consultations + capteur de puissance
+        Les éléments en échec sont exclus jusqu'à leur prochain essai
+        """
+        now = now or datetime.utcnow()
+        age_days = db.func.extract('epoch', literal(now) - ActivitySummary.start_date) / 86400
+        view_days = db.func.extract('epoch', literal(now) - ActivityView.last_viewed_at) / 86400
+        # CASE explicite : GREATEST / LEAST ignorent les NULL (activité jamais consultée)
+        base_score = RECENCY_WEIGHT * self.decay(age_days, RECENCY_DAYS) + case(
+            (ActivityView.activity_id.isnot(None), VIEW_WEIGHT * self.decay(view_days, VIEW_DAYS)),
+            else_=0
+        )
+        power_type = ActivitySummary.type.in_(POWER_ACTIVITY_TYPES)
+        
+        selects = []
+        if 'detail' in kinds:
+            selects.append(
+                select(
+                    literal('detail').label('kind'),
+                    ActivitySummary.id.label('activity_id'),
+                    ActivitySummary.strava_id,
+                    ActivitySummary.athlete_id,
+                    (base_score + DETAIL_WEIGHT + case((power_type, POWER_TYPE_WEIGHT), else_=0)).label('score')
+                ).outerjoin(ActivityStravaMetrics, ActivityStravaMetrics.activity_id == ActivitySummary.id)
+                 .outerjoin(ActivityView, ActivityView.activity_id == ActivitySummary.id)
+                 .outerjoin(ActivityFetchFailure, self.failure_join('detail'))
+                 .where(ActivityStravaMetrics.id.is_(None))
+                 .where(self.retry_allowed(now))
+            )
+        if 'streams' in kinds:
+            selects.append(
+                select(
+                    literal('streams').label('kind'),
+                    ActivitySummary.id.label('activity_id'),
+                    ActivitySummary.strava_id,
+                    ActivitySummary.athlete_id,
+                    (base_score + case(
+                        (ActivityStravaMetrics.device_watts.is_(True), POWER_METER_WEIGHT),
+                        (db.and_(ActivityStravaMetrics.id.is_(None), power_type), POWER_TYPE_WEIGHT),
+                        else_=0
+                    )).label('score')
+                ).outerjoin(ActivityStreams, ActivityStreams.activity_id == ActivitySummary.id)
+                 .outerjoin(ActivityStravaMetrics, ActivityStravaMetrics.activity_id == ActivitySummary.id)
+                 .outerjoin(ActivityView, ActivityView.activity_id == ActivitySummary.id)
+                 .outerjoin(ActivityFetchFailure, self.failure_join('streams'))
+                 .where(ActivityStreams.activity_id.is_(None))
+                 .where(self.retry_allowed(now))
+            )
+        
+        if athlete_id is not None:
+            selects = [query.where(ActivitySummary.athlete_id == athlete_id) for query in selects]
+        else:
+            # Athlètes sans refresh token : aucune requête possible, ils ne bloquent pas la file
+            selects = [query.join(Athlete, Athlete.id == ActivitySummary.athlete_id)
+                            .where(Athlete.refresh_token.isnot(None)) for query in selects]
+        
+        pending = (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+        return select(pending).order_by(pending.c.score.desc(), pending.c.activity_id.desc())
+    
+    def ranked_items(self, athlete_id=None, kinds=FETCH_KINDS, limit=100):
+        """Éléments en attente les plus utiles d'abord"""
+        return db.session.execute(self.ranked_query(athlete_id, kinds).limit(limit)).all()
+    
+    @classmethod
+    def pending_counts(cls, athlete_id=None):
+        """Nombre de détails et de streams restant à récupérer (hors éléments abandonnés)"""
+        not_abandoned = db.or_(ActivityFetchFailure.activity_id.is_(None), ActivityFetchFailure.next_retry_at.isnot(None))
+        detail = db.session.query(db.func.count(ActivitySummary.id))\
+            .outerjoin(ActivityStravaMetrics, ActivityStravaMetrics.activity_id == ActivitySummary.id)\
+            .outerjoin(ActivityFetchFailure, cls.failure_join('detail'))\
+            .filter(ActivityStravaMetrics.id.is_(None)).filter(not_abandoned)
+        streams = db.session.query(db.func.count(ActivitySummary.id))\
+            .outerjoin(ActivityStreams, ActivityStreams.activity_id == ActivitySummary.id)\
+            .outerjoin(ActivityFetchFailure, cls.failure_join('streams'))\
+            .filter(ActivityStreams.activity_id.is_(None)).filter(not_abandoned)
+        if athlete_id is not None:
+            detail = detail.filter(ActivitySummary.athlete_id == athlete_id)
+            streams = streams.filter(ActivitySummary.athlete_id == athlete_id)
+        return {'detail': detail.scalar(), 'streams': streams.scalar()}
+    
+    def budget(self):
+        """Requêtes encore disponibles dans chaque fenêtre, réserve déduite"""
+        status = self.rate_limiter.get_status()
+        reserve = status['reserve']
+        return {
+            'short_available': max(0, status['short_window']['limit'] - reserve - status['short_window']['used']),
+            'daily_available': max(0, status['daily_window']['limit'] - reserve - status['daily_window']['used']),
+            'short_capacity': max(0, status['short_window']['limit'] - reserve),
+            'daily_capacity': max(0, status['daily_window']['limit'] - reserve)
+        }
+    
+    def available_requests(self):
+        """Requêtes consommables tout de suite sans dépasser aucune des deux fenêtres"""
+        budget = self.budget()
+        return min(budget['short_available'], budget['daily_available'])
+    
+    def estimate_completion(self, requests, budget=None, now=None):
+        """
+        Simuler la consommation de `requests` requêtes fenêtre par fenêtre :
+        chaque quart d'heure accorde min(capacité 15 min, reste du jour), minuit recharge le jour
+        Suppose que la file dispose seule du budget (les syncs passent en premier : borne basse)
+        """
+        now = now or datetime.utcnow()
+        budget = budget or self.budget()
+        if requests <= 0:
+            return {'requests': 0, 'seconds': 0, 'completes_at': now.isoformat(), 'days': 0}
+        if not budget['short_capacity'] or not budget['daily_capacity']:
+            return {'requests': requests, 'seconds': None, 'completes_at': None, 'days': None}
+        
+        short_start, daily_start = self.rate_limiter.current_windows(now)
+        short_end = short_start + SHORT_WINDOW
+        daily_end = daily_start + timedelta(days=1)
+        short_available = budget['short_available']
+        daily_available = budget['daily_available']
+        remaining = requests
+        completes_at = now
+        
+        while True:
+            granted = min(remaining, short_available, daily_available)
+            remaining -= granted
+            daily_available -= granted
+            if not remaining:
+                break
+            
+            # Prochaine fenêtre : minuit si le jour est épuisé, sinon le quart d'heure suivant
+            if not daily_available:
+                short_end = daily_end
+            completes_at = short_end
+            short_end += SHORT_WINDOW
+            short_available = budget['short_capacity']
+            if completes_at >= daily_end:
+                daily_end += timedelta(days=1)
+                daily_available = budget['daily_capacity']
+        
+        seconds = (completes_at - now).total_seconds()
+        return {
+            'requests': requests,
+            'seconds': int(seconds),
+            'completes_at': completes_at.isoformat(),
+            'days': round(seconds / 86400, 2)
+        }
+    
+    def next_batch(self):
+        """Prochain lot à récupérer : le plus utile d'abord, dans le budget disponible"""
+        size = min(self.batch_size, self.available_requests())
+        if size <= 0:
+            return []
+        return self.ranked_items(limit=size)
+    
+    def record_failures(self, items, statuses=None):
+        """
+        Reporter des éléments en échec : délai doublé à chaque essai (plafonné), abandon
+        après max_client_errors erreurs 4xx ; statuses : {(kind, strava_id): code HTTP}
+        """
+        if not items:
+            return
+        statuses = statuses or {}
+        now = datetime.utcnow()
+        table = ActivityFetchFailure.__table__
+        attempts_by_key = {
+            (kind, activity_id): attempts for kind, activity_id, attempts in db.session.query(
+                ActivityFetchFailure.kind, ActivityFetchFailure.activity_id, ActivityFetchFailure.attempts
+            ).filter(db.tuple_(ActivityFetchFailure.kind, ActivityFetchFailure.activity_id)
+                     .in_([(item.kind, item.activity_id) for item in items]))
+        }
+        
+        rows = []
+        for item in items:
+            attempts = attempts_by_key.get((item.kind, item.activity_id), 0) + 1
+            status = statuses.get((item.kind, item.strava_id))
+            client_error = status is not None and 400 <= status < 500 and status not in TRANSIENT_CLIENT_STATUSES
+            if client_error and attempts >= self.max_client_errors:
+                next_retry_at = None
+            else:
+                next_retry_at = now + min(self.retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+            rows.append({
+                'activity_id': item.activity_id, 'kind': item.kind, 'athlete_id': item.athlete_id,
+                'attempts': attempts, 'last_status': status, 'last_attempt_at': now, 'next_retry_at': next_retry_at
+            })
+        
+        stmt = pg_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['activity_id', 'kind'],
+            set_={column: stmt.excluded[column] for column in
+                  ('attempts', 'last_status', 'last_attempt_at', 'next_retry_at')}
+        )
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    @staticmethod
+    def clear_failures(items):
+        """Oublier les échecs passés des éléments récupérés avec succès"""
+        if not items:
+            return
+        try:
+            ActivityFetchFailure.query.filter(
+                db.tuple_(ActivityFetchFailure.kind, ActivityFetchFailure.activity_id)
+                .in_([(item.kind, item.activity_id) for item in items])
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    def get_queue_status(self, athlete_id=None, top=10):
+        """Contenu de la file, budget et temps estimé pour la vider"""
+        counts = self.pending_counts(athlete_id)
+        budget = self.budget()
+        abandoned = ActivityFetchFailure.query.filter(ActivityFetchFailure.next_retry_at.is_(None))
+        if athlete_id is not None:
+            abandoned = abandoned.filter(ActivityFetchFailure.athlete_id == athlete_id)
+        return {
+            'pending': counts,
+            'abandoned': abandoned.count(),
+            'total_requests': sum(counts.values()),
+            'budget': budget,
+            'estimate': self.estimate_completion(sum(counts.values()), budget),
+            'next': [
+                {
+                    'kind': item.kind,
+                    'activity_id': item.activity_id,
+                    'strava_id': item.strava_id,
+                    'athlete_id': item.athlete_id,
+                    'score': round(float(item.score), 1)
+                }
+                for item in self.ranked_items(athlete_id, limit=top)
+            ]
+        }
+    
+    @staticmethod
+    def record_view(activity):
+        """Noter une consultation (remonte l'activité dans la file des récupérations)"""
+        table = ActivityView.__table__
+        now = datetime.utcnow()
+        stmt = pg_insert(table).values(
+            activity_id=activity.id,
+            athlete_id=activity.athlete_id,
+            view_count=1,
+            last_viewed_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['activity_id'],
+            set_={'view_count': table.c.view_count + 1, 'last_viewed_at': now}
+        )
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception as e:
+            print(f"Erreur enregistrement consultation activité {activity.id}: {str(e)}")
+            db.session.rollback()
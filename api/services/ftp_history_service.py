@@ -0,0 +1,154 @@
+from datetime import date, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, ActivitySummary
+from models.custom_metrics import ActivityCustomMetrics, AthleteSettings, AthleteFtpHistory
+
+DEFAULT_FTP = 245
+
+
+class FtpHistoryService:
+    """
+    Historique des FTP par date d'effet : le TSS / IF de chaque activité est calculé avec
+    le FTP en vigueur à sa date. Une modification de l'historique ne recalcule rien
+    immédiatement : elle marque les jours touchés (athlete_settings.ftp_dirty_from) et
+    les métriques dont la version de FTP a changé sont recalculées à la lecture ou par
+    les workers (CustomCalculationsService.recalculate_ftp_versions)
+    """
+    
+    @staticmethod
+    def first_activity_day(athlete_id):
+        return db.session.query(db.func.min(db.func.date(ActivitySummary.start_date_local)))\
+            .filter(ActivitySummary.athlete_id == athlete_id).scalar()
+    
+    @staticmethod
+    def mark_dirty(athlete_id, day):
+        """Métriques à revoir à partir de `day` (sans commit : dans la transaction de l'appelant)"""
+        table = AthleteSettings.__table__
+        db.session.execute(
+            table.update().where(table.c.athlete_id == athlete_id)
+            .values(ftp_dirty_from=db.func.least(table.c.ftp_dirty_from, day))
+        )
+    
+    def ensure_history(self, athlete_id):
+        """
+        Historique absent (athlète antérieur) : reprise des FTP avec lesquels les métriques
+        existantes ont été calculées, puis le FTP actuel à partir d'aujourd'hui s'il diffère
+        Les métriques existantes reçoivent leur version au prochain recalcul (valeurs inchangées)
+        """
+        if db.session.query(AthleteFtpHistory.query.filter_by(athlete_id=athlete_id).exists()).scalar():
+            return False
+        
+        settings = AthleteSettings.get_or_create_for_athlete(athlete_id, DEFAULT_FTP)
+        day = db.func.date(ActivitySummary.start_date_local)
+        used = db.session.query(day, ActivityCustomMetrics.user_ftp)\
+            .join(ActivityCustomMetrics, ActivityCustomMetrics.activity_id == ActivitySummary.id)\
+            .filter(ActivitySummary.athlete_id == athlete_id)\
+            .order_by(day, ActivitySummary.start_date_local).all()
+        
+        entries = {}
+        for activity_day, user_ftp in used:
+            if not entries or entries[max(entries)] != user_ftp:
+                entries.setdefault(activity_day, user_ftp)
+        today = date.today()
+        if not entries:
+            entries[self.first_activity_day(athlete_id) or today] = settings.current_ftp
+        elif entries[max(entries)] != settings.current_ftp and max(entries) < today:
+            entries[today] = settings.current_ftp
+        
+        try:
+            db.session.execute(
+                pg_insert(AthleteFtpHistory.__table__).values([
+                    {'athlete_id': athlete_id, 'effective_date': effective_date, 'ftp': ftp, 'source': 'initial'}
+                    for effective_date, ftp in sorted(entries.items())
+                ]).on_conflict_do_nothing(index_elements=['athlete_id', 'effective_date'])
+            )
+            first_day = self.first_activity_day(athlete_id)
+            if first_day:
+                self.mark_dirty(athlete_id, first_day)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return True
+    
+    def get_history(self, athlete_id):
+        self.ensure_history(athlete_id)
+        return AthleteFtpHistory.query.filter_by(athlete_id=athlete_id)\
+            .order_by(AthleteFtpHistory.effective_date).all()
+    
+    def entry_for_day(self, athlete_id, day):
+        """Ligne d'historique en vigueur le jour `day` (la plus ancienne avant le début de l'historique)"""
+        self.ensure_history(athlete_id)
+        entry = AthleteFtpHistory.query.filter_by(athlete_id=athlete_id)\
+            .filter(AthleteFtpHistory.effective_date <= day)\
+            .order_by(AthleteFtpHistory.effective_date.desc()).first()
+        return entry or AthleteFtpHistory.query.filter_by(athlete_id=athlete_id)\
+            .order_by(AthleteFtpHistory.effective_date).first()
+    
+    def set_ftp(self, athlete_id, ftp, effective_date=None, until=None, threshold_heartrate=None, source='manual'):
+        """
+        FTP en vigueur à partir de effective_date (aujourd'hui par défaut) : remplace les
+        lignes suivantes, ou seulement jusqu'à `until` inclus (le FTP précédent reprend après)
+        Retourne la nouvelle ligne ; les métriques touchées sont marquées, pas recalculées
+        """
+        effective_date = effective_date or date.today()
+        if until is not None and until < effective_date:
+            raise ValueError("La fin de période précède la date d'effet")
+        self.ensure_history(athlete_id)
+        history = AthleteFtpHistory.query.filter_by(athlete_id=athlete_id)
+        
+        try:
+            # Lignes verrouillées : deux modifications concurrentes ne s'entrelacent pas
+            settings = AthleteSettings.query.filter_by(athlete_id=athlete_id).with_for_update().one()
+            first_date = history.order_by(AthleteFtpHistory.effective_date).first().effective_date
+            
+            replaced = history.filter(AthleteFtpHistory.effective_date >= effective_date)
+            if until is not None:
+                resume_date = until + timedelta(days=1)
+                resume = self.entry_for_day(athlete_id, resume_date)
+                if resume.effective_date != resume_date:
+                    db.session.add(AthleteFtpHistory(
+                        athlete_id=athlete_id, effective_date=resume_date, ftp=resume.ftp,
+                        threshold_heartrate=resume.threshold_heartrate, source=resume.source
+                    ))
+                replaced = replaced.filter(AthleteFtpHistory.effective_date <= until)
+            replaced.delete(synchronize_session=False)
+            
+            entry = AthleteFtpHistory(athlete_id=athlete_id, effective_date=effective_date, ftp=ftp,
+                                      threshold_heartrate=threshold_heartrate, source=source)
+            db.session.add(entry)
+            db.session.flush()
+            
+            settings.current_ftp = self.entry_for_day(athlete_id, date.today()).ftp
+            # Nouvelle première ligne : elle s'applique aussi aux activités antérieures
+            dirty_from = effective_date if effective_date > first_date else self.first_activity_day(athlete_id)
+            if dirty_from:
+                self.mark_dirty(athlete_id, dirty_from)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return entry
+    
+    def delete_entry(self, athlete_id, version):
+        """Supprimer une ligne (pas la dernière restante) ; la ligne précédente s'étend à sa période"""
+        entries = self.get_history(athlete_id)
+        entry = next((e for e in entries if e.id == version), None)
+        if entry is None:
+            return None
+        if len(entries) == 1:
+            raise ValueError("Impossible de supprimer la seule valeur de l'historique FTP")
+        
+        try:
+            settings = AthleteSettings.query.filter_by(athlete_id=athlete_id).with_for_update().one()
+            dirty_from = entry.effective_date if entry is not entries[0] else self.first_activity_day(athlete_id)
+            db.session.delete(entry)
+            db.session.flush()
+            settings.current_ftp = self.entry_for_day(athlete_id, date.today()).ftp
+            if dirty_from:
+                self.mark_dirty(athlete_id, dirty_from)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return entry
@@ -0,0 +1,254 @@
+"""
+Géométrie des tracés : polylines Google encodées, tuiles Web Mercator (z/x/y),
+requêtes spatiales et rendu des tuiles de heatmap (NumPy, sans boucle par point)
+"""
+import struct
+import zlib
+import numpy as np
+
+# Précision des polylines Strava (1e-5 degré, ~1 m)
+POLYLINE_PRECISION = 5
+
+# Latitude maximale de la projection Web Mercator
+MAX_MERCATOR_LATITUDE = 85.05112878
+
+TILE_SIZE = 256
+
+# Nombre de passages donnant la couleur la plus intense de la heatmap (échelle log)
+HEATMAP_SATURATION = 20
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """
+    Polyline encodée -> tableau (n, 2) de [lat, lng]
+    Décodage vectorisé : chaque caractère porte 5 bits, le bit 0x20 signale la suite
+    de la valeur ; les valeurs (zigzag) sont des deltas cumulés
+    """
+    if not encoded:
+        return np.zeros((0, 2))
+    
+    chars = np.frombuffer(encoded.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    last_chunk = (chars & 0x20) == 0
+    if not last_chunk[-1]:
+        raise ValueError('Polyline tronquée')
+    
+    # Index de la valeur de chaque caractère et rang du caractère dans sa valeur
+    value_index = np.concatenate(([0], np.cumsum(last_chunk)[:-1]))
+    value_starts = np.flatnonzero(np.concatenate(([True], last_chunk[:-1])))
+    shift = 5 * (np.arange(chars.size) - value_starts[value_index])
+    if shift.max() > 30:
+        raise ValueError('Polyline invalide')
+    values = np.bincount(value_index, weights=(chars & 0x1f) << shift).astype(np.int64)
+    if values.size % 2:
+        raise ValueError('Polyline invalide (nombre impair de valeurs)')
+    
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def encode_polyline(coords, precision=POLYLINE_PRECISION):
+    """[[lat, lng], ...] -> polyline encodée"""
+    chars = []
+    previous = (0, 0)
+    for point in coords:
+        current = (int(round(point[0] * 10 ** precision)), int(round(point[1] * 10 ** precision)))
+        for value in (current[0] - previous[0], current[1] - previous[1]):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                chars.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chars.append(chr(value + 63))
+        previous = current
+    return ''.join(chars)
+
+
+def pack_coords(coords, precision=POLYLINE_PRECISION):
+    """Coordonnées -> int32 [lat, lng] entrelacés (8 octets par point, précision de la polyline)"""
+    return np.rint(np.asarray(coords) * 10 ** precision).astype('<i4').tobytes()
+
+
+def unpack_coords(data, precision=POLYLINE_PRECISION):
+    return np.frombuffer(data, dtype='<i4').reshape(-1, 2) / 10 ** precision
+
+
+def lnglat_to_tile(lat, lng, zoom):
+    """Coordonnées -> position (x, y) en unités de tuile au niveau zoom (réels)"""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE))
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0 * n
+    return x, y
+
+
+def tile_to_lnglat(x, y, zoom):
+    """Coin nord-ouest d'une tuile (ou position en unités de tuile) -> (lat, lng)"""
+    n = 2 ** zoom
+    lng = x / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n))))
+    return lat, lng
+
+
+def tile_bounds(zoom, x, y):
+    """Emprise d'une tuile : (sud, ouest, nord, est)"""
+    north, west = tile_to_lnglat(x, y, zoom)
+    south, east = tile_to_lnglat(x + 1, y + 1, zoom)
+    return float(south), float(west), float(north), float(east)
+
+
+def bbox_tile_range(south, west, north, east, zoom):
+    """Tuiles (x_min, y_min, x_max, y_max) couvrant une emprise"""
+    n = 2 ** zoom
+    x_min, y_max = lnglat_to_tile(south, west, zoom)
+    x_max, y_min = lnglat_to_tile(north, east, zoom)
+    clamp = lambda value: int(min(max(np.floor(value), 0), n - 1))
+    return clamp(x_min), clamp(y_min), clamp(x_max), clamp(y_max)
+
+
+def densify(points, max_step):
+    """
+    Intercaler des points sur chaque segment pour qu'aucun pas ne dépasse max_step
+    (unités des points) : un tracé simplifié ne saute plus de tuile ni de pixel
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 2:
+        return points
+    
+    deltas = np.diff(points, axis=0)
+    steps = np.maximum(1, np.ceil(np.hypot(deltas[:, 0], deltas[:, 1]) / max_step)).astype(np.int64)
+    segment = np.repeat(np.arange(len(deltas)), steps)
+    offsets = np.concatenate(([0], np.cumsum(steps)[:-1]))
+    fraction = (np.arange(segment.size) - offsets[segment]) / steps[segment]
+    dense = points[segment] + fraction[:, None] * deltas[segment]
+    return np.vstack((dense, points[-1:]))
+
+
+def route_tiles(coords, zoom):
+    """Tuiles traversées par un tracé : tableau (k, 2) de [x, y] uniques"""
+    if len(coords) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    x, y = lnglat_to_tile(coords[:, 0], coords[:, 1], zoom)
+    dense = densify(np.column_stack((x, y)), 0.5)
+    return np.unique(np.floor(dense).astype(np.int64), axis=0)
+
+
+def route_intersects_bbox(coords, south, west, north, east):
+    """
+    Le tracé traverse-t-il l'emprise ? (Liang-Barsky vectorisé sur tous les segments,
+    un segment peut couper l'emprise sans qu'aucun point n'y soit)
+    """
+    if len(coords) == 0:
+        return False
+    lat, lng = coords[:, 0], coords[:, 1]
+    inside = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+    if inside.any() or len(coords) < 2:
+        return bool(inside.any())
+    
+    x0, y0 = lng[:-1], lat[:-1]
+    dx, dy = np.diff(lng), np.diff(lat)
+    t_enter = np.zeros(dx.size)
+    t_exit = np.ones(dx.size)
+    valid = np.ones(dx.size, dtype=bool)
+    for p, q in ((-dx, x0 - west), (dx, east - x0), (-dy, y0 - south), (dy, north - y0)):
+        parallel = p == 0
+        valid &= ~(parallel & (q < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(parallel, 0.0, q / np.where(parallel, 1.0, p))
+        t_enter = np.where(~parallel & (p < 0), np.maximum(t_enter, t), t_enter)
+        t_exit = np.where(~parallel & (p > 0), np.minimum(t_exit, t), t_exit)
+    return bool((valid & (t_enter <= t_exit)).any())
+
+
+def distance_to_route_m(coords, lat, lng):
+    """
+    Distance minimale (mètres) entre un point et un tracé, segment par segment
+    Projection équirectangulaire locale : précise à quelques mètres sous ~50 km
+    """
+    if len(coords) == 0:
+        return None
+    scale_x = 111_320.0 * np.cos(np.radians(lat))
+    x = (coords[:, 1] - lng) * scale_x
+    y = (coords[:, 0] - lat) * 110_540.0
+    if len(coords) == 1:
+        return float(np.hypot(x[0], y[0]))
+    
+    dx, dy = np.diff(x), np.diff(y)
+    length_sq = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.where(length_sq > 0, -(x[:-1] * dx + y[:-1] * dy) / length_sq, 0.0), 0.0, 1.0)
+    return float(np.hypot(x[:-1] + t * dx, y[:-1] + t * dy).min())
+
+
+def bbox_around(lat, lng, radius_m):
+    """Emprise (sud, ouest, nord, est) d'un cercle"""
+    dlat = radius_m / 110_540.0
+    dlng = radius_m / (111_320.0 * max(np.cos(np.radians(lat)), 1e-6))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def heatmap_counts(routes, zoom, x, y, size=TILE_SIZE):
+    """
+    Nombre d'activités passant par chaque pixel d'une tuile (grille size x size)
+    Chaque tracé est densifié au pixel puis compté une seule fois par pixel
+    """
+    pixels = []
+    for coords in routes:
+        if len(coords) == 0:
+            continue
+        tile_x, tile_y = lnglat_to_tile(coords[:, 0], coords[:, 1], zoom)
+        points = np.column_stack(((tile_x - x) * size, (tile_y - y) * size))
+        
+        # Segments dont l'emprise touche la tuile uniquement (tracés longs à fort zoom)
+        if len(points) > 1:
+            starts, ends = points[:-1], points[1:]
+            low, high = np.minimum(starts, ends), np.maximum(starts, ends)
+            keep = (high[:, 0] >= 0) & (low[:, 0] < size) & (high[:, 1] >= 0) & (low[:, 1] < size)
+            if not keep.any():
+                continue
+            dense = densify_segments(starts[keep], ends[keep], 0.7)
+        else:
+            dense = points
+        
+        px = np.floor(dense).astype(np.int64)
+        inside = (px[:, 0] >= 0) & (px[:, 0] < size) & (px[:, 1] >= 0) & (px[:, 1] < size)
+        if inside.any():
+            pixels.append(np.unique(px[inside, 1] * size + px[inside, 0]))
+    
+    if not pixels:
+        return np.zeros((size, size), dtype=np.int64), 0
+    return np.bincount(np.concatenate(pixels), minlength=size * size).reshape(size, size), len(pixels)
+
+
+def densify_segments(starts, ends, max_step):
+    """densify() sur des segments indépendants (non contigus)"""
+    deltas = ends - starts
+    steps = np.maximum(1, np.ceil(np.hypot(deltas[:, 0], deltas[:, 1]) / max_step)).astype(np.int64) + 1
+    segment = np.repeat(np.arange(len(deltas)), steps)
+    offsets = np.concatenate(([0], np.cumsum(steps)[:-1]))
+    fraction = (np.arange(segment.size) - offsets[segment]) / (steps[segment] - 1)
+    return starts[segment] + fraction[:, None] * deltas[segment]
+
+
+def heatmap_rgba(counts, saturation=HEATMAP_SATURATION):
+    """Comptes -> image RGBA : rouge vers jaune avec l'intensité (échelle log), transparent à 0"""
+    intensity = np.clip(np.log1p(counts) / np.log1p(saturation), 0.0, 1.0)
+    rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = np.rint(220 * intensity)
+    rgba[..., 2] = np.rint(60 * intensity ** 2)
+    rgba[..., 3] = np.where(counts > 0, np.rint(110 + 145 * intensity), 0)
+    return rgba
+
+
+def encode_png(rgba):
+    """Image RGBA uint8 (h, w, 4) -> PNG (zlib, sans dépendance d'imagerie)"""
+    height, width = rgba.shape[:2]
+    # Filtre 0 (aucun) en tête de chaque ligne
+    raw = np.hstack((np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4))).tobytes()
+    
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    
+    return b'\x89PNG\r\n\x1a\n' \
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) \
+        + chunk(b'IDAT', zlib.compress(raw, 6)) \
+        + chunk(b'IEND', b'')
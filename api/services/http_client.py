@@ -0,0 +1,89 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+
+# Codes HTTP réessayés automatiquement (erreurs serveur transitoires) ; un 429 remonte à
+# l'appelant : le limiteur et fetch_activities_page_with_retry attendent la fin de fenêtre
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+# Limiteur de la requête en cours, par thread (les retries urllib3 s'exécutent dans ce thread)
+_request_context = threading.local()
+
+
+class RateLimitedRetry(Retry):
+    """
+    Retry urllib3 dont chaque nouvelle tentative est décomptée du budget Strava :
+    en-têtes de la réponse en échec pris en compte, puis une requête réservée
+    auprès du limiteur passé à StravaHTTPSession.request (rate_limiter=...)
+    """
+    
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+        rate_limiter = getattr(_request_context, 'rate_limiter', None)
+        if rate_limiter is not None:
+            if response is not None:
+                rate_limiter.update_from_headers(response.headers)
+            rate_limiter.acquire()
+        return retry
+
+
+class StravaHTTPSession(requests.Session):
+    """
+    Session HTTP keep-alive partagée pour tous les appels Strava :
+    pool de connexions, timeouts connexion/lecture par défaut,
+    retries 5xx avec backoff exponentiel + jitter, chacun décompté du limiteur
+    """
+    
+    def __init__(self, connect_timeout, read_timeout, pool_size, max_retries):
+        super().__init__()
+        self.timeout = (connect_timeout, read_timeout)
+        
+        retry = RateLimitedRetry(
+            total=max_retries,
+            status_forcelist=RETRY_STATUS_CODES,
+            # POST (échange de code OAuth) non idempotent : réessayé seulement si la connexion échoue
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            backoff_factor=1,          # 1s, 2s, 4s, 8s...
+            backoff_jitter=0.5,
+            backoff_max=60,
+            respect_retry_after_header=True,
+            raise_on_status=False      # La dernière réponse est renvoyée à l'appelant
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        
+        self.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+    
+    def request(self, method, url, rate_limiter=None, **kwargs):
+        # Aucun appel sans timeout : un socket bloqué ne doit pas bloquer un worker indéfiniment
+        kwargs.setdefault('timeout', self.timeout)
+        _request_context.rate_limiter = rate_limiter
+        try:
+            return super().request(method, url, **kwargs)
+        finally:
+            _request_context.rate_limiter = None
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_strava_session():
+    """Session partagée par processus (thread-safe, réutilise les connexions TLS)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = StravaHTTPSession(
+                    connect_timeout=Config.STRAVA_HTTP_CONNECT_TIMEOUT,
+                    read_timeout=Config.STRAVA_HTTP_READ_TIMEOUT,
+                    pool_size=Config.STRAVA_HTTP_POOL_SIZE,
+                    max_retries=Config.STRAVA_HTTP_MAX_RETRIES
+                )
+    return _session
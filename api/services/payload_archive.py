@@ -0,0 +1,127 @@
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from flask import current_app
+from sqlalchemy import distinct, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db
+from models.payload_archive import StravaRawPayload
+
+
+class PayloadArchive:
+    """
+    Archive compressée des réponses JSON Strava (résumés et activités détaillées)
+
+    Objets : <root>/objects/ab/cdef...json.gz, nommés par le SHA-256 du JSON canonique.
+    Index : table strava_raw_payloads (strava_id, type, date de récupération).
+    Permet de recalculer toutes les colonnes dérivées sans appel API.
+    Utilise directement l'engine SQLAlchemy : utilisable depuis les threads de récupération.
+    """
+    
+    KINDS = ('summary', 'detail')
+    
+    def __init__(self, engine, root):
+        self.engine = engine
+        self.root = root
+        self.table = StravaRawPayload.__table__
+    
+    @staticmethod
+    def canonical_bytes(payload):
+        return json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    
+    def object_path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], f'{sha256[2:]}.json.gz')
+    
+    def write_object(self, payload):
+        """Écrire un objet (no-op s'il existe déjà) ; retourne (sha256, taille compressée)"""
+        data = self.canonical_bytes(payload)
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.object_path(sha256)
+        
+        if os.path.exists(path):
+            return sha256, os.path.getsize(path)
+        
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        compressed = gzip.compress(data, compresslevel=6)
+        
+        # Écriture atomique : un objet présent est toujours complet
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return sha256, len(compressed)
+    
+    def store_many(self, kind, payloads):
+        """Archiver des réponses Strava (une requête d'index pour tout le lot)"""
+        if kind not in self.KINDS:
+            raise ValueError(f"Type de payload inconnu: {kind}")
+        
+        fetched_at = datetime.utcnow()
+        rows = []
+        for payload in payloads:
+            if not isinstance(payload, dict) or 'id' not in payload:
+                continue
+            sha256, size_bytes = self.write_object(payload)
+            rows.append({
+                'strava_id': payload['id'],
+                'owner_id': (payload.get('athlete') or {}).get('id'),
+                'kind': kind,
+                'sha256': sha256,
+                'size_bytes': size_bytes,
+                'fetched_at': fetched_at
+            })
+        
+        if rows:
+            # Réponse identique déjà archivée : conserver sa première date de récupération
+            with self.engine.begin() as conn:
+                conn.execute(
+                    pg_insert(self.table).values(rows)
+                    .on_conflict_do_nothing(constraint='uq_strava_raw_payload')
+                )
+        return len(rows)
+    
+    def store(self, kind, payload):
+        return self.store_many(kind, [payload])
+    
+    def load(self, sha256):
+        with gzip.open(self.object_path(sha256), 'rb') as f:
+            return json.loads(f.read())
+    
+    def latest_index(self, kind, owner_id=None):
+        """strava_id -> (sha256, fetched_at) de la réponse la plus récente (DISTINCT ON)"""
+        stmt = select(self.table.c.strava_id, self.table.c.sha256, self.table.c.fetched_at)\
+            .where(self.table.c.kind == kind)\
+            .distinct(self.table.c.strava_id)\
+            .order_by(self.table.c.strava_id, self.table.c.fetched_at.desc(), self.table.c.id.desc())
+        if owner_id is not None:
+            stmt = stmt.where(self.table.c.owner_id == owner_id)
+        
+        with self.engine.connect() as conn:
+            return {row.strava_id: (row.sha256, row.fetched_at) for row in conn.execute(stmt)}
+    
+    def get_stats(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(self.table.c.kind, func.count(), func.count(distinct(self.table.c.strava_id)),
+                       func.coalesce(func.sum(self.table.c.size_bytes), 0))
+                .group_by(self.table.c.kind)
+            ).all()
+        return {
+            kind: {'payloads': payloads, 'activities': activities, 'compressed_bytes': int(size_bytes)}
+            for kind, payloads, activities, size_bytes in rows
+        }
+
+
+def get_payload_archive():
+    """Archive de l'application Flask courante (None si désactivée)"""
+    if not current_app.config['PAYLOAD_ARCHIVE_ENABLED']:
+        return None
+    archive = current_app.extensions.get('strava_payload_archive')
+    if archive is None:
+        archive = PayloadArchive(db.engine, current_app.config['PAYLOAD_ARCHIVE_DIR'])
+        current_app.extensions['strava_payload_archive'] = archive
+    return archive
@@ -0,0 +1,296 @@
+from datetime import datetime, timedelta
+from sqlalchemy import literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, ActivitySummary
+from models.custom_metrics import ActivityCustomMetrics
+from models.power_curve import ActivityPowerCurve, AthletePowerEnvelope
+from models.streams import ActivityStreams
+from services.stream_analysis import POWER_CURVE_DURATIONS, mean_maximal_power, to_1hz
+from services.stream_codec import decode_streams
+
+# Durées reprises dans activity_custom_metrics (records historiques)
+RECORD_DURATIONS = {60: 'best_1min_power', 300: 'best_5min_power', 1200: 'best_20min_power'}
+
+# Fenêtres maintenues dans athlete_power_envelope (0 = historique complet)
+ENVELOPE_WINDOWS = (0, 42, 90, 365)
+
+
+class PowerCurveService:
+    """
+    Courbes de puissance moyenne maximale (1 s -> 5 h) calculées depuis le stream watts
+    et stockées par activité
+    """
+    
+    @staticmethod
+    def compute_power_curve(streams):
+        """Streams décodés -> {durée: watts} (vide sans stream watts)"""
+        if not streams or 'watts' not in streams or 'time' not in streams:
+            return {}
+        return mean_maximal_power(to_1hz(streams['time'], streams['watts']))
+    
+    def store_power_curves(self, curves):
+        """
+        Enregistrer les courbes {activity_id: {durée: watts}} (une requête pour le lot)
+        et reporter les records 1/5/20 min dans activity_custom_metrics
+        Une courbe recalculée remplace entièrement l'ancienne : les durées absentes
+        (activité recadrée, streams plus courts ou sans watts) sont supprimées
+        """
+        replaced_ids = list(curves.keys())
+        curves = {activity_id: curve for activity_id, curve in curves.items() if curve}
+        if not replaced_ids:
+            return 0
+        
+        activities = dict(
+            db.session.query(ActivitySummary.id, ActivitySummary)
+            .filter(ActivitySummary.id.in_(list(curves.keys()))).all()
+        ) if curves else {}
+        
+        rows = [
+            {
+                'activity_id': activity_id,
+                'duration_seconds': duration,
+                'athlete_id': activities[activity_id].athlete_id,
+                'start_date': activities[activity_id].start_date,
+                'watts': watts,
+                'calculated_at': datetime.utcnow()
+            }
+            for activity_id, curve in curves.items() if activity_id in activities
+            for duration, watts in curve.items()
+        ]
+        
+        table = ActivityPowerCurve.__table__
+        try:
+            db.session.execute(table.delete().where(table.c.activity_id.in_(replaced_ids)))
+            for offset in range(0, len(rows), 5000):
+                db.session.execute(table.insert().values(rows[offset:offset + 5000]))
+            
+            self.update_envelopes(curves, activities, replaced_ids)
+            
+            # Records des métriques personnalisées déjà calculées
+            for activity_id, curve in curves.items():
+                values = {column: curve.get(duration) for duration, column in RECORD_DURATIONS.items()}
+                ActivityCustomMetrics.query.filter_by(activity_id=activity_id)\
+                    .update(values, synchronize_session=False)
+            
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return len(curves)
+    
+    @staticmethod
+    def envelope_windows_for(start_date, now=None):
+        """Fenêtres de l'enveloppe qui contiennent une activité de cette date"""
+        now = now or datetime.utcnow()
+        return [window for window in ENVELOPE_WINDOWS
+                if window == 0 or start_date >= now - timedelta(days=window)]
+    
+    def update_envelopes(self, curves, activities, replaced_ids=None):
+        """
+        Intégrer de nouvelles courbes dans l'enveloppe (O(durées) par activité) :
+        upsert conditionnel qui ne remplace une valeur que si elle est battue ;
+        les fenêtres dont une activité de replaced_ids était la source d'une valeur
+        qui baisse (ou disparaît) sont reconstruites depuis activity_power_curve
+        """
+        now = datetime.utcnow()
+        
+        # Meilleure valeur du lot par (athlète, fenêtre, durée) : une seule ligne par clé
+        best = {}
+        for activity_id, curve in curves.items():
+            activity = activities.get(activity_id)
+            if activity is None:
+                continue
+            for window in self.envelope_windows_for(activity.start_date, now):
+                for duration, watts in curve.items():
+                    key = (activity.athlete_id, window, duration)
+                    if key not in best or watts > best[key]['watts']:
+                        best[key] = {
+                            'athlete_id': activity.athlete_id,
+                            'window_days': window,
+                            'duration_seconds': duration,
+                            'watts': watts,
+                            'activity_id': activity_id,
+                            'start_date': activity.start_date,
+                            'updated_at': now
+                        }
+        rows = list(best.values())
+        
+        # Une courbe recalculée à la baisse invalide les valeurs dont elle était la source
+        replaced_ids = list(curves.keys()) if replaced_ids is None else list(replaced_ids)
+        stale_windows = {}
+        for athlete_id, window, activity_id, duration, watts in db.session.query(
+            AthletePowerEnvelope.athlete_id, AthletePowerEnvelope.window_days, AthletePowerEnvelope.activity_id,
+            AthletePowerEnvelope.duration_seconds, AthletePowerEnvelope.watts
+        ).filter(AthletePowerEnvelope.activity_id.in_(replaced_ids)).all():
+            if curves.get(activity_id, {}).get(duration, 0) < watts:
+                stale_windows.setdefault(athlete_id, set()).add(window)
+        
+        table = AthletePowerEnvelope.__table__
+        for offset in range(0, len(rows), 5000):
+            stmt = pg_insert(table).values(rows[offset:offset + 5000])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['athlete_id', 'window_days', 'duration_seconds'],
+                set_={
+                    'watts': stmt.excluded.watts,
+                    'activity_id': stmt.excluded.activity_id,
+                    'start_date': stmt.excluded.start_date,
+                    'updated_at': stmt.excluded.updated_at
+                },
+                where=table.c.watts < stmt.excluded.watts
+            )
+            db.session.execute(stmt)
+        
+        for athlete_id, windows in stale_windows.items():
+            self.rebuild_envelope(athlete_id, sorted(windows))
+    
+    @staticmethod
+    def rebuild_envelope(athlete_id, windows=ENVELOPE_WINDOWS):
+        """
+        Reconstruire l'enveloppe depuis activity_power_curve (suppression d'activité,
+        expiration d'une source) ; le commit est laissé à l'appelant
+        """
+        now = datetime.utcnow()
+        AthletePowerEnvelope.query.filter(AthletePowerEnvelope.athlete_id == athlete_id)\
+            .filter(AthletePowerEnvelope.window_days.in_(list(windows)))\
+            .delete(synchronize_session=False)
+        
+        curve = ActivityPowerCurve.__table__.c
+        for window in windows:
+            # Meilleure valeur par durée, la plus ancienne source en cas d'égalité
+            best = select(
+                curve.athlete_id, literal(window), curve.duration_seconds,
+                curve.watts, curve.activity_id, curve.start_date, literal(now)
+            ).where(curve.athlete_id == athlete_id)
+            if window:
+                best = best.where(curve.start_date >= now - timedelta(days=window))
+            best = best.distinct(curve.duration_seconds)\
+                .order_by(curve.duration_seconds, curve.watts.desc(), curve.start_date)
+            
+            db.session.execute(AthletePowerEnvelope.__table__.insert().from_select(
+                ['athlete_id', 'window_days', 'duration_seconds', 'watts',
+                 'activity_id', 'start_date', 'updated_at'],
+                best
+            ))
+    
+    def rebuild_envelopes_for_activities(self, activity_ids):
+        """Reconstruire les enveloppes dont une de ces activités est la source (avant suppression)"""
+        athlete_ids = [athlete_id for (athlete_id,) in db.session.query(AthletePowerEnvelope.athlete_id)
+                       .filter(AthletePowerEnvelope.activity_id.in_(activity_ids)).distinct().all()]
+        for athlete_id in athlete_ids:
+            self.rebuild_envelope(athlete_id)
+        return athlete_ids
+    
+    def refresh_expired_windows(self, athlete_id):
+        """Reconstruire les fenêtres glissantes dont une source est sortie de la fenêtre"""
+        now = datetime.utcnow()
+        expired = [
+            window for (window,) in db.session.query(AthletePowerEnvelope.window_days)
+            .filter(AthletePowerEnvelope.athlete_id == athlete_id)
+            .filter(AthletePowerEnvelope.window_days > 0)
+            .filter(AthletePowerEnvelope.start_date
+                    < now - AthletePowerEnvelope.window_days * timedelta(days=1))
+            .distinct().all()
+        ]
+        if not expired:
+            return []
+        
+        try:
+            self.rebuild_envelope(athlete_id, expired)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return expired
+    
+    def compute_missing_for_athlete(self, athlete_id, batch_size=200):
+        """Calculer les courbes des activités qui ont des streams mais pas encore de courbe"""
+        computed = 0
+        while True:
+            pending = db.session.query(ActivityStreams.activity_id, ActivityStreams.data)\
+                .join(ActivitySummary, ActivitySummary.id == ActivityStreams.activity_id)\
+                .outerjoin(ActivityPowerCurve, ActivityPowerCurve.activity_id == ActivityStreams.activity_id)\
+                .filter(ActivitySummary.athlete_id == athlete_id)\
+                .filter(ActivityStreams.stream_types.like('%watts%'))\
+                .filter(ActivityPowerCurve.activity_id.is_(None))\
+                .limit(batch_size).all()
+            if not pending:
+                break
+            
+            curves = {
+                activity_id: self.compute_power_curve(decode_streams(bytes(data), ('time', 'watts')))
+                for activity_id, data in pending
+            }
+            stored = self.store_power_curves(curves)
+            computed += stored
+            if stored < len(pending):
+                # Streams watts inexploitables : ne pas les reprendre indéfiniment
+                break
+        
+        return computed
+    
+    @staticmethod
+    def get_activity_power_curve(activity_id):
+        rows = ActivityPowerCurve.query.filter_by(activity_id=activity_id)\
+            .order_by(ActivityPowerCurve.duration_seconds).all()
+        return [{'duration_seconds': row.duration_seconds, 'watts': row.watts} for row in rows]
+    
+    def get_athlete_power_curve(self, athlete_id, days=None):
+        """
+        Meilleure puissance par durée sur toutes les activités (ou les `days` derniers jours)
+        Lue dans l'enveloppe maintenue pour les fenêtres standard, agrégée sinon
+        """
+        window = days or 0
+        if window in ENVELOPE_WINDOWS:
+            return self.get_envelope(athlete_id, window)
+        
+        query = db.session.query(
+            ActivityPowerCurve.duration_seconds,
+            db.func.max(ActivityPowerCurve.watts)
+        ).filter(ActivityPowerCurve.athlete_id == athlete_id)
+        if days:
+            query = query.filter(ActivityPowerCurve.start_date >= datetime.utcnow() - timedelta(days=days))
+        
+        best = dict(query.group_by(ActivityPowerCurve.duration_seconds).all())
+        return [
+            {'duration_seconds': duration, 'power': best[duration]}
+            for duration in POWER_CURVE_DURATIONS if duration in best
+        ]
+    
+    def get_envelope(self, athlete_id, window=0):
+        """Enveloppe maintenue d'une fenêtre, avec l'activité source de chaque durée"""
+        self.refresh_expired_windows(athlete_id)
+        
+        rows = AthletePowerEnvelope.query.filter_by(athlete_id=athlete_id, window_days=window)\
+            .order_by(AthletePowerEnvelope.duration_seconds).all()
+        
+        if not rows:
+            # Fenêtre vide : construction initiale (courbes antérieures à l'enveloppe) ou
+            # fenêtre manquante alors que des courbes s'y trouvent ; sinon rien à reconstruire
+            curves = ActivityPowerCurve.query.filter_by(athlete_id=athlete_id)
+            if not db.session.query(AthletePowerEnvelope.query.filter_by(athlete_id=athlete_id).exists()).scalar():
+                windows = ENVELOPE_WINDOWS if curves.first() else []
+            else:
+                if window:
+                    curves = curves.filter(ActivityPowerCurve.start_date >= datetime.utcnow() - timedelta(days=window))
+                windows = [window] if curves.first() else []
+            if not windows:
+                return []
+            try:
+                self.rebuild_envelope(athlete_id, windows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            rows = AthletePowerEnvelope.query.filter_by(athlete_id=athlete_id, window_days=window)\
+                .order_by(AthletePowerEnvelope.duration_seconds).all()
+        
+        return [
+            {
+                'duration_seconds': row.duration_seconds,
+                'power': row.watts,
+                'activity_id': row.activity_id,
+                'start_date': row.start_date.isoformat()
+            }
+            for row in rows
+        ]
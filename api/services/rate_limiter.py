@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+import time
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db
+from models.rate_limit import StravaRateLimitState
+
+SHORT_WINDOW = timedelta(minutes=15)
+
+
+class StravaRateLimiter:
+    """
+    Limiteur de requêtes Strava partagé entre processus
+
+    L'état (compteurs 15 minutes et journalier) est stocké dans PostgreSQL et
+    verrouillé ligne par ligne, si bien que tous les workers consomment le même budget.
+    Les compteurs sont resynchronisés avec les en-têtes X-RateLimit-* de Strava.
+    Utilise directement l'engine SQLAlchemy : utilisable depuis des threads sans contexte Flask.
+    """
+    
+    def __init__(self, engine, bucket='default', short_limit=100, daily_limit=1000, reserve=5):
+        self.engine = engine
+        self.bucket = bucket
+        self.default_short_limit = short_limit
+        self.default_daily_limit = daily_limit
+        # Marge gardée en réserve (requêtes manuelles, autres clients de la même application)
+        self.reserve = reserve
+        self.table = StravaRateLimitState.__table__
+    
+    @staticmethod
+    def current_windows(now):
+        """Débuts des fenêtres Strava : quart d'heure aligné et minuit UTC"""
+        short_start = now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0)
+        daily_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return short_start, daily_start
+    
+    def _lock_state(self, conn, now):
+        """Verrouiller (et créer au besoin) la ligne d'état du bucket"""
+        short_start, daily_start = self.current_windows(now)
+        conn.execute(
+            pg_insert(self.table).values(
+                bucket=self.bucket,
+                short_window_start=short_start,
+                short_count=0,
+                short_limit=self.default_short_limit,
+                daily_window_start=daily_start,
+                daily_count=0,
+                daily_limit=self.default_daily_limit,
+                updated_at=now
+            ).on_conflict_do_nothing(index_elements=['bucket'])
+        )
+        state = conn.execute(
+            select(self.table).where(self.table.c.bucket == self.bucket).with_for_update()
+        ).first()
+        
+        # Remise à zéro des compteurs si la fenêtre est terminée
+        short_count = state.short_count if state.short_window_start == short_start else 0
+        daily_count = state.daily_count if state.daily_window_start == daily_start else 0
+        return state, short_start, daily_start, short_count, daily_count
+    
+    def try_acquire(self):
+        """
+        Réserver une requête si le budget le permet
+        Retourne 0 si la requête est accordée, sinon le nombre de secondes à attendre
+        """
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            state, short_start, daily_start, short_count, daily_count = self._lock_state(conn, now)
+            
+            if daily_count >= state.daily_limit - self.reserve:
+                wait_seconds = (daily_start + timedelta(days=1) - now).total_seconds()
+            elif short_count >= state.short_limit - self.reserve:
+                wait_seconds = (short_start + SHORT_WINDOW - now).total_seconds()
+            else:
+                short_count += 1
+                daily_count += 1
+                wait_seconds = 0
+            
+            conn.execute(
+                update(self.table).where(self.table.c.bucket == self.bucket).values(
+                    short_window_start=short_start,
+                    short_count=short_count,
+                    daily_window_start=daily_start,
+                    daily_count=daily_count,
+                    updated_at=now
+                )
+            )
+        
+        return max(wait_seconds, 0)
+    
+    def acquire(self):
+        """Attendre (uniquement le temps nécessaire) puis réserver une requête"""
+        while True:
+            wait_seconds = self.try_acquire()
+            if not wait_seconds:
+                return
+            print(f"Rate limit Strava atteint, attente de {wait_seconds / 60:.1f} minutes (fin de fenêtre)...")
+            time.sleep(wait_seconds)
+    
+    @staticmethod
+    def parse_header_pair(value):
+        """'100,1000' -> (100, 1000)"""
+        try:
+            short_value, daily_value = (int(part.strip()) for part in value.split(','))
+            return short_value, daily_value
+        except (AttributeError, ValueError):
+            return None
+    
+    def update_from_headers(self, headers):
+        """
+        Resynchroniser le budget avec les en-têtes de réponse Strava
+        Les limites de lecture (X-ReadRateLimit-*) sont prioritaires quand elles sont présentes
+        """
+        limits = self.parse_header_pair(headers.get('X-ReadRateLimit-Limit') or headers.get('X-RateLimit-Limit'))
+        usage = self.parse_header_pair(headers.get('X-ReadRateLimit-Usage') or headers.get('X-RateLimit-Usage'))
+        if not limits or not usage:
+            return
+        
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            state, short_start, daily_start, short_count, daily_count = self._lock_state(conn, now)
+            conn.execute(
+                update(self.table).where(self.table.c.bucket == self.bucket).values(
+                    short_window_start=short_start,
+                    short_limit=limits[0],
+                    # Strava fait foi, sans oublier les requêtes réservées encore en vol
+                    short_count=max(short_count, usage[0]),
+                    daily_window_start=daily_start,
+                    daily_limit=limits[1],
+                    daily_count=max(daily_count, usage[1]),
+                    updated_at=now
+                )
+            )
+    
+    def get_status(self):
+        """État courant du budget (lecture seule)"""
+        now = datetime.utcnow()
+        short_start, daily_start = self.current_windows(now)
+        with self.engine.connect() as conn:
+            state = conn.execute(select(self.table).where(self.table.c.bucket == self.bucket)).first()
+        
+        short_limit = state.short_limit if state else self.default_short_limit
+        daily_limit = state.daily_limit if state else self.default_daily_limit
+        short_count = state.short_count if state and state.short_window_start == short_start else 0
+        daily_count = state.daily_count if state and state.daily_window_start == daily_start else 0
+        
+        return {
+            'short_window': {
+                'used': short_count,
+                'limit': short_limit,
+                'resets_at': (short_start + SHORT_WINDOW).isoformat()
+            },
+            'daily_window': {
+                'used': daily_count,
+                'limit': daily_limit,
+                'resets_at': (daily_start + timedelta(days=1)).isoformat()
+            },
+            'reserve': self.reserve
+        }
+
+
+def get_rate_limiter():
+    """Limiteur partagé de l'application Flask courante (un par processus)"""
+    limiter = current_app.extensions.get('strava_rate_limiter')
+    if limiter is None:
+        limiter = StravaRateLimiter(
+            db.engine,
+            short_limit=current_app.config['STRAVA_RATE_LIMIT_SHORT'],
+            daily_limit=current_app.config['STRAVA_RATE_LIMIT_DAILY'],
+            reserve=current_app.config['STRAVA_RATE_LIMIT_RESERVE']
+        )
+        current_app.extensions['strava_rate_limiter'] = limiter
+    return limiter
@@ -0,0 +1,253 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import literal, select
+from models.database import db, ActivitySummary
+from models.custom_metrics import ActivityCustomMetrics
+from models.rollups import AthleteActivityRollup
+
+ROLLUP_MEASURES = ('activity_count', 'distance_km', 'moving_hours', 'elevation_m', 'tss')
+ROLLUP_COLUMNS = ['athlete_id', 'period', 'period_start', 'activity_type', *ROLLUP_MEASURES, 'updated_at']
+
+# Verrou consultatif (classe, athlete_id) : une seule réécriture des agrégats d'un athlète à la fois
+ROLLUP_LOCK_CLASS = 718003
+
+
+def period_start(day, period):
+    """Premier jour de la semaine (lundi, comme date_trunc) ou du mois contenant `day`"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period_start(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+class ActivityRollupService:
+    """
+    Agrégats jour / semaine / mois par type de sport, recalculés uniquement pour
+    les périodes touchées par une écriture : jours depuis activity_summary, puis
+    semaines et mois depuis les lignes journalières (quelques dizaines de lignes)
+    """
+    
+    @staticmethod
+    def activity_days(activity_ids):
+        """{(athlete_id, jour)} des activités (avant suppression ou changement de date)"""
+        activity_ids = list(activity_ids)
+        if not activity_ids:
+            return set()
+        return set(
+            db.session.query(ActivitySummary.athlete_id, db.func.date(ActivitySummary.start_date_local))
+            .filter(ActivitySummary.id.in_(activity_ids)).distinct().all()
+        )
+    
+    @staticmethod
+    def daily_select(athlete_id, days=None):
+        """SELECT des lignes journalières d'un athlète (tous les jours, ou seulement `days`)"""
+        day = db.func.date(ActivitySummary.start_date_local)
+        activity_type = db.func.coalesce(ActivitySummary.type, 'Other')
+        query = select(
+            ActivitySummary.athlete_id,
+            literal('day'),
+            day,
+            activity_type,
+            db.func.count(ActivitySummary.id),
+            db.func.coalesce(db.func.sum(ActivitySummary.distance_km), 0),
+            db.func.coalesce(db.func.sum(ActivitySummary.moving_time_seconds), 0) / 3600.0,
+            db.func.coalesce(db.func.sum(ActivitySummary.total_elevation_gain), 0),
+            db.func.coalesce(db.func.sum(ActivityCustomMetrics.custom_tss), 0),
+            literal(datetime.utcnow())
+        ).outerjoin(ActivityCustomMetrics, ActivityCustomMetrics.activity_id == ActivitySummary.id)\
+         .where(ActivitySummary.athlete_id == athlete_id)
+        if days is not None:
+            # Bornes sur start_date_local : index (athlete_id, start_date_local)
+            query = query.where(ActivitySummary.start_date_local >= min(days))\
+                .where(ActivitySummary.start_date_local < max(days) + timedelta(days=1))\
+                .where(day.in_(days))
+        return query.group_by(ActivitySummary.athlete_id, day, activity_type)
+    
+    @staticmethod
+    def period_select(athlete_id, period, starts=None):
+        """SELECT des lignes semaine / mois d'un athlète, sommes des lignes journalières"""
+        rollup = AthleteActivityRollup
+        start = db.cast(db.func.date_trunc(period, rollup.period_start), db.Date)
+        query = select(
+            rollup.athlete_id,
+            literal(period),
+            start,
+            rollup.activity_type,
+            *[db.func.sum(getattr(rollup, measure)) for measure in ROLLUP_MEASURES],
+            literal(datetime.utcnow())
+        ).where(rollup.athlete_id == athlete_id).where(rollup.period == 'day')
+        if starts is not None:
+            query = query.where(rollup.period_start >= min(starts))\
+                .where(rollup.period_start < next_period_start(max(starts), period))\
+                .where(start.in_(starts))
+        return query.group_by(rollup.athlete_id, start, rollup.activity_type)
+    
+    @staticmethod
+    def lock_athlete(athlete_id):
+        """
+        Verrou de transaction sur les agrégats d'un athlète : deux jobs simultanés (sync,
+        webhook, streams) réécrivant les mêmes jours ne se heurtent pas sur la clé primaire
+        """
+        db.session.execute(select(db.func.pg_advisory_xact_lock(ROLLUP_LOCK_CLASS, athlete_id)))
+    
+    def refresh_days(self, athlete_days):
+        """
+        Recalculer les agrégats des jours {(athlete_id, jour)} et de leurs semaines / mois
+        (sans commit : dans la transaction de l'écriture)
+        """
+        days_by_athlete = defaultdict(set)
+        for athlete_id, day in athlete_days:
+            if day is not None:
+                days_by_athlete[athlete_id].add(day)
+        
+        table = AthleteActivityRollup.__table__
+        # Athlètes dans un ordre fixe : pas d'interblocage entre deux lots multi-athlètes
+        for athlete_id, days in sorted(days_by_athlete.items()):
+            days = sorted(days)
+            self.lock_athlete(athlete_id)
+            db.session.execute(table.delete().where(table.c.athlete_id == athlete_id)
+                               .where(table.c.period == 'day').where(table.c.period_start.in_(days)))
+            db.session.execute(table.insert().from_select(ROLLUP_COLUMNS, self.daily_select(athlete_id, days)))
+            
+            for period in ('week', 'month'):
+                starts = sorted({period_start(day, period) for day in days})
+                db.session.execute(table.delete().where(table.c.athlete_id == athlete_id)
+                                   .where(table.c.period == period).where(table.c.period_start.in_(starts)))
+                db.session.execute(table.insert().from_select(
+                    ROLLUP_COLUMNS, self.period_select(athlete_id, period, starts)
+                ))
+    
+    def refresh_activities(self, activity_ids):
+        """refresh_days pour les jours de ces activités (TSS recalculé, sans commit)"""
+        self.refresh_days(self.activity_days(activity_ids))
+    
+    def rebuild_for_athlete(self, athlete_id):
+        """Reconstruire tous les agrégats d'un athlète (première mise en place, réparation)"""
+        table = AthleteActivityRollup.__table__
+        try:
+            self.lock_athlete(athlete_id)
+            db.session.execute(table.delete().where(table.c.athlete_id == athlete_id))
+            db.session.execute(table.insert().from_select(ROLLUP_COLUMNS, self.daily_select(athlete_id)))
+            for period in ('week', 'month'):
+                db.session.execute(table.insert().from_select(ROLLUP_COLUMNS, self.period_select(athlete_id, period)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return AthleteActivityRollup.query.filter_by(athlete_id=athlete_id).count()
+    
+    def ensure_built(self, athlete_id):
+        """Agrégats absents pour un athlète qui a des activités (données antérieures) : reconstruction"""
+        has_rollups = db.session.query(
+            AthleteActivityRollup.query.filter_by(athlete_id=athlete_id).exists()
+        ).scalar()
+        if has_rollups:
+            return False
+        has_activities = db.session.query(
+            ActivitySummary.query.filter_by(athlete_id=athlete_id).exists()
+        ).scalar()
+        if has_activities:
+            self.rebuild_for_athlete(athlete_id)
+        return has_activities
+    
+    @staticmethod
+    def load_periods(athlete_id, period, start, end):
+        """{period_start: [lignes par type]} sur [start, end) (lecture par la clé primaire)"""
+        rows = AthleteActivityRollup.query\
+            .filter(AthleteActivityRollup.athlete_id == athlete_id)\
+            .filter(AthleteActivityRollup.period == period)\
+            .filter(AthleteActivityRollup.period_start >= start)\
+            .filter(AthleteActivityRollup.period_start < end)\
+            .order_by(AthleteActivityRollup.period_start, AthleteActivityRollup.activity_type).all()
+        periods = defaultdict(list)
+        for row in rows:
+            periods[row.period_start].append(row)
+        return periods
+    
+    @staticmethod
+    def summarize(rows):
+        """Totaux et détail par type d'un ensemble de lignes d'agrégat"""
+        totals = {measure: 0 for measure in ROLLUP_MEASURES}
+        by_type = defaultdict(lambda: {measure: 0 for measure in ROLLUP_MEASURES})
+        for row in rows:
+            for measure in ROLLUP_MEASURES:
+                totals[measure] += getattr(row, measure)
+                by_type[row.activity_type][measure] += getattr(row, measure)
+        
+        def rounded(values):
+            return {
+                'activities': values['activity_count'],
+                'distance_km': round(values['distance_km'], 2),
+                'moving_hours': round(values['moving_hours'], 2),
+                'elevation_m': round(values['elevation_m']),
+                'tss': round(values['tss'], 1)
+            }
+        
+        return {
+            **rounded(totals),
+            'by_type': {activity_type: rounded(values) for activity_type, values in sorted(by_type.items())}
+        }
+    
+    def get_period_series(self, athlete_id, period, count, today=None):
+        """Les `count` dernières périodes (semaines ou mois), périodes vides comprises"""
+        today = today or date.today()
+        starts = [period_start(today, period)]
+        for _ in range(count - 1):
+            starts.insert(0, period_start(starts[0] - timedelta(days=1), period))
+        periods = self.load_periods(athlete_id, period, starts[0], next_period_start(starts[-1], period))
+        return [
+            {'period_start': start.isoformat(), **self.summarize(periods.get(start, []))}
+            for start in starts
+        ]
+    
+    def get_monthly_stats(self, athlete_id, months=12, year=None):
+        """Statistiques mensuelles par type de sport (une année civile ou les N derniers mois)"""
+        self.ensure_built(athlete_id)
+        if year is not None:
+            periods = self.load_periods(athlete_id, 'month', date(year, 1, 1), date(year + 1, 1, 1))
+            starts = [date(year, month, 1) for month in range(1, 13)]
+            return [
+                {'month': start.strftime('%Y-%m'), **self.summarize(periods.get(start, []))}
+                for start in starts
+            ]
+        return [
+            {'month': item.pop('period_start')[:7], **item}
+            for item in self.get_period_series(athlete_id, 'month', months)
+        ]
+    
+    def get_dashboard(self, athlete_id, today=None):
+        """
+        Semaine et mois en cours (et précédents), année en cours, tendance des 12
+        dernières semaines : uniquement des lectures d'agrégats
+        """
+        self.ensure_built(athlete_id)
+        today = today or date.today()
+        week_start = period_start(today, 'week')
+        month_start = period_start(today, 'month')
+        previous_month_start = period_start(month_start - timedelta(days=1), 'month')
+        
+        weeks = self.load_periods(athlete_id, 'week', week_start - timedelta(days=7), next_period_start(week_start, 'week'))
+        months = self.load_periods(athlete_id, 'month', date(today.year, 1, 1), next_period_start(month_start, 'month'))
+        if previous_month_start.year < today.year:
+            months.update(self.load_periods(athlete_id, 'month', previous_month_start, month_start))
+        
+        return {
+            'date': today.isoformat(),
+            'current_week': {'start': week_start.isoformat(), **self.summarize(weeks.get(week_start, []))},
+            'previous_week': self.summarize(weeks.get(week_start - timedelta(days=7), [])),
+            'current_month': {'start': month_start.isoformat(), **self.summarize(months.get(month_start, []))},
+            'previous_month': self.summarize(months.get(previous_month_start, [])),
+            'year_to_date': self.summarize([
+                row for start, rows in months.items() if start.year == today.year for row in rows
+            ]),
+            'weekly_trend': self.get_period_series(athlete_id, 'week', 12, today)
+        }
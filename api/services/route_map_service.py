@@ -0,0 +1,319 @@
+from datetime import datetime
+import numpy as np
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, ActivitySummary
+from models.route_map import ActivityRoute, ActivityRouteTile, AthleteHeatmapTile, ROUTE_INDEX_ZOOM
+from services.geo import (
+    decode_polyline, pack_coords, unpack_coords, route_tiles, bbox_tile_range, tile_bounds,
+    route_intersects_bbox, distance_to_route_m, bbox_around, heatmap_counts, heatmap_rgba, encode_png
+)
+
+# Au-delà, une emprise couvre trop de tuiles d'index : filtre sur l'emprise des tracés
+MAX_INDEX_TILES = 4096
+
+# Niveaux de heatmap pré-calculés après chaque synchronisation (les autres à la demande)
+HEATMAP_PRECOMPUTE_ZOOMS = range(6, 13)
+HEATMAP_MAX_ZOOM = 17
+
+
+class RouteMapService:
+    """
+    Tracés des activités (polylines Strava), index spatial par tuiles et heatmap par athlète
+    Requêtes en deux temps : candidats par l'index (SQL), test exact sur les coordonnées (NumPy)
+    """
+    
+    # ========== INGESTION ==========
+    
+    def store_routes(self, polylines):
+        """
+        Enregistrer {activity_id: summary_polyline} : tracé décodé, tuiles d'index
+        et invalidation des tuiles de heatmap traversées (avant et après)
+        Polyline vide (activité sans GPS, masquée) : le tracé existant est supprimé
+        """
+        if not polylines:
+            return 0
+        
+        owners = dict(db.session.query(ActivitySummary.id, ActivitySummary.athlete_id)
+                      .filter(ActivitySummary.id.in_(list(polylines))).all())
+        rows = []
+        tile_rows = []
+        for activity_id, polyline in polylines.items():
+            if activity_id not in owners or not polyline:
+                continue
+            try:
+                coords = decode_polyline(polyline)
+            except ValueError as e:
+                print(f"Polyline invalide ignorée (activité {activity_id}): {str(e)}")
+                continue
+            if not len(coords):
+                continue
+            
+            rows.append({
+                'activity_id': activity_id,
+                'athlete_id': owners[activity_id],
+                'summary_polyline': polyline,
+                'coords': pack_coords(coords),
+                'point_count': len(coords),
+                'min_lat': float(coords[:, 0].min()),
+                'min_lng': float(coords[:, 1].min()),
+                'max_lat': float(coords[:, 0].max()),
+                'max_lng': float(coords[:, 1].max()),
+                'updated_at': datetime.utcnow()
+            })
+            tile_rows.extend(
+                {'athlete_id': owners[activity_id], 'tile_x': int(x), 'tile_y': int(y), 'activity_id': activity_id}
+                for x, y in route_tiles(coords, ROUTE_INDEX_ZOOM)
+            )
+        
+        try:
+            changed = self.remove_routes([activity_id for activity_id in polylines if activity_id in owners])
+            if rows:
+                db.session.execute(pg_insert(ActivityRoute.__table__).values(rows))
+            for offset in range(0, len(tile_rows), 5000):
+                db.session.execute(pg_insert(ActivityRouteTile.__table__).values(tile_rows[offset:offset + 5000]))
+            for row in tile_rows:
+                changed.setdefault(row['athlete_id'], set()).add((row['tile_x'], row['tile_y']))
+            self.invalidate_heatmap(changed)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return len(rows)
+    
+    def store_routes_from_payloads(self, activity_ids, payloads):
+        """
+        Tracés des réponses Strava {strava_id: payload} pour {strava_id: activity_id}
+        Les réponses sans bloc 'map' ne touchent pas au tracé existant
+        """
+        polylines = {
+            activity_ids[strava_id]: (payload['map'] or {}).get('summary_polyline') or ''
+            for strava_id, payload in payloads.items()
+            if strava_id in activity_ids and 'map' in payload
+        }
+        return self.store_routes(polylines)
+    
+    def remove_routes(self, activity_ids):
+        """
+        Supprimer tracés et tuiles d'index (sans commit)
+        Retourne {athlete_id: {(x, y)}} des tuiles libérées, déjà invalidées côté heatmap
+        """
+        if not activity_ids:
+            return {}
+        
+        table = ActivityRouteTile.__table__
+        removed = db.session.execute(
+            delete(table).where(table.c.activity_id.in_(list(activity_ids)))
+            .returning(table.c.athlete_id, table.c.tile_x, table.c.tile_y)
+        ).fetchall()
+        ActivityRoute.query.filter(ActivityRoute.activity_id.in_(list(activity_ids)))\
+            .delete(synchronize_session=False)
+        
+        changed = {}
+        for athlete_id, tile_x, tile_y in removed:
+            changed.setdefault(athlete_id, set()).add((tile_x, tile_y))
+        self.invalidate_heatmap(changed)
+        return changed
+    
+    @staticmethod
+    def invalidate_heatmap(changed):
+        """Supprimer les tuiles de heatmap (tous niveaux) qui recouvrent des tuiles d'index modifiées"""
+        for athlete_id, tiles in changed.items():
+            if not tiles:
+                continue
+            # Tuiles parentes (zoom <= index) et tuiles filles (zoom > index, décalage des coordonnées)
+            parents = {(zoom, x >> (ROUTE_INDEX_ZOOM - zoom), y >> (ROUTE_INDEX_ZOOM - zoom))
+                       for x, y in tiles for zoom in range(ROUTE_INDEX_ZOOM + 1)}
+            shift = AthleteHeatmapTile.zoom - ROUTE_INDEX_ZOOM
+            AthleteHeatmapTile.query.filter(AthleteHeatmapTile.athlete_id == athlete_id).filter(db.or_(
+                tuple_(AthleteHeatmapTile.zoom, AthleteHeatmapTile.tile_x, AthleteHeatmapTile.tile_y).in_(parents),
+                db.and_(
+                    AthleteHeatmapTile.zoom > ROUTE_INDEX_ZOOM,
+                    tuple_(AthleteHeatmapTile.tile_x.op('>>')(shift),
+                           AthleteHeatmapTile.tile_y.op('>>')(shift)).in_(list(tiles))
+                )
+            )).delete(synchronize_session=False)
+    
+    # ========== REQUÊTES SPATIALES ==========
+    
+    @staticmethod
+    def candidate_activity_ids(athlete_id, south, west, north, east):
+        """Activités dont le tracé peut traverser l'emprise (sur-ensemble, test exact ensuite)"""
+        x_min, y_min, x_max, y_max = bbox_tile_range(south, west, north, east, ROUTE_INDEX_ZOOM)
+        # Une tuile de marge : un tracé qui ne fait qu'effleurer un coin de tuile n'y est pas indexé
+        x_min, y_min, x_max, y_max = x_min - 1, y_min - 1, x_max + 1, y_max + 1
+        
+        if (x_max - x_min + 1) * (y_max - y_min + 1) <= MAX_INDEX_TILES:
+            query = db.session.query(ActivityRouteTile.activity_id).distinct()\
+                .filter(ActivityRouteTile.athlete_id == athlete_id)\
+                .filter(ActivityRouteTile.tile_x.between(x_min, x_max))\
+                .filter(ActivityRouteTile.tile_y.between(y_min, y_max))
+        else:
+            query = db.session.query(ActivityRoute.activity_id)\
+                .filter(ActivityRoute.athlete_id == athlete_id)\
+                .filter(ActivityRoute.min_lat <= north, ActivityRoute.max_lat >= south)\
+                .filter(ActivityRoute.min_lng <= east, ActivityRoute.max_lng >= west)
+        return [activity_id for (activity_id,) in query]
+    
+    @staticmethod
+    def load_routes(activity_ids, batch_size=1000):
+        """{activity_id: coordonnées (n, 2)} décodées depuis le tableau compact"""
+        routes = {}
+        activity_ids = list(activity_ids)
+        for offset in range(0, len(activity_ids), batch_size):
+            rows = db.session.query(ActivityRoute.activity_id, ActivityRoute.coords)\
+                .filter(ActivityRoute.activity_id.in_(activity_ids[offset:offset + batch_size]))
+            routes.update((activity_id, unpack_coords(bytes(coords))) for activity_id, coords in rows)
+        return routes
+    
+    @staticmethod
+    def describe_activities(activity_ids, extra=None, limit=None):
+        """Résumés des activités trouvées (plus récentes d'abord)"""
+        if not activity_ids:
+            return []
+        query = ActivitySummary.query.filter(ActivitySummary.id.in_(list(activity_ids)))\
+            .order_by(ActivitySummary.start_date.desc())
+        if limit:
+            query = query.limit(limit)
+        
+        activities = []
+        for activity in query:
+            item = {
+                'id': activity.id,
+                'strava_id': activity.strava_id,
+                'name': activity.name,
+                'type': activity.type,
+                'start_date_local': activity.start_date_local.isoformat() if activity.start_date_local else None,
+                'distance_km': float(activity.distance_km) if activity.distance_km is not None else None
+            }
+            item.update((extra or {}).get(activity.id, {}))
+            activities.append(item)
+        return activities
+    
+    def find_in_bbox(self, athlete_id, south, west, north, east, limit=200):
+        """Activités dont le tracé traverse l'emprise"""
+        candidates = self.candidate_activity_ids(athlete_id, south, west, north, east)
+        routes = self.load_routes(candidates)
+        matched = [activity_id for activity_id, coords in routes.items()
+                   if route_intersects_bbox(coords, south, west, north, east)]
+        return {
+            'candidates': len(candidates),
+            'matched': len(matched),
+            'activities': self.describe_activities(matched, limit=limit)
+        }
+    
+    def find_near(self, athlete_id, lat, lng, radius_m=200, limit=200):
+        """Activités passées à moins de radius_m mètres d'un point (les plus proches d'abord)"""
+        candidates = self.candidate_activity_ids(athlete_id, *bbox_around(lat, lng, radius_m))
+        distances = {}
+        for activity_id, coords in self.load_routes(candidates).items():
+            distance = distance_to_route_m(coords, lat, lng)
+            if distance is not None and distance <= radius_m:
+                distances[activity_id] = distance
+        
+        nearest = sorted(distances, key=distances.get)[:limit]
+        activities = self.describe_activities(
+            nearest, extra={activity_id: {'distance_m': round(distances[activity_id], 1)} for activity_id in nearest}
+        )
+        return {
+            'candidates': len(candidates),
+            'matched': len(distances),
+            'activities': sorted(activities, key=lambda item: item['distance_m'])
+        }
+    
+    @staticmethod
+    def get_route(activity_id):
+        route = ActivityRoute.query.get(activity_id)
+        return route.to_dict() if route else None
+    
+    # ========== HEATMAP ==========
+    
+    @staticmethod
+    def route_bboxes(routes):
+        """Tracés {activity_id: coords} -> (liste des tracés, emprises (n, 4) sud/ouest/nord/est)"""
+        coords = [route for route in routes.values() if len(route)]
+        bboxes = np.array([[route[:, 0].min(), route[:, 1].min(), route[:, 0].max(), route[:, 1].max()]
+                           for route in coords]).reshape(-1, 4)
+        return coords, bboxes
+    
+    @staticmethod
+    def render_tile(routes, bboxes, zoom, x, y):
+        """Rendre une tuile de heatmap -> ligne athlete_heatmap_tiles (sans athlete_id)"""
+        south, west, north, east = tile_bounds(zoom, x, y)
+        crossing = np.flatnonzero((bboxes[:, 0] <= north) & (bboxes[:, 2] >= south)
+                                  & (bboxes[:, 1] <= east) & (bboxes[:, 3] >= west))
+        counts, activity_count = heatmap_counts([routes[i] for i in crossing], zoom, x, y)
+        return {
+            'zoom': zoom,
+            'tile_x': x,
+            'tile_y': y,
+            'png': encode_png(heatmap_rgba(counts)),
+            'activity_count': activity_count,
+            'max_count': int(counts.max()),
+            'built_at': datetime.utcnow()
+        }
+    
+    @staticmethod
+    def store_heatmap_tiles(athlete_id, tiles):
+        if not tiles:
+            return 0
+        for tile in tiles:
+            tile['athlete_id'] = athlete_id
+        stmt = pg_insert(AthleteHeatmapTile.__table__).values(tiles)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['athlete_id', 'zoom', 'tile_x', 'tile_y'],
+            set_={column: stmt.excluded[column] for column in ('png', 'activity_count', 'max_count', 'built_at')}
+        )
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(tiles)
+    
+    def get_heatmap_tile(self, athlete_id, zoom, x, y):
+        """PNG d'une tuile de heatmap : pré-calculée, sinon rendue puis conservée"""
+        tile = AthleteHeatmapTile.query.get((athlete_id, zoom, x, y))
+        if tile:
+            return bytes(tile.png)
+        
+        routes = self.load_routes(self.candidate_activity_ids(athlete_id, *tile_bounds(zoom, x, y)))
+        row = self.render_tile(*self.route_bboxes(routes), zoom, x, y)
+        self.store_heatmap_tiles(athlete_id, [row])
+        return row['png']
+    
+    def precompute_heatmap(self, athlete_id, zooms=HEATMAP_PRECOMPUTE_ZOOMS, batch_size=200):
+        """
+        Rendre les tuiles de heatmap manquantes (nouvelles ou invalidées) des niveaux donnés,
+        uniquement là où l'athlète a des tracés ; tous les tracés sont décodés une seule fois
+        """
+        index_tiles = np.array(
+            db.session.query(ActivityRouteTile.tile_x, ActivityRouteTile.tile_y).distinct()
+            .filter(ActivityRouteTile.athlete_id == athlete_id).all(),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        if not len(index_tiles):
+            return 0
+        
+        wanted = set()
+        for zoom in zooms:
+            shift = ROUTE_INDEX_ZOOM - zoom
+            wanted.update((zoom, int(x), int(y)) for x, y in np.unique(index_tiles >> shift, axis=0))
+        existing = set(db.session.query(AthleteHeatmapTile.zoom, AthleteHeatmapTile.tile_x, AthleteHeatmapTile.tile_y)
+                       .filter(AthleteHeatmapTile.athlete_id == athlete_id)
+                       .filter(AthleteHeatmapTile.zoom.in_(list(zooms))).all())
+        missing = sorted(wanted - existing)
+        if not missing:
+            return 0
+        
+        route_ids = [activity_id for (activity_id,) in
+                     db.session.query(ActivityRoute.activity_id).filter(ActivityRoute.athlete_id == athlete_id)]
+        routes, bboxes = self.route_bboxes(self.load_routes(route_ids))
+        built = 0
+        for offset in range(0, len(missing), batch_size):
+            built += self.store_heatmap_tiles(
+                athlete_id, [self.render_tile(routes, bboxes, *tile) for tile in missing[offset:offset + batch_size]]
+            )
+        return built
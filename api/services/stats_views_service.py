@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+import time
+from flask import current_app
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db
+from models.stats_views import StatsViewChange, StatsViewRefresh
+
+# Verrou consultatif PostgreSQL : une seule conversion / un seul REFRESH à la fois
+STATS_VIEWS_LOCK_ID = 718002
+
+# Vues de statistiques matérialisées (database/init.sql) -> colonnes de leur index unique
+# (obligatoire pour REFRESH MATERIALIZED VIEW CONCURRENTLY) puis index de lecture par athlète
+MATERIALIZED_STATS_VIEWS = {
+    'activity_with_strava_metrics': [('id',), ('athlete_id', 'start_date_local')],
+    'activity_with_custom_metrics': [('id',), ('athlete_id', 'start_date_local')],
+    'athlete_personal_records': [('athlete_id',)],
+    'calendar_view': [('athlete_id', 'activity_date')],
+    'personal_records': [('athlete_id', 'type')],
+}
+
+
+def index_name(view_name, columns, unique):
+    return f"{'ux' if unique else 'ix'}_{view_name}_{'_'.join(columns)}"
+
+
+class StatsViewsService:
+    """
+    Vues de statistiques matérialisées : les lectures ne recalculent plus les jointures
+    activity_summary / métriques Strava / métriques personnalisées à chaque requête
+    Les écritures marquent les vues en retard (mark_stale : une ligne de journal dans leur
+    transaction, sans verrou partagé) ; les workers les rafraîchissent (REFRESH ... CONCURRENTLY, lectures non bloquées)
+    une fois les écritures calmées, ou au plus tard après un délai maximum
+    """
+    
+    def __init__(self):
+        self.quiet_period = timedelta(seconds=current_app.config['STATS_VIEWS_REFRESH_QUIET_SECONDS'])
+        self.max_delay = timedelta(seconds=current_app.config['STATS_VIEWS_REFRESH_MAX_DELAY_SECONDS'])
+    
+    @staticmethod
+    def view_kinds():
+        """{nom: 'm' (matérialisée) ou 'v' (vue simple)} des vues de statistiques présentes"""
+        rows = db.session.execute(
+            text("SELECT relname, relkind FROM pg_class "
+                 "WHERE relname = ANY(:names) AND relnamespace = 'public'::regnamespace"),
+            {'names': list(MATERIALIZED_STATS_VIEWS)}
+        ).fetchall()
+        return {relname: relkind for relname, relkind in rows}
+    
+    def ensure_materialized(self):
+        """
+        Convertir en vues matérialisées indexées les vues simples d'une base existante
+        (init.sql les crée directement matérialisées) et initialiser leur suivi
+        Retourne la liste des vues converties
+        """
+        converted = []
+        try:
+            # Verrou de transaction : plusieurs processus peuvent démarrer en même temps
+            db.session.execute(select(db.func.pg_advisory_xact_lock(STATS_VIEWS_LOCK_ID)))
+            kinds = self.view_kinds()
+            for view_name, indexes in MATERIALIZED_STATS_VIEWS.items():
+                if view_name not in kinds:
+                    continue
+                if kinds[view_name] == 'v':
+                    definition = db.session.execute(
+                        text("SELECT pg_get_viewdef(CAST(:name AS regclass), true)"), {'name': view_name}
+                    ).scalar()
+                    db.session.execute(text(f'DROP VIEW {view_name}'))
+                    db.session.execute(text(f'CREATE MATERIALIZED VIEW {view_name} AS {definition.rstrip().rstrip(";")}'))
+                    converted.append(view_name)
+                for position, columns in enumerate(indexes):
+                    unique = position == 0
+                    db.session.execute(text(
+                        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS "
+                        f"{index_name(view_name, columns, unique)} ON {view_name} ({', '.join(columns)})"
+                    ))
+                db.session.execute(
+                    pg_insert(StatsViewRefresh.__table__)
+                    .values(view_name=view_name, last_refreshed_at=datetime.utcnow())
+                    .on_conflict_do_nothing(index_elements=['view_name'])
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return converted
+    
+    @staticmethod
+    def mark_stale():
+        """
+        Signaler une écriture sur les tables sources des vues (sans commit : dans la
+        transaction de l'écriture). Simple INSERT dans le journal : les écritures
+        concurrentes ne se disputent aucune ligne
+        """
+        db.session.execute(insert(StatsViewChange.__table__).values(changed_at=datetime.utcnow()))
+    
+    @staticmethod
+    def pending_changes():
+        """(écritures en attente, première, dernière) d'après le journal"""
+        table = StatsViewChange.__table__
+        return db.session.execute(
+            select(db.func.count(), db.func.min(table.c.changed_at), db.func.max(table.c.changed_at))
+        ).one()
+    
+    def is_due(self, now=None):
+        """Écritures en attente calmées, ou en attente depuis trop longtemps"""
+        now = now or datetime.utcnow()
+        count, first_change, last_change = self.pending_changes()
+        return bool(count) and (last_change <= now - self.quiet_period or first_change <= now - self.max_delay)
+    
+    @staticmethod
+    def tracked_views():
+        return [row.view_name for row in StatsViewRefresh.query.order_by(StatsViewRefresh.view_name)]
+    
+    def refresh_due(self, force=False):
+        """
+        Rafraîchir les vues si elles sont dues (dès qu'elles sont en retard si force),
+        appelé par les workers
+        Retourne None si un autre processus rafraîchit déjà, sinon {vue: durée en ms}
+        """
+        due = self.pending_changes()[0] > 0 if force else self.is_due()
+        view_names = self.tracked_views() if due else []
+        db.session.rollback()
+        if not view_names:
+            return {}
+        
+        with db.engine.connect() as lock_conn:
+            if not lock_conn.execute(select(db.func.pg_try_advisory_lock(STATS_VIEWS_LOCK_ID))).scalar():
+                return None
+            try:
+                return self.refresh_views(view_names)
+            finally:
+                lock_conn.execute(select(db.func.pg_advisory_unlock(STATS_VIEWS_LOCK_ID)))
+    
+    def refresh_views(self, view_names):
+        """
+        REFRESH CONCURRENTLY des vues puis suppression des lignes de journal lues avant :
+        elles sont validées, donc visibles par le REFRESH ; une écriture encore en cours
+        n'est pas lue et garde les vues en retard
+        """
+        table = StatsViewChange.__table__
+        with db.engine.connect() as conn:
+            seen = conn.execute(select(table.c.id)).scalars().all()
+        
+        durations = {view_name: self.refresh_view(view_name) for view_name in view_names}
+        
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.id.in_(seen)))
+        return durations
+    
+    @staticmethod
+    def refresh_view(view_name):
+        """REFRESH CONCURRENTLY d'une vue puis mise à jour de son suivi, durée en ms"""
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            conn.execute(text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}'))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        table = StatsViewRefresh.__table__
+        with db.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.view_name == view_name).values(
+                last_refreshed_at=datetime.utcnow(),
+                last_refresh_ms=elapsed_ms,
+                refresh_count=table.c.refresh_count + 1
+            ))
+        return round(elapsed_ms, 1)
+    
+    def get_status(self):
+        """Fraîcheur des vues matérialisées (indicateur de retard commun à toutes les vues)"""
+        now = datetime.utcnow()
+        kinds = self.view_kinds()
+        count, first_change, last_change = self.pending_changes()
+        tracked = {row.view_name: row for row in StatsViewRefresh.query.all()}
+        views = []
+        for view_name in MATERIALIZED_STATS_VIEWS:
+            row = tracked.get(view_name)
+            views.append({
+                **(row.to_dict() if row else {'view': view_name}),
+                'materialized': kinds.get(view_name) == 'm'
+            })
+        return {
+            'stale': count > 0,
+            'pending_changes': count,
+            'stale_seconds': round((now - first_change).total_seconds(), 1) if count else 0,
+            'last_change_at': last_change.isoformat() if last_change else None,
+            'quiet_seconds': self.quiet_period.total_seconds(),
+            'max_delay_seconds': self.max_delay.total_seconds(),
+            'views': views
+        }
@@ -1,33 +1,78 @@
-import requests
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
 import time
+import requests
 from flask import current_app
 from models.database import db, Athlete, ActivitySummary
 from models.strava_metrics import ActivityStravaMetrics
+from models.climbs import ActivityClimb
+from models.custom_metrics import ActivityCustomMetrics
+from models.fetch_queue import ActivityFetchFailure, ActivityView
+from models.power_curve import ActivityPowerCurve
+from models.streams import ActivityStreams
+from models.zones import ActivityZoneTime
+from models.sync import AthleteSyncState
+from services.fetch_scheduler import FetchScheduler
+from services.http_client import get_strava_session
+from services.payload_archive import get_payload_archive
+from services.power_curve_service import PowerCurveService
+from services.rate_limiter import get_rate_limiter
+from services.rollup_service import ActivityRollupService
+from services.route_map_service import RouteMapService
+from services.stream_store import get_stream_store
+from services.training_load_service import TrainingLoadService
+from services.stats_views_service import StatsViewsService
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+# Noms des jours et mois en français
+DAY_NAMES = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+MONTH_NAMES = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
+               'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
+
+# Streams demandés à Strava (une requête par activité)
+STREAM_KEYS = ['time', 'distance', 'altitude', 'velocity_smooth', 'grade_smooth',
+               'watts', 'heartrate', 'cadence', 'temp', 'moving', 'latlng']
+
+# Champs d'un résumé Strava modifiables par l'athlète (empreinte sync_hash)
+MUTABLE_ACTIVITY_FIELDS = [
+    'name', 'type', 'sport_type', 'start_date', 'start_date_local', 'distance',
+    'moving_time', 'elapsed_time', 'total_elevation_gain', 'average_speed', 'max_speed',
+    'average_heartrate', 'max_heartrate', 'commute', 'trainer', 'gear_id', 'private'
+]
+
+# Colonnes activity_summary réécrites quand une activité a été modifiée sur Strava
+ACTIVITY_UPDATABLE_COLUMNS = [
+    'name', 'type', 'sport_type', 'start_date', 'start_date_local', 'distance_km',
+    'moving_time_seconds', 'elapsed_time_seconds', 'moving_time_hours', 'elapsed_time_hours',
+    'year', 'month', 'day', 'week', 'day_of_week', 'day_name', 'month_name',
+    'average_speed', 'max_speed', 'total_elevation_gain', 'average_heartrate',
+    'max_heartrate', 'calories', 'sync_hash'
+]
+
+class StravaTransientError(Exception):
+    """Erreur Strava temporaire (429, 5xx) : la requête peut être réessayée"""
+
 
 class StravaService:
     def __init__(self):
         self.client_id = current_app.config['STRAVA_CLIENT_ID']
         self.client_secret = current_app.config['STRAVA_CLIENT_SECRET']
         self.base_url = current_app.config['STRAVA_API_BASE_URL']
-        self.requests_count = 0
-        self.last_request_time = time.time()
+        self.detail_fetch_workers = current_app.config['STRAVA_DETAIL_FETCH_WORKERS']
+        # Budget de requêtes partagé entre threads, workers et processus (PostgreSQL)
+        self.rate_limiter = get_rate_limiter()
+        # Session keep-alive partagée (pool de connexions, timeouts, retries)
+        self.http = get_strava_session()
+        # Dernier code HTTP en échec par (type, strava_id) : file des récupérations (4xx abandonnés)
+        self.fetch_statuses = {}
+        self.archive = get_payload_archive()
     
     def rate_limit_wait(self):
-        """Respecter les limites de taux de Strava (100 req/15min)"""
-        current_time = time.time()
-        if current_time - self.last_request_time < 15 * 60:
-            if self.requests_count >= 95:
-                wait_time = 15 * 60 - (current_time - self.last_request_time)
-                print(f"Rate limit atteint, attente de {wait_time/60:.1f} minutes...")
-                time.sleep(wait_time)
-                self.requests_count = 0
-                self.last_request_time = time.time()
-        else:
-            self.requests_count = 0
-            self.last_request_time = current_time
-        
-        self.requests_count += 1
+        """Respecter les limites de taux de Strava (fenêtres 15 min et journalière partagées)"""
+        self.rate_limiter.acquire()
     
     def exchange_code_for_token(self, code):
         """Échanger le code d'autorisation contre des tokens"""
@@ -38,7 +83,7 @@ class StravaService:
             'grant_type': 'authorization_code'
         }
         
-        response = requests.post(current_app.config['STRAVA_TOKEN_URL'], data=data)
+        response = self.http.post(current_app.config['STRAVA_TOKEN_URL'], data=data)
         return response.json()
     
     def refresh_token(self, refresh_token):
@@ -50,14 +95,15 @@ class StravaService:
             'grant_type': 'refresh_token'
         }
         
-        response = requests.post(current_app.config['STRAVA_TOKEN_URL'], data=data)
+        response = self.http.post(current_app.config['STRAVA_TOKEN_URL'], data=data)
         return response.json()
     
     def get_authenticated_athlete(self, access_token):
         """Récupérer les informations de l'athlète authentifié"""
         self.rate_limit_wait()
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f'{self.base_url}/athlete', headers=headers)
+        response = self.http.get(f'{self.base_url}/athlete', headers=headers, rate_limiter=self.rate_limiter)
+        self.rate_limiter.update_from_headers(response.headers)
         return response.json()
     
     def get_athlete_activities(self, access_token, page=1, per_page=200, before=None, after=None):
@@ -69,14 +115,21 @@ class StravaService:
             'per_page': per_page
         }
         
-        if before:
-            params['before'] = int(before.timestamp())
-        if after:
-            params['after'] = int(after.timestamp())
+        # before / after : datetime ou epoch (int)
+        if before is not None:
+            params['before'] = before if isinstance(before, int) else int(before.timestamp())
+        if after is not None:
+            params['after'] = after if isinstance(after, int) else int(after.timestamp())
         
-        response = requests.get(f'{self.base_url}/athlete/activities', 
-                              headers=headers, params=params)
-        return response.json()
+        response = self.http.get(f'{self.base_url}/athlete/activities', 
+                              headers=headers, params=params, rate_limiter=self.rate_limiter)
+        self.rate_limiter.update_from_headers(response.headers)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise StravaTransientError(f"Strava a répondu {response.status_code}")
+        activities = response.json()
+        if response.status_code == 200:
+            self.archive_payloads('summary', activities)
+        return activities
     
     def get_detailed_activity(self, activity_id, access_token):
         """Récupérer une activité avec tous les détails pour les métriques avancées"""
@@ -84,14 +137,19 @@ class StravaService:
         headers = {'Authorization': f'Bearer {access_token}'}
         
         try:
-            response = requests.get(
+            response = self.http.get(
                 f'{self.base_url}/activities/{activity_id}',
-                headers=headers
+                headers=headers,
+                rate_limiter=self.rate_limiter
             )
+            self.rate_limiter.update_from_headers(response.headers)
             
             if response.status_code == 200:
-                return response.json()
+                detailed_activity = response.json()
+                self.archive_payloads('detail', [detailed_activity])
+                return detailed_activity
             else:
+                self.fetch_statuses[('detail', activity_id)] = response.status_code
                 print(f"Erreur récupération activité détaillée {activity_id}: {response.status_code}")
                 return None
                 
@@ -99,68 +157,391 @@ class StravaService:
             print(f"Erreur récupération activité détaillée {activity_id}: {str(e)}")
             return None
     
-    def sync_athlete_activities(self, athlete_id):
-        """Synchroniser toutes les activités d'un athlète avec métriques enrichies"""
+    def get_activity_streams(self, activity_id, access_token, keys=None):
+        """
+        Récupérer les streams seconde par seconde d'une activité (key_by_type)
+        Retourne (streams, taille JSON) ; ({}, 0) si l'activité n'a pas de streams
+        """
+        self.rate_limit_wait()
+        headers = {'Authorization': f'Bearer {access_token}'}
+        params = {
+            'keys': ','.join(keys or STREAM_KEYS),
+            'key_by_type': 'true'
+        }
+        
+        response = self.http.get(f'{self.base_url}/activities/{activity_id}/streams',
+                                 headers=headers, params=params, rate_limiter=self.rate_limiter)
+        self.rate_limiter.update_from_headers(response.headers)
+        
+        if response.status_code == 404:
+            return {}, 0
+        if response.status_code != 200:
+            self.fetch_statuses[('streams', activity_id)] = response.status_code
+        if response.status_code == 429 or response.status_code >= 500:
+            raise StravaTransientError(f"Strava a répondu {response.status_code}")
+        if response.status_code != 200:
+            print(f"Erreur récupération streams activité {activity_id}: {response.status_code}")
+            return None, 0
+        
+        return response.json(), len(response.content)
+    
+    def fetch_activities_streams(self, activity_ids, access_token):
+        """Streams de plusieurs activités en parallèle : strava_id -> (streams, taille JSON)"""
+        activity_ids = list(activity_ids)
+        if not activity_ids:
+            return {}
+        
+        def fetch(activity_id):
+            try:
+                return self.get_activity_streams(activity_id, access_token)
+            except Exception as e:
+                print(f"Erreur récupération streams activité {activity_id}: {str(e)}")
+                return None, 0
+        
+        workers = max(1, min(self.detail_fetch_workers, len(activity_ids)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='strava-streams') as executor:
+            return dict(zip(activity_ids, executor.map(fetch, activity_ids)))
+    
+    def archive_payloads(self, kind, payloads):
+        """Conserver les réponses brutes (re-dérivation hors ligne) ; un échec n'interrompt pas la sync"""
+        if not self.archive or not isinstance(payloads, list):
+            return
+        try:
+            self.archive.store_many(kind, payloads)
+        except Exception as e:
+            print(f"Erreur archivage des réponses Strava ({kind}): {str(e)}")
+    
+    def fetch_detailed_activities(self, activity_ids, access_token):
+        """
+        Récupérer plusieurs activités détaillées en parallèle (pool de threads borné)
+        Toutes les requêtes passent par rate_limit_wait et partagent le même budget
+        """
+        activity_ids = list(activity_ids)
+        if not activity_ids:
+            return {}
+        
+        workers = max(1, min(self.detail_fetch_workers, len(activity_ids)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='strava-detail') as executor:
+            details = executor.map(lambda activity_id: self.get_detailed_activity(activity_id, access_token), activity_ids)
+            return dict(zip(activity_ids, details))
+    
+    def ensure_valid_token(self, athlete):
+        """Actualiser le token d'accès de l'athlète s'il a expiré"""
+        if athlete.token_expires_at and athlete.token_expires_at < datetime.utcnow():
+            token_data = self.refresh_token(athlete.refresh_token)
+            athlete.access_token = token_data.get('access_token')
+            athlete.refresh_token = token_data.get('refresh_token')
+            athlete.token_expires_at = datetime.utcnow() + timedelta(seconds=token_data.get('expires_in', 21600))
+            db.session.commit()
+    
+    @staticmethod
+    def activity_start_epoch(strava_activity):
+        """Epoch UTC du début d'une activité Strava (curseur de synchronisation)"""
+        return int(datetime.fromisoformat(strava_activity['start_date'].replace('Z', '+00:00')).timestamp())
+    
+    def sync_athlete_activities(self, athlete_id, progress_callback=None, should_stop=None):
+        """
+        Synchroniser les nouvelles activités d'un athlète avec métriques enrichies
+        
+        Incrémental : seule la fenêtre postérieure au curseur persistant
+        (athlete_sync_state.last_after_epoch) est demandée à Strava.
+        Reprise sur incident : la page et le curseur sont enregistrés après chaque page
+        validée ; une synchronisation interrompue repart de la dernière page enregistrée.
+        progress_callback(stats) est appelé après chaque page traitée
+        should_stop() permet d'interrompre proprement entre deux pages (arrêt du worker)
+        """
         athlete = Athlete.query.get(athlete_id)
         if not athlete:
             return {'error': 'Athlete not found'}
         
         # Vérifier si le token est valide
-        if athlete.token_expires_at and athlete.token_expires_at < datetime.utcnow():
-            # Actualiser le token
-            try:
-                token_data = self.refresh_token(athlete.refresh_token)
-                athlete.access_token = token_data.get('access_token')
-                athlete.refresh_token = token_data.get('refresh_token')
-                athlete.token_expires_at = datetime.utcnow() + timedelta(seconds=token_data.get('expires_in', 21600))
-                db.session.commit()
-            except Exception as e:
-                return {'error': f'Failed to refresh token: {str(e)}'}
+        try:
+            self.ensure_valid_token(athlete)
+        except Exception as e:
+            return {'error': f'Failed to refresh token: {str(e)}'}
         
-        # Récupérer la dernière activité synchronisée
-        last_activity = ActivitySummary.query.filter_by(athlete_id=athlete_id)\
-                                           .order_by(ActivitySummary.start_date.desc())\
-                                           .first()
+        sync_state = AthleteSyncState.get_or_create(athlete_id)
+        run_started = datetime.utcnow()
+        sync_state.last_run_started_at = run_started
         
-        after_date = last_activity.start_date if last_activity else None
+        # Curseur : avec 'after', Strava renvoie les activités de la plus ancienne à la plus récente
+        if sync_state.resume_after_epoch is not None:
+            # Synchronisation précédente interrompue : reprise après la dernière page validée
+            after_epoch = sync_state.resume_after_epoch
+            page = (sync_state.last_page or 0) + 1
+            print(f"Reprise de la synchronisation athlète {athlete_id} à la page {page}")
+        else:
+            after_epoch = sync_state.last_after_epoch
+            if after_epoch is None:
+                after_epoch = self.initial_sync_cursor(athlete_id)
+            page = 1
+            sync_state.resume_after_epoch = after_epoch
+            sync_state.last_page = 0
+        newest_epoch = max(after_epoch, sync_state.last_after_epoch or 0)
+        db.session.commit()
         
-        # Récupérer les nouvelles activités
-        page = 1
         total_new_activities = 0
         total_enriched_activities = 0
+        pages_stats = []
         
         while True:
-            try:
-                activities = self.get_athlete_activities(
-                    athlete.access_token, 
-                    page=page, 
-                    after=after_date
-                )
-                
-                if not activities or 'errors' in activities:
-                    break
-                
-                for activity_data in activities:
-                    # Traitement de base
-                    if self.process_activity(activity_data, athlete_id):
-                        total_new_activities += 1
-                        
-                        # Enrichissement avec métriques Strava avancées
-                        if self.enrich_activity_with_strava_metrics(activity_data, athlete.access_token):
-                            total_enriched_activities += 1
-                
-                if len(activities) < 200:
-                    break
-                
-                page += 1
-                
-            except Exception as e:
-                print(f"Erreur lors de la synchronisation: {str(e)}")
+            if should_stop and should_stop():
+                return {
+                    'interrupted': True,
+                    'resume_page': page,
+                    'synchronized_activities': total_new_activities,
+                    'enriched_activities': total_enriched_activities,
+                    'pages': pages_stats
+                }
+            
+            activities = self.fetch_activities_page_with_retry(athlete.access_token, page, after_epoch)
+            if isinstance(activities, dict):
+                # Erreur définitive (token révoqué...) : le checkpoint est conservé pour la reprise
+                return {'error': f"Strava listing failed: {activities.get('message', activities)}"}
+            if not activities:
+                break
+            
+            # Insertion de la page complète en une seule requête
+            batch = self.process_activities_batch(activities, athlete_id)
+            total_new_activities += batch['inserted']
+            newest_epoch = max([newest_epoch] + [self.activity_start_epoch(a) for a in activities])
+            pages_stats.append({
+                'page': page,
+                'fetched': len(activities),
+                'inserted': batch['inserted'],
+                'skipped': batch['skipped']
+            })
+            
+            # Enrichissement avec métriques Strava avancées : activités de la page encore sans
+            # métriques (inclut celles insérées avant un arrêt brutal, page rejouée)
+            missing_metrics = self.activities_missing_strava_metrics([a['id'] for a in activities])
+            to_enrich = [a for a in activities if a['id'] in missing_metrics]
+            total_enriched_activities += self.enrich_activities_batch(
+                to_enrich, missing_metrics, athlete.access_token
+            )
+            
+            # Checkpoint de la page validée
+            sync_state.last_page = page
+            sync_state.last_after_epoch = newest_epoch
+            db.session.commit()
+            
+            if progress_callback:
+                progress_callback({
+                    'pages_fetched': page,
+                    'activities_inserted': total_new_activities,
+                    'activities_enriched': total_enriched_activities
+                })
+            
+            if len(activities) < 200:
                 break
+            
+            page += 1
+        
+        # Synchronisation terminée : plus de reprise en attente
+        sync_state.resume_after_epoch = None
+        sync_state.last_after_epoch = newest_epoch
+        sync_state.last_run_duration_seconds = round((datetime.utcnow() - run_started).total_seconds(), 2)
+        sync_state.last_success_at = datetime.utcnow()
+        db.session.commit()
         
         return {
             'synchronized_activities': total_new_activities,
-            'enriched_activities': total_enriched_activities
+            'enriched_activities': total_enriched_activities,
+            'pages': pages_stats,
+            'sync_state': sync_state.to_dict()
+        }
+    
+    def fetch_activities_page_with_retry(self, access_token, page, after_epoch):
+        """
+        Récupérer une page d'activités en réessayant les erreurs transitoires
+        (réseau, 429 / 5xx persistants après les retries HTTP) avec backoff exponentiel
+        """
+        max_retries = current_app.config['SYNC_PAGE_MAX_RETRIES']
+        base_delay = current_app.config['SYNC_PAGE_RETRY_BASE_SECONDS']
+        
+        for attempt in range(max_retries + 1):
+            try:
+                return self.get_athlete_activities(access_token, page=page, after=after_epoch)
+            except (StravaTransientError, requests.RequestException) as e:
+                if attempt == max_retries:
+                    raise
+                delay = min(base_delay * 2 ** attempt, 300)
+                print(f"Erreur transitoire page {page} (essai {attempt + 1}/{max_retries}): {str(e)} "
+                      f"- nouvel essai dans {delay}s")
+                time.sleep(delay)
+    
+    def activities_missing_strava_metrics(self, strava_ids):
+        """strava_id -> activity_summary.id des activités sans métriques Strava"""
+        if not strava_ids:
+            return {}
+        rows = db.session.query(ActivitySummary.strava_id, ActivitySummary.id)\
+            .outerjoin(ActivityStravaMetrics, ActivitySummary.id == ActivityStravaMetrics.activity_id)\
+            .filter(ActivitySummary.strava_id.in_(strava_ids))\
+            .filter(ActivityStravaMetrics.id.is_(None))\
+            .all()
+        return dict(rows)
+    
+    def initial_sync_cursor(self, athlete_id):
+        """Curseur de départ : dernière activité déjà en base (athlètes antérieurs à l'état de sync) ou 0"""
+        last_activity = ActivitySummary.query.filter_by(athlete_id=athlete_id)\
+                                           .order_by(ActivitySummary.start_date.desc())\
+                                           .first()
+        if not last_activity:
+            return 0
+        return int(last_activity.start_date.replace(tzinfo=timezone.utc).timestamp())
+    
+    def reconcile_athlete_activities(self, athlete_id, days=None):
+        """
+        Passe de réconciliation peu coûteuse sur les `days` derniers jours :
+        met à jour les activités modifiées sur Strava (empreinte sync_hash différente)
+        et supprime celles qui n'existent plus, sans relire tout l'historique
+        """
+        athlete = Athlete.query.get(athlete_id)
+        if not athlete:
+            return {'error': 'Athlete not found'}
+        
+        try:
+            self.ensure_valid_token(athlete)
+        except Exception as e:
+            return {'error': f'Failed to refresh token: {str(e)}'}
+        
+        days = days or current_app.config['SYNC_RECONCILE_DAYS']
+        window_start = datetime.utcnow() - timedelta(days=days)
+        window_epoch = int(window_start.replace(tzinfo=timezone.utc).timestamp())
+        
+        # Liste complète des résumés Strava de la fenêtre (1 requête / 200 activités)
+        remote = {}
+        page = 1
+        while True:
+            activities = self.get_athlete_activities(athlete.access_token, page=page, after=window_epoch)
+            if not isinstance(activities, list):
+                return {'error': f'Strava listing failed: {activities}'}
+            for strava_activity in activities:
+                remote[strava_activity['id']] = strava_activity
+            if len(activities) < 200:
+                break
+            page += 1
+        
+        local = dict(
+            db.session.query(ActivitySummary.strava_id, ActivitySummary.sync_hash)
+            .filter(ActivitySummary.athlete_id == athlete_id)
+            .filter(ActivitySummary.start_date >= window_start)
+            .all()
+        )
+        
+        # Nouvelles ou modifiées : upsert uniquement si l'empreinte a changé
+        changed = [a for strava_id, a in remote.items()
+                   if local.get(strava_id) != self.activity_fingerprint(a)]
+        batch = self.process_activities_batch(changed, athlete_id, update_existing=True) if changed else \
+            {'inserted': 0, 'updated': 0, 'inserted_ids': {}}
+        
+        # Supprimées sur Strava
+        deleted_strava_ids = [strava_id for strava_id in local if strava_id not in remote]
+        deleted = self.delete_activities_by_strava_ids(deleted_strava_ids)
+        
+        sync_state = AthleteSyncState.get_or_create(athlete_id)
+        sync_state.last_reconcile_at = datetime.utcnow()
+        db.session.commit()
+        
+        return {
+            'window_days': days,
+            'remote_activities': len(remote),
+            'inserted': batch['inserted'],
+            'updated': batch['updated'],
+            'deleted': deleted,
+            'unchanged': len(remote) - len(changed)
+        }
+    
+    def delete_activities_by_strava_ids(self, strava_ids):
+        """Supprimer des activités et toutes leurs métriques dérivées"""
+        if not strava_ids:
+            return 0
+        
+        owners = dict(db.session.query(ActivitySummary.id, ActivitySummary.athlete_id)
+                      .filter(ActivitySummary.strava_id.in_(strava_ids)).all())
+        activity_ids = list(owners)
+        if not activity_ids:
+            return 0
+        rollup_service = ActivityRollupService()
+        rollup_days = rollup_service.activity_days(activity_ids)
+        
+        try:
+            ActivityStravaMetrics.query.filter(ActivityStravaMetrics.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            ActivityCustomMetrics.query.filter(ActivityCustomMetrics.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            ActivityStreams.query.filter(ActivityStreams.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            ActivityPowerCurve.query.filter(ActivityPowerCurve.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            PowerCurveService().rebuild_envelopes_for_activities(activity_ids)
+            ActivityZoneTime.query.filter(ActivityZoneTime.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            ActivityClimb.query.filter(ActivityClimb.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            ActivityView.query.filter(ActivityView.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            ActivityFetchFailure.query.filter(ActivityFetchFailure.activity_id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            RouteMapService().remove_routes(activity_ids)
+            TrainingLoadService.mark_activities_dirty(activity_ids)
+            deleted = ActivitySummary.query.filter(ActivitySummary.id.in_(activity_ids))\
+                .delete(synchronize_session=False)
+            rollup_service.refresh_days(rollup_days)
+            StatsViewsService.mark_stale()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        store = get_stream_store()
+        if store is not None:
+            for athlete_id in set(owners.values()):
+                store.delete(athlete_id, [activity_id for activity_id, owner in owners.items() if owner == athlete_id])
+        
+        return deleted
+    
+    @staticmethod
+    def activity_fingerprint(strava_activity):
+        """Empreinte des champs modifiables d'une activité (détection des éditions sur Strava)"""
+        values = [strava_activity.get(field) for field in MUTABLE_ACTIVITY_FIELDS]
+        return hashlib.md5(json.dumps(values, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    def build_activity_row(self, strava_activity, athlete_id):
+        """Construire les colonnes activity_summary à partir d'un résumé Strava"""
+        # Calculer les métriques
+        start_date_local = datetime.fromisoformat(strava_activity['start_date_local'].replace('Z', '+00:00'))
+        moving_time_hours = strava_activity.get('moving_time', 0) / 3600
+        elapsed_time_hours = strava_activity.get('elapsed_time', 0) / 3600
+        
+        return {
+            'strava_id': strava_activity['id'],
+            'athlete_id': athlete_id,
+            'name': strava_activity.get('name', ''),
+            'type': strava_activity.get('type', ''),
+            'sport_type': strava_activity.get('sport_type', ''),
+            'start_date': datetime.fromisoformat(strava_activity['start_date'].replace('Z', '+00:00')),
+            'start_date_local': start_date_local,
+            'distance_km': strava_activity.get('distance', 0) / 1000,
+            'moving_time_seconds': strava_activity.get('moving_time', 0),
+            'elapsed_time_seconds': strava_activity.get('elapsed_time', 0),
+            'moving_time_hours': round(moving_time_hours, 2),
+            'elapsed_time_hours': round(elapsed_time_hours, 2),
+            # Données temporelles détaillées
+            'year': start_date_local.year,
+            'month': start_date_local.month,
+            'day': start_date_local.day,
+            'week': start_date_local.isocalendar()[1],
+            'day_of_week': start_date_local.weekday(),
+            'day_name': DAY_NAMES[start_date_local.weekday()],
+            'month_name': MONTH_NAMES[start_date_local.month - 1],
+            'average_speed': strava_activity.get('average_speed'),
+            'max_speed': strava_activity.get('max_speed'),
+            'total_elevation_gain': strava_activity.get('total_elevation_gain'),
+            'average_heartrate': strava_activity.get('average_heartrate'),
+            'max_heartrate': strava_activity.get('max_heartrate'),
+            'calories': strava_activity.get('calories'),
+            'sync_hash': self.activity_fingerprint(strava_activity)
         }
     
     def process_activity(self, strava_activity, athlete_id):
@@ -171,47 +552,15 @@ class StravaService:
             if existing:
                 return False
             
-            # Calculer les métriques
-            start_date_local = datetime.fromisoformat(strava_activity['start_date_local'].replace('Z', '+00:00'))
-            moving_time_hours = strava_activity.get('moving_time', 0) / 3600
-            elapsed_time_hours = strava_activity.get('elapsed_time', 0) / 3600
-            
-            # Noms des jours et mois en français
-            day_names = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-            month_names = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
-                          'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
-            
-            activity = ActivitySummary(
-                strava_id=strava_activity['id'],
-                athlete_id=athlete_id,
-                name=strava_activity.get('name', ''),
-                type=strava_activity.get('type', ''),
-                sport_type=strava_activity.get('sport_type', ''),
-                start_date=datetime.fromisoformat(strava_activity['start_date'].replace('Z', '+00:00')),
-                start_date_local=start_date_local,
-                distance_km=strava_activity.get('distance', 0) / 1000,
-                moving_time_seconds=strava_activity.get('moving_time', 0),
-                elapsed_time_seconds=strava_activity.get('elapsed_time', 0),
-                moving_time_hours=round(moving_time_hours, 2),
-                elapsed_time_hours=round(elapsed_time_hours, 2),
-                # Données temporelles détaillées
-                year=start_date_local.year,
-                month=start_date_local.month,
-                day=start_date_local.day,
-                week=start_date_local.isocalendar()[1],
-                day_of_week=start_date_local.weekday(),
-                day_name=day_names[start_date_local.weekday()],
-                month_name=month_names[start_date_local.month - 1],
-                average_speed=strava_activity.get('average_speed'),
-                max_speed=strava_activity.get('max_speed'),
-                total_elevation_gain=strava_activity.get('total_elevation_gain'),
-                average_heartrate=strava_activity.get('average_heartrate'),
-                max_heartrate=strava_activity.get('max_heartrate'),
-                calories=strava_activity.get('calories')
-            )
+            activity = ActivitySummary(**self.build_activity_row(strava_activity, athlete_id))
             
             db.session.add(activity)
+            db.session.flush()
+            TrainingLoadService.mark_dirty(athlete_id, activity.start_date_local.date())
+            ActivityRollupService().refresh_days({(athlete_id, activity.start_date_local.date())})
+            StatsViewsService.mark_stale()
             db.session.commit()
+            self.store_activity_routes({strava_activity['id']: activity.id}, {strava_activity['id']: strava_activity})
             return True
             
         except Exception as e:
@@ -219,6 +568,90 @@ class StravaService:
             db.session.rollback()
             return False
     
+    def store_activity_routes(self, activity_ids, strava_activities):
+        """Enregistrer les tracés (map.summary_polyline) ; un échec n'interrompt pas la sync"""
+        try:
+            RouteMapService().store_routes_from_payloads(activity_ids, strava_activities)
+        except Exception as e:
+            print(f"Erreur enregistrement des tracés: {str(e)}")
+    
+    def process_activities_batch(self, strava_activities, athlete_id, update_existing=False, force_update=False):
+        """
+        Enregistrer une page complète d'activités en une seule requête
+        INSERT ... ON CONFLICT (strava_id) RETURNING id
+        
+        update_existing : mettre à jour les activités existantes dont l'empreinte
+        sync_hash a changé (DO UPDATE ... WHERE), sinon DO NOTHING
+        force_update : réécrire même à empreinte identique (re-dérivation des colonnes calculées)
+        """
+        rows = {}
+        for strava_activity in strava_activities:
+            try:
+                rows[strava_activity['id']] = self.build_activity_row(strava_activity, athlete_id)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Activité {strava_activity.get('id', 'N/A')} ignorée (données invalides): {str(e)}")
+        
+        if not rows:
+            return {'inserted': 0, 'updated': 0, 'skipped': len(strava_activities),
+                    'inserted_ids': {}, 'updated_ids': {}}
+        
+        table = ActivitySummary.__table__
+        # Jours des lignes existantes avant mise à jour (une date modifiée libère l'ancien jour)
+        previous_days = {}
+        if update_existing:
+            previous_days = {
+                strava_id: (row_athlete_id, day) for strava_id, row_athlete_id, day in
+                db.session.query(ActivitySummary.strava_id, ActivitySummary.athlete_id,
+                                 db.func.date(ActivitySummary.start_date_local))
+                .filter(ActivitySummary.strava_id.in_(list(rows.keys())))
+            }
+        
+        stmt = pg_insert(table).values(list(rows.values()))
+        if update_existing:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['strava_id'],
+                set_={column: stmt.excluded[column] for column in ACTIVITY_UPDATABLE_COLUMNS},
+                where=None if force_update else table.c.sync_hash.is_distinct_from(stmt.excluded.sync_hash)
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=['strava_id'])
+        # xmax = 0 : ligne nouvellement insérée (sinon mise à jour)
+        stmt = stmt.returning(table.c.id, table.c.strava_id, table.c.athlete_id, table.c.start_date_local,
+                              literal_column('(xmax = 0)').label('inserted'))
+        
+        try:
+            result = db.session.execute(stmt).fetchall()
+            if result:
+                # Ancien et nouveau jour des lignes écrites : une activité déplacée retire son TSS
+                # de l'ancien jour, la série CTL / ATL est à recalculer depuis le plus ancien
+                touched_days = {previous_days[row.strava_id] for row in result if row.strava_id in previous_days}
+                touched_days |= {(row.athlete_id, row.start_date_local.date()) for row in result}
+                first_days = {}
+                for row_athlete_id, day in touched_days:
+                    first_days[row_athlete_id] = min(day, first_days.get(row_athlete_id, day))
+                for row_athlete_id, day in first_days.items():
+                    TrainingLoadService.mark_dirty(row_athlete_id, day)
+                ActivityRollupService().refresh_days(touched_days)
+                StatsViewsService.mark_stale()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        inserted_ids = {row.strava_id: row.id for row in result if row.inserted}
+        updated_ids = {row.strava_id: row.id for row in result if not row.inserted}
+        self.store_activity_routes({**inserted_ids, **updated_ids},
+                                   {strava_activity['id']: strava_activity for strava_activity in strava_activities})
+        
+        return {
+            'inserted': len(inserted_ids),
+            'updated': len(updated_ids),
+            'skipped': len(strava_activities) - len(result),
+            # strava_id -> activity_summary.id des nouvelles lignes
+            'inserted_ids': inserted_ids,
+            'updated_ids': updated_ids
+        }
+    
     def enrich_activity_with_strava_metrics(self, strava_activity, access_token):
         """Enrichir une activité avec les métriques Strava avancées"""
         try:
@@ -244,47 +677,16 @@ class StravaService:
             detailed_activity = strava_activity
             
             # Si l'activité summary ne contient pas assez de détails, récupérer la version complète
-            if not strava_activity.get('device_watts') and not strava_activity.get('suffer_score'):
+            if self.needs_detailed_activity(strava_activity):
                 detailed_activity = self.get_detailed_activity(strava_activity['id'], access_token)
                 if not detailed_activity:
                     detailed_activity = strava_activity
             
             # Créer les métriques Strava
-            strava_metrics = ActivityStravaMetrics(
-                activity_id=activity_db.id,
-                
-                # 💪 Données de puissance natives Strava
-                average_watts=detailed_activity.get('average_watts'),
-                weighted_average_watts=detailed_activity.get('weighted_average_watts'),
-                max_watts=detailed_activity.get('max_watts'),
-                device_watts=detailed_activity.get('device_watts', False),
-                
-                # ❤️ Données FC natives Strava
-                average_heartrate=detailed_activity.get('average_heartrate'),
-                max_heartrate=detailed_activity.get('max_heartrate'),
-                has_heartrate=detailed_activity.get('has_heartrate', False),
-                
-                # 🎯 Métriques d'effort Strava
-                suffer_score=detailed_activity.get('suffer_score'),
-                perceived_exertion=detailed_activity.get('perceived_exertion'),
-                
-                # 🚴‍♂️ Données vélo spécifiques
-                average_cadence=detailed_activity.get('average_cadence'),
-                average_temp=detailed_activity.get('average_temp'),
-                trainer=detailed_activity.get('trainer', False),
-                commute=detailed_activity.get('commute', False),
-                
-                # 🏃‍♂️ Données course/vitesse
-                average_speed_ms=detailed_activity.get('average_speed'),
-                max_speed_ms=detailed_activity.get('max_speed'),
-                
-                # 📍 Métadonnées
-                gear_id=detailed_activity.get('gear_id'),
-                external_id=detailed_activity.get('external_id'),
-                upload_id=detailed_activity.get('upload_id')
-            )
+            strava_metrics = ActivityStravaMetrics(**self.build_strava_metrics_row(activity_db.id, detailed_activity))
             
             db.session.add(strava_metrics)
+            StatsViewsService.mark_stale()
             db.session.commit()
             
             print(f"Métriques Strava ajoutées pour activité {activity_db.id} - "
@@ -298,18 +700,133 @@ class StravaService:
             db.session.rollback()
             return False
     
-    def sync_single_activity_enhanced(self, activity_id, athlete_id):
-        """Synchroniser une activité spécifique avec enrichissement complet"""
+    def needs_detailed_activity(self, strava_activity):
+        """Le résumé ne contient pas assez de détails : il faut la version complète"""
+        return not strava_activity.get('device_watts') and not strava_activity.get('suffer_score')
+    
+    def build_strava_metrics_row(self, activity_id, detailed_activity):
+        """Construire les colonnes activity_strava_metrics à partir d'une activité Strava"""
+        return {
+            'activity_id': activity_id,
+            
+            # 💪 Données de puissance natives Strava
+            'average_watts': detailed_activity.get('average_watts'),
+            'weighted_average_watts': detailed_activity.get('weighted_average_watts'),
+            'max_watts': detailed_activity.get('max_watts'),
+            'device_watts': detailed_activity.get('device_watts', False),
+            
+            # ❤️ Données FC natives Strava
+            'average_heartrate': detailed_activity.get('average_heartrate'),
+            'max_heartrate': detailed_activity.get('max_heartrate'),
+            'has_heartrate': detailed_activity.get('has_heartrate', False),
+            
+            # 🎯 Métriques d'effort Strava
+            'suffer_score': detailed_activity.get('suffer_score'),
+            'perceived_exertion': detailed_activity.get('perceived_exertion'),
+            
+            # 🚴‍♂️ Données vélo spécifiques
+            'average_cadence': detailed_activity.get('average_cadence'),
+            'average_temp': detailed_activity.get('average_temp'),
+            'trainer': detailed_activity.get('trainer', False),
+            'commute': detailed_activity.get('commute', False),
+            
+            # 🏃‍♂️ Données course/vitesse
+            'average_speed_ms': detailed_activity.get('average_speed'),
+            'max_speed_ms': detailed_activity.get('max_speed'),
+            
+            # 📍 Métadonnées
+            'gear_id': detailed_activity.get('gear_id'),
+            'external_id': detailed_activity.get('external_id'),
+            'upload_id': detailed_activity.get('upload_id')
+        }
+    
+    def enrich_activities_batch(self, strava_activities, activity_ids, access_token, details=None):
+        """
+        Enrichir un lot d'activités : détails récupérés en parallèle puis
+        métriques insérées par lots (INSERT ... ON CONFLICT (activity_id) DO NOTHING)
+        
+        activity_ids : dictionnaire strava_id -> activity_summary.id
+        details : activités détaillées déjà récupérées (strava_id -> payload)
+        """
+        details = dict(details or {})
+        to_fetch = [a['id'] for a in strava_activities
+                    if a['id'] not in details and self.needs_detailed_activity(a)]
+        details.update(self.fetch_detailed_activities(to_fetch, access_token))
+        
+        rows = []
+        for strava_activity in strava_activities:
+            activity_id = activity_ids.get(strava_activity['id'])
+            if not activity_id:
+                continue
+            detailed_activity = details.get(strava_activity['id']) or strava_activity
+            rows.append(self.build_strava_metrics_row(activity_id, detailed_activity))
+        
+        return self.insert_strava_metrics_rows(rows)
+    
+    def insert_strava_metrics_rows(self, rows, batch_size=200, update_existing=False):
+        """
+        Insérer des lignes activity_strava_metrics par lots, une requête par lot
+        update_existing : remplacer les métriques déjà présentes (ON CONFLICT DO UPDATE)
+        """
+        table = ActivityStravaMetrics.__table__
+        inserted = 0
+        
+        for offset in range(0, len(rows), batch_size):
+            stmt = pg_insert(table).values(rows[offset:offset + batch_size])
+            if update_existing:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['activity_id'],
+                    set_={column: stmt.excluded[column] for column in rows[0] if column != 'activity_id'}
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=['activity_id'])
+            stmt = stmt.returning(table.c.activity_id)
+            try:
+                stored = len(db.session.execute(stmt).fetchall())
+                if stored:
+                    StatsViewsService.mark_stale()
+                db.session.commit()
+                inserted += stored
+            except Exception as e:
+                print(f"Erreur insertion lot de métriques Strava: {str(e)}")
+                db.session.rollback()
+        
+        return inserted
+    
+    def sync_single_activity_enhanced(self, activity_id, athlete_id, update_existing=False):
+        """
+        Synchroniser une activité spécifique avec enrichissement complet
+        update_existing : réécrire l'activité et ses métriques si elle existe déjà (édition sur Strava)
+        """
         athlete = Athlete.query.get(athlete_id)
         if not athlete:
             return {'error': 'Athlete not found'}
         
         try:
+            self.ensure_valid_token(athlete)
+            
             # Récupérer l'activité détaillée depuis Strava
             detailed_activity = self.get_detailed_activity(activity_id, athlete.access_token)
             if not detailed_activity:
                 return {'error': 'Activity not found on Strava'}
             
+            if update_existing:
+                batch = self.process_activities_batch([detailed_activity], athlete_id, update_existing=True)
+                activity_db = ActivitySummary.query.filter_by(strava_id=detailed_activity['id']).first()
+                base_success = activity_db is not None
+                metrics_success = base_success and self.insert_strava_metrics_rows(
+                    [self.build_strava_metrics_row(activity_db.id, detailed_activity)],
+                    update_existing=True
+                ) > 0
+                
+                return {
+                    'activity_id': activity_id,
+                    'base_sync': base_success,
+                    'base_changed': batch['inserted'] + batch['updated'] > 0,
+                    'metrics_sync': metrics_success,
+                    'status': 'success' if (base_success and metrics_success) else 'partial'
+                }
+            
             # Traitement de base
             base_success = self.process_activity(detailed_activity, athlete_id)
             
@@ -334,30 +851,19 @@ class StravaService:
         if not athlete:
             return {'error': 'Athlete not found'}
         
-        # Récupérer les activités sans métriques Strava
-        activities_without_metrics = db.session.query(ActivitySummary)\
-            .outerjoin(ActivityStravaMetrics, ActivitySummary.id == ActivityStravaMetrics.activity_id)\
-            .filter(ActivitySummary.athlete_id == athlete_id)\
-            .filter(ActivityStravaMetrics.id.is_(None))\
-            .order_by(ActivitySummary.start_date.desc())\
-            .limit(limit).all()
+        # Activités sans métriques Strava, les plus utiles d'abord (récentes, vélo, consultées)
+        activities_without_metrics = FetchScheduler().ranked_items(athlete_id, kinds=('detail',), limit=limit)
         
-        updated_count = 0
+        # Détails récupérés en parallèle dans le budget de requêtes partagé
+        strava_ids = {item.strava_id: item.activity_id for item in activities_without_metrics}
+        details = self.fetch_detailed_activities(strava_ids.keys(), athlete.access_token)
         
-        for activity in activities_without_metrics:
-            try:
-                # Récupérer les détails depuis Strava
-                detailed_activity = self.get_detailed_activity(activity.strava_id, athlete.access_token)
-                if detailed_activity:
-                    if self.enrich_activity_with_strava_metrics(detailed_activity, athlete.access_token):
-                        updated_count += 1
-                        
-                # Respecter le rate limiting
-                time.sleep(0.2)  # 200ms entre les requêtes
-                
-            except Exception as e:
-                print(f"Erreur mise à jour activité {activity.id}: {str(e)}")
-                continue
+        rows = [
+            self.build_strava_metrics_row(strava_ids[strava_id], detailed_activity)
+            for strava_id, detailed_activity in details.items()
+            if detailed_activity
+        ]
+        updated_count = self.insert_strava_metrics_rows(rows)
         
         return {
             'activities_updated': updated_count,
@@ -0,0 +1,257 @@
+"""
+Analyses vectorisées des streams d'activité (NumPy, sans boucle Python par échantillon)
+"""
+import numpy as np
+
+# Échelle de durées de la courbe de puissance (1 s -> 5 h)
+POWER_CURVE_DURATIONS = [
+    1, 2, 3, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 300, 360, 480, 600, 720, 900,
+    1200, 1800, 2400, 3600, 5400, 7200, 10800, 14400, 18000
+]
+
+# Trou d'enregistrement (smart recording) comblé par la dernière valeur ; au-delà : pause = 0 W
+MAX_FILL_GAP_SECONDS = 5
+
+
+def resample_1hz(time_s, values, max_gap=MAX_FILL_GAP_SECONDS):
+    """
+    Ré-échantillonner un stream sur une grille d'une seconde
+    Les trous courts reprennent la dernière valeur, les pauses plus longues valent 0
+    Retourne (grille, masque des secondes enregistrées hors pauses)
+    """
+    time_s = np.asarray(time_s, dtype=np.int64)
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    if time_s.size == 0:
+        return np.zeros(0), np.zeros(0, dtype=bool)
+    
+    time_s = time_s - time_s[0]
+    grid = np.zeros(time_s[-1] + 1)
+    grid[time_s] = values
+    
+    # Index du dernier échantillon réel pour chaque seconde
+    present = np.zeros(grid.size, dtype=bool)
+    present[time_s] = True
+    last_sample = np.maximum.accumulate(np.where(present, np.arange(grid.size), 0))
+    fill = ~present & (np.arange(grid.size) - last_sample <= max_gap)
+    grid[fill] = grid[last_sample[fill]]
+    return grid, present | fill
+
+
+def to_1hz(time_s, values, max_gap=MAX_FILL_GAP_SECONDS):
+    """Grille d'une seconde, pauses à 0 (durées réelles pour la courbe de puissance)"""
+    return resample_1hz(time_s, values, max_gap)[0]
+
+
+def moving_1hz(time_s, values, max_gap=MAX_FILL_GAP_SECONDS):
+    """Grille d'une seconde sans les pauses (les zéros de roue libre sont conservés)"""
+    grid, recorded = resample_1hz(time_s, values, max_gap)
+    return grid[recorded]
+
+
+def mean_maximal_power(watts_1hz, durations=POWER_CURVE_DURATIONS):
+    """
+    Puissance moyenne maximale pour chaque durée (fenêtres glissantes par somme cumulée)
+    Retourne {durée: watts} pour les durées couvertes par l'activité
+    """
+    watts = np.nan_to_num(np.asarray(watts_1hz, dtype=np.float64))
+    cumulative = np.concatenate(([0.0], np.cumsum(watts)))
+    
+    curve = {}
+    for duration in durations:
+        if duration > watts.size:
+            break
+        window_sums = cumulative[duration:] - cumulative[:-duration]
+        curve[duration] = int(round(window_sums.max() / duration))
+    return curve
+
+
+# Moyenne glissante de la Normalized Power (secondes)
+NP_ROLLING_SECONDS = 30
+
+
+def normalized_power(watts_1hz, window=NP_ROLLING_SECONDS):
+    """
+    Normalized Power : moyenne glissante 30 s, puissance 4, moyenne, racine 4
+    Attend une grille d'une seconde sans pauses (moving_1hz) ; None si trop court
+    """
+    watts = np.asarray(watts_1hz, dtype=np.float64)
+    if watts.size < window:
+        return None
+    
+    cumulative = np.concatenate(([0.0], np.cumsum(watts)))
+    rolling = (cumulative[window:] - cumulative[:-window]) / window
+    return float(np.mean(rolling ** 4) ** 0.25)
+
+
+def time_in_zones(values_1hz, boundaries):
+    """
+    Secondes passées dans chaque zone : searchsorted place chaque échantillon
+    entre les bornes hautes, bincount compte (len(boundaries) + 1 zones)
+    """
+    zones = np.searchsorted(np.asarray(boundaries, dtype=np.float64),
+                            np.asarray(values_1hz, dtype=np.float64), side='right')
+    return np.bincount(zones, minlength=len(boundaries) + 1).tolist()
+
+
+# Distances des meilleurs efforts (mètres)
+BEST_EFFORT_DISTANCES = {
+    '400m': 400.0,
+    '1km': 1000.0,
+    '1mile': 1609.344,
+    '5km': 5000.0,
+    '10km': 10000.0,
+    'half_marathon': 21097.5,
+    'marathon': 42195.0
+}
+
+
+def best_efforts(time_s, distance_m, distances=BEST_EFFORT_DISTANCES):
+    """
+    Temps le plus rapide sur chaque distance, n'importe où dans l'activité
+    Fenêtre glissante à deux pointeurs vectorisée : pour chaque échantillon de départ,
+    searchsorted trouve le premier échantillon qui couvre la distance (fin monotone),
+    l'arrivée exacte étant interpolée entre les deux derniers échantillons
+    Retourne {nom: secondes} pour les distances couvertes par l'activité
+    """
+    time_s = np.asarray(time_s, dtype=np.float64)
+    # Distance cumulée monotone (corrections GPS négatives ignorées)
+    distance_m = np.maximum.accumulate(np.asarray(distance_m, dtype=np.float64))
+    if distance_m.size < 2:
+        return {}
+    
+    efforts = {}
+    for name, target in distances.items():
+        if distance_m[-1] - distance_m[0] < target:
+            continue
+        
+        # Départs qui peuvent encore couvrir la distance avant la fin
+        starts = np.arange(np.searchsorted(distance_m, distance_m[-1] - target, side='right'))
+        ends = np.searchsorted(distance_m, distance_m[starts] + target, side='left')
+        
+        # Interpolation linéaire du passage à la distance cible
+        covered = distance_m[ends] - distance_m[ends - 1]
+        fraction = np.divide(
+            distance_m[starts] + target - distance_m[ends - 1], covered,
+            out=np.ones_like(covered), where=covered > 0
+        )
+        arrival = time_s[ends - 1] + fraction * (time_s[ends] - time_s[ends - 1])
+        efforts[name] = int(round((arrival - time_s[starts]).min()))
+    return efforts
+
+
+# Détection des montées : grille en distance, lissage de l'altitude, segmentation par pente
+CLIMB_GRID_METERS = 10              # pas de ré-échantillonnage en distance
+CLIMB_SMOOTHING_METERS = 100        # moyenne glissante de l'altitude (bruit GPS / baro)
+CLIMB_MIN_GRADE = 2.0               # % : un tronçon au-dessus de cette pente est en montée
+CLIMB_MAX_GAP_METERS = 300          # replat / descente toléré à l'intérieur d'une montée
+CLIMB_MAX_GAP_DROP = 10.0           # m : perte d'altitude maximale dans ce replat
+CLIMB_MIN_LENGTH_METERS = 500
+CLIMB_MIN_GAIN = 25.0               # m
+CLIMB_MIN_AVERAGE_GRADE = 3.0       # %
+
+# Catégories (score = longueur m x pente moyenne %), de la plus dure à la plus facile
+CLIMB_CATEGORIES = (('HC', 80000), ('1', 64000), ('2', 32000), ('3', 16000), ('4', 8000))
+
+
+def climb_category(length_m, average_grade):
+    score = length_m * average_grade
+    for category, threshold in CLIMB_CATEGORIES:
+        if score >= threshold:
+            return category
+    return None
+
+
+def detect_climbs(distance_m, altitude_m, time_s=None, grid=CLIMB_GRID_METERS,
+                  smoothing=CLIMB_SMOOTHING_METERS):
+    """
+    Montées d'une activité depuis les streams distance / altitude (et time pour la VAM)
+    - ré-échantillonnage tous les `grid` mètres (np.interp) puis moyenne glissante de l'altitude
+    - tronçons en montée : pente lissée >= CLIMB_MIN_GRADE, runs par np.diff du masque
+    - fusion des runs séparés par un court replat sans perte d'altitude notable
+    - chaque montée se termine à son point culminant ; filtres longueur / dénivelé / pente
+    Retourne une liste de dicts (distances en m depuis le départ, indices d'échantillons des streams)
+    """
+    distance_m = np.maximum.accumulate(np.nan_to_num(np.asarray(distance_m, dtype=np.float64)))
+    altitude_m = np.asarray(altitude_m, dtype=np.float64)
+    if distance_m.size < 2 or distance_m[-1] - distance_m[0] < CLIMB_MIN_LENGTH_METERS:
+        return []
+    
+    # Distances strictement croissantes pour np.interp (arrêts : échantillons dupliqués)
+    keep = np.concatenate(([True], np.diff(distance_m) > 0))
+    sample_index = np.flatnonzero(keep)
+    distance_m, altitude_m = distance_m[keep], altitude_m[keep]
+    grid_m = np.arange(distance_m[0], distance_m[-1], grid)
+    altitude = np.interp(grid_m, distance_m, altitude_m)
+    
+    window = max(1, int(round(smoothing / grid)))
+    if altitude.size > window:
+        cumulative = np.concatenate(([0.0], np.cumsum(altitude)))
+        smoothed = (cumulative[window:] - cumulative[:-window]) / window
+        # Recentrer la moyenne glissante, bords complétés par la première / dernière valeur
+        pad = window // 2
+        altitude = np.concatenate((np.full(pad, smoothed[0]), smoothed,
+                                   np.full(altitude.size - smoothed.size - pad, smoothed[-1])))
+    
+    grade = np.diff(altitude) / grid * 100
+    climbing = np.concatenate(([False], grade >= CLIMB_MIN_GRADE, [False]))
+    edges = np.diff(climbing.astype(np.int8))
+    starts = np.flatnonzero(edges == 1)          # premier point du run
+    ends = np.flatnonzero(edges == -1)           # point d'arrivée du run (inclus)
+    if not starts.size:
+        return []
+    
+    # Fusion : replat court entre deux runs, altitude jamais descendue de plus de MAX_GAP_DROP
+    gap_lengths = (starts[1:] - ends[:-1]) * grid
+    if gap_lengths.size:
+        # Minimum de chaque replat altitude[fin du run : début du suivant] en un seul reduceat
+        bounds = np.column_stack((ends[:-1], starts[1:] + 1)).ravel()
+        gap_minimum = np.minimum.reduceat(altitude, bounds)[::2]
+        merge = (gap_lengths <= CLIMB_MAX_GAP_METERS) & (altitude[ends[:-1]] - gap_minimum <= CLIMB_MAX_GAP_DROP)
+    else:
+        merge = np.zeros(0, dtype=bool)
+    group_starts = starts[np.concatenate(([True], ~merge))]
+    group_ends = ends[np.concatenate((~merge, [True]))]
+    
+    if time_s is not None:
+        time_grid = np.interp(grid_m, distance_m, np.asarray(time_s, dtype=np.float64)[keep])
+    
+    # Point de grille -> premier échantillon du stream à cette distance (latlng, time...)
+    to_sample = lambda index: int(sample_index[min(np.searchsorted(distance_m, grid_m[index]), sample_index.size - 1)])
+    
+    climbs = []
+    for start, end in zip(group_starts, group_ends):
+        # Départ au point le plus bas, arrivée au point culminant
+        end = start + int(np.argmax(altitude[start:end + 1]))
+        start = start + int(np.argmin(altitude[start:end + 1]))
+        length = (end - start) * grid
+        gain = altitude[end] - altitude[start]
+        if length < CLIMB_MIN_LENGTH_METERS or gain < CLIMB_MIN_GAIN:
+            continue
+        average_grade = gain / length * 100
+        if average_grade < CLIMB_MIN_AVERAGE_GRADE:
+            continue
+        
+        # Pente maximale sur 100 m glissants
+        span = max(1, int(round(100 / grid)))
+        segment = altitude[start:end + 1]
+        max_grade = (segment[span:] - segment[:-span]).max() / (span * grid) * 100 \
+            if segment.size > span else average_grade
+        
+        duration = float(time_grid[end] - time_grid[start]) if time_s is not None else None
+        climbs.append({
+            'start_index': to_sample(start),
+            'end_index': to_sample(end),
+            'start_distance_m': float(grid_m[start] - grid_m[0]),
+            'end_distance_m': float(grid_m[end] - grid_m[0]),
+            'length_m': float(length),
+            'elevation_gain_m': float(gain),
+            'start_altitude_m': float(altitude[start]),
+            'end_altitude_m': float(altitude[end]),
+            'average_grade': float(average_grade),
+            'max_grade': float(max_grade),
+            'duration_s': int(round(duration)) if duration else None,
+            # Vitesse ascensionnelle moyenne (m/h)
+            'vam': float(gain / duration * 3600) if duration else None,
+            'category': climb_category(length, average_grade)
+        })
+    return climbs
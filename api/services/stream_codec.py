@@ -0,0 +1,107 @@
+"""
+Encodage compact des streams d'activité Strava (seconde par seconde)
+
+Chaque stream est quantifié en entiers (pas fixe par type), encodé en différences
+successives quand le signal est continu (time, distance, altitude, latlng), stocké dans
+le plus petit type entier suffisant puis compressé (zlib) : quelques Ko par heure
+d'activité au lieu de plusieurs centaines de Ko de JSON.
+Le décodage ne fait que np.frombuffer + cumsum : aucun parsing JSON.
+"""
+import struct
+import zlib
+import numpy as np
+
+# type de stream -> (pas de quantification, encodage différentiel, type numpy restitué)
+STREAM_SPECS = {
+    'time': (1, True, np.int32),                 # s
+    'distance': (0.1, True, np.float32),         # m (précision 10 cm)
+    'altitude': (0.1, True, np.float32),         # m
+    'velocity_smooth': (0.01, True, np.float32),  # m/s
+    'grade_smooth': (0.1, True, np.float32),     # %
+    'watts': (1, False, np.int16),               # W
+    'heartrate': (1, True, np.int16),            # bpm
+    'cadence': (1, False, np.int16),             # rpm
+    'temp': (1, False, np.int16),                # °C
+    'moving': (1, False, np.bool_),
+    'latlng': (1e-6, True, np.float64),          # degrés, tableau (n, 2)
+}
+
+MAGIC = b'STR1'
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+# Codes de type stockés dans l'en-tête
+TYPE_CODES = {np.dtype(t).str: code for code, t in enumerate(INT_TYPES)}
+
+
+def smallest_int_type(values):
+    if values.size == 0:
+        return np.int8
+    low, high = values.min(), values.max()
+    for int_type in INT_TYPES:
+        info = np.iinfo(int_type)
+        if info.min <= low and high <= info.max:
+            return int_type
+    raise ValueError("Valeurs hors plage int64")
+
+
+def encode_streams(streams):
+    """dict type -> tableau (n,) ou (n, 2) -> bytes compressés"""
+    header = [MAGIC, struct.pack('<B', len(streams))]
+    body = []
+    
+    for name, values in streams.items():
+        if name not in STREAM_SPECS:
+            raise ValueError(f"Type de stream inconnu: {name}")
+        step, delta, _ = STREAM_SPECS[name]
+        
+        array = np.asarray(values, dtype=np.float64)
+        width = array.shape[1] if array.ndim == 2 else 1
+        # NaN (capteur absent sur une partie de l'activité) -> 0
+        quantized = np.rint(np.nan_to_num(array) / step).astype(np.int64).reshape(-1, width)
+        if delta:
+            quantized = np.diff(quantized, axis=0, prepend=np.zeros((1, width), dtype=np.int64))
+        
+        int_type = smallest_int_type(quantized)
+        raw = np.ascontiguousarray(quantized.astype(int_type)).tobytes()
+        encoded_name = name.encode('ascii')
+        header.append(struct.pack('<B', len(encoded_name)) + encoded_name +
+                      struct.pack('<BBI', TYPE_CODES[np.dtype(int_type).str], width, len(raw)))
+        body.append(raw)
+    
+    return b''.join(header) + zlib.compress(b''.join(body), 6)
+
+
+def decode_streams(data, types=None):
+    """bytes -> dict type -> tableau NumPy (types : sous-ensemble à décoder)"""
+    if data[:4] != MAGIC:
+        raise ValueError("Format de streams inconnu")
+    
+    offset = 4
+    (count,) = struct.unpack_from('<B', data, offset)
+    offset += 1
+    
+    layout = []
+    for _ in range(count):
+        (name_length,) = struct.unpack_from('<B', data, offset)
+        offset += 1
+        name = data[offset:offset + name_length].decode('ascii')
+        offset += name_length
+        type_code, width, size = struct.unpack_from('<BBI', data, offset)
+        offset += 6
+        layout.append((name, INT_TYPES[type_code], width, size))
+    
+    body = zlib.decompress(data[offset:])
+    streams = {}
+    position = 0
+    for name, int_type, width, size in layout:
+        if types is None or name in types:
+            step, delta, output_type = STREAM_SPECS[name]
+            values = np.frombuffer(body, dtype=int_type, count=size // np.dtype(int_type).itemsize,
+                                   offset=position).astype(np.int64)
+            if width > 1:
+                values = values.reshape(-1, width)
+            if delta:
+                values = np.cumsum(values, axis=0)
+            streams[name] = (values * step).astype(output_type) if step != 1 else values.astype(output_type)
+        position += size
+    
+    return streams
@@ -0,0 +1,373 @@
+"""
+Stockage sur disque des streams décodés, relus par mmap sans copie
+
+Un fichier pack par athlète (<root>/athlete_<id>.pack), en ajout seul :
+
+    en-tête fichier   : b'STRMPACK' + version (u32) + réservé (u32)              16 octets
+    enregistrement    : en-tête (40 octets) + table des colonnes (40 octets/colonne)
+                        + colonnes typées contiguës, chacune alignée sur 8 octets
+
+    en-tête d'enregistrement (<4sHHqIIQII) :
+        b'SREC', version, nombre de colonnes, activity_id, nombre d'échantillons,
+        flags (1 = suppression), longueur totale, CRC32 des colonnes, réservé
+    colonne (<16sBB6xQQ) : nom, code de type, largeur (2 pour latlng), offset, taille
+
+Le dernier enregistrement d'une activité fait foi (mise à jour = ajout, suppression =
+enregistrement vide marqué). Les lectures renvoient des vues NumPy sur le mmap : extraire
+une fenêtre d'une activité ou parcourir toute une saison ne copie pas le fichier.
+La compaction réécrit les seuls enregistrements vivants puis remplace le pack (os.replace) :
+un lecteur qui a déjà mappé l'ancien fichier continue de lire un contenu cohérent.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+import numpy as np
+from flask import current_app
+
+FILE_MAGIC = b'STRMPACK'
+FILE_HEADER = struct.Struct('<8sII')
+RECORD_MAGIC = b'SREC'
+RECORD_HEADER = struct.Struct('<4sHHqIIQII')
+COLUMN_ENTRY = struct.Struct('<16sBB6xQQ')
+VERSION = 1
+FLAG_DELETED = 1
+
+# Types des colonnes (type restitué par services/stream_codec.py)
+DTYPES = (np.int16, np.int32, np.float32, np.float64, np.bool_)
+DTYPE_CODES = {np.dtype(dtype).str: code for code, dtype in enumerate(DTYPES)}
+
+
+def align(offset, boundary=8):
+    return (offset + boundary - 1) // boundary * boundary
+
+
+class StreamPack:
+    """Vue en lecture d'un fichier pack (mmap + index activity_id -> enregistrement)"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.index = {}           # activity_id -> (offset, sample_count, columns) ; None si supprimée
+        self.records = 0
+        self.valid_end = FILE_HEADER.size
+        self.errors = []
+        self.scan()
+    
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+    
+    def scan(self):
+        """Parcourir les en-têtes (sans lire les colonnes) ; s'arrête au premier enregistrement invalide"""
+        if self.size < FILE_HEADER.size:
+            if self.size:
+                self.errors.append((0, 'en-tête de fichier tronqué'))
+            self.valid_end = 0
+            return
+        magic, version, _ = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != FILE_MAGIC or version != VERSION:
+            self.errors.append((0, 'en-tête de fichier invalide'))
+            self.valid_end = 0
+            return
+        
+        offset = FILE_HEADER.size
+        while offset < self.size:
+            record = self.read_record_header(offset)
+            if isinstance(record, str):
+                self.errors.append((offset, record))
+                break
+            activity_id, sample_count, flags, length, _, columns = record
+            self.index[activity_id] = None if flags & FLAG_DELETED else (offset, sample_count, columns)
+            self.records += 1
+            offset += length
+        self.valid_end = offset if not self.errors else self.errors[-1][0]
+    
+    def read_record_header(self, offset):
+        """(activity_id, échantillons, flags, longueur, crc, colonnes) ou message d'erreur"""
+        if offset + RECORD_HEADER.size > self.size:
+            return 'en-tête d\'enregistrement tronqué'
+        magic, version, column_count, activity_id, sample_count, flags, length, crc, _ = \
+            RECORD_HEADER.unpack_from(self.map, offset)
+        if magic != RECORD_MAGIC or version != VERSION:
+            return 'en-tête d\'enregistrement invalide'
+        if length < RECORD_HEADER.size + column_count * COLUMN_ENTRY.size or offset + length > self.size:
+            return 'enregistrement tronqué'
+        
+        columns = {}
+        position = offset + RECORD_HEADER.size
+        for _ in range(column_count):
+            name, type_code, width, column_offset, nbytes = COLUMN_ENTRY.unpack_from(self.map, position)
+            if type_code >= len(DTYPES) or column_offset + nbytes > length:
+                return 'table des colonnes invalide'
+            columns[name.rstrip(b'\0').decode('ascii')] = (DTYPES[type_code], width, column_offset, nbytes)
+            position += COLUMN_ENTRY.size
+        return activity_id, sample_count, flags, length, crc, columns
+    
+    def record_crc(self, offset, length, column_count):
+        data_start = offset + RECORD_HEADER.size + column_count * COLUMN_ENTRY.size
+        with memoryview(self.map) as view, view[data_start:offset + length] as data:
+            return zlib.crc32(data)
+    
+    def read(self, activity_id, types=None):
+        """Vues NumPy (sans copie) sur les colonnes d'une activité ; None si absente"""
+        entry = self.index.get(activity_id)
+        if entry is None:
+            return None
+        offset, sample_count, columns = entry
+        
+        streams = {}
+        for name, (dtype, width, column_offset, nbytes) in columns.items():
+            if types is not None and name not in types:
+                continue
+            values = np.frombuffer(self.map, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize,
+                                   offset=offset + column_offset)
+            streams[name] = values.reshape(-1, width) if width > 1 else values
+        return streams
+
+
+class StreamStore:
+    """
+    Streams décodés par athlète dans data/streams, lus par mmap
+    Complément de activity_streams (source de vérité compressée en base) pour les
+    analyses sur de nombreuses activités
+    """
+    
+    def __init__(self, root):
+        self.root = root
+        self.packs = {}       # athlete_id -> StreamPack ouvert
+    
+    def pack_path(self, athlete_id):
+        return os.path.join(self.root, f'athlete_{athlete_id}.pack')
+    
+    def athlete_ids(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            int(name[len('athlete_'):-len('.pack')]) for name in os.listdir(self.root)
+            if name.startswith('athlete_') and name.endswith('.pack')
+        )
+    
+    def open_pack(self, athlete_id):
+        """Pack mappé, réouvert si le fichier a grandi ou été remplacé (compaction)"""
+        path = self.pack_path(athlete_id)
+        if not os.path.exists(path):
+            return None
+        
+        pack = self.packs.get(athlete_id)
+        if pack is not None:
+            stat = os.stat(path)
+            if stat.st_ino == os.fstat(pack.file.fileno()).st_ino and stat.st_size == pack.size:
+                return pack
+            # Pas de close() : des vues NumPy peuvent encore pointer sur l'ancien mmap
+        
+        pack = StreamPack(path)
+        self.packs[athlete_id] = pack
+        return pack
+    
+    @staticmethod
+    def build_record(activity_id, streams, flags=0):
+        """Enregistrement binaire d'une activité (colonnes dans leur type restitué)"""
+        columns = []
+        for name, values in (streams or {}).items():
+            array = np.ascontiguousarray(values)
+            if array.dtype.str not in DTYPE_CODES:
+                raise ValueError(f"Type non stockable pour {name}: {array.dtype}")
+            width = array.shape[1] if array.ndim == 2 else 1
+            columns.append((name, array, width))
+        
+        position = align(RECORD_HEADER.size + len(columns) * COLUMN_ENTRY.size)
+        table = []
+        body = []
+        for name, array, width in columns:
+            data = array.tobytes()
+            table.append(COLUMN_ENTRY.pack(name.encode('ascii'), DTYPE_CODES[array.dtype.str],
+                                           width, position, len(data)))
+            padded = data + b'\0' * (align(len(data)) - len(data))
+            body.append(padded)
+            position += len(padded)
+        
+        # Remplissage entre la table des colonnes et la première colonne
+        gap = align(RECORD_HEADER.size + len(table) * COLUMN_ENTRY.size) - RECORD_HEADER.size - len(table) * COLUMN_ENTRY.size
+        payload = b'\0' * gap + b''.join(body)
+        sample_count = len(columns[0][1]) if columns else 0
+        header = RECORD_HEADER.pack(RECORD_MAGIC, VERSION, len(columns), activity_id, sample_count,
+                                    flags, RECORD_HEADER.size + len(table) * COLUMN_ENTRY.size + len(payload),
+                                    zlib.crc32(payload), 0)
+        return header + b''.join(table) + payload
+    
+    def append_records(self, athlete_id, records):
+        """Ajouter des enregistrements au pack (verrou exclusif, fin tronquée réparée)"""
+        if not records:
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        path = self.pack_path(athlete_id)
+        
+        while True:
+            with open(path, 'a+b') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    # Pack remplacé par une compaction pendant l'attente du verrou : recommencer
+                    if not os.path.exists(path) or os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                        continue
+                    
+                    size = os.fstat(f.fileno()).st_size
+                    if size == 0:
+                        f.write(FILE_HEADER.pack(FILE_MAGIC, VERSION, 0))
+                    else:
+                        # Écriture interrompue (crash) : repartir du dernier enregistrement valide
+                        pack = StreamPack(path)
+                        valid_end = pack.valid_end
+                        pack.close()
+                        if valid_end == 0:
+                            raise ValueError(f"Pack illisible: {path}")
+                        if valid_end < size:
+                            f.truncate(valid_end)
+                    f.seek(0, os.SEEK_END)
+                    f.write(b''.join(records))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    return len(records)
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    
+    def write_many(self, athlete_id, streams_by_activity):
+        """Ajouter les streams {activity_id: streams décodés} d'un athlète"""
+        records = [self.build_record(activity_id, streams)
+                   for activity_id, streams in streams_by_activity.items() if streams]
+        return self.append_records(athlete_id, records)
+    
+    def delete(self, athlete_id, activity_ids):
+        """Marquer des activités supprimées (place récupérée à la compaction)"""
+        pack = self.open_pack(athlete_id)
+        if pack is None:
+            return 0
+        records = [self.build_record(activity_id, None, FLAG_DELETED)
+                   for activity_id in activity_ids if pack.index.get(activity_id) is not None]
+        return self.append_records(athlete_id, records)
+    
+    def read(self, athlete_id, activity_id, types=None):
+        pack = self.open_pack(athlete_id)
+        return pack.read(activity_id, types) if pack else None
+    
+    def read_window(self, athlete_id, activity_id, start_seconds, end_seconds, types=None):
+        """Échantillons entre deux instants (secondes depuis le départ), vues sans copie"""
+        streams = self.read(athlete_id, activity_id, None if types is None else set(types) | {'time'})
+        if not streams or 'time' not in streams:
+            return streams
+        time_s = streams['time']
+        start, end = np.searchsorted(time_s, [time_s[0] + start_seconds, time_s[0] + end_seconds])
+        return {name: values[start:end] for name, values in streams.items()
+                if types is None or name in types}
+    
+    def iter_activities(self, athlete_id, types=None, activity_ids=None):
+        """Parcourir (activity_id, streams) des activités vivantes d'un athlète"""
+        pack = self.open_pack(athlete_id)
+        if pack is None:
+            return
+        for activity_id in (activity_ids if activity_ids is not None else sorted(pack.index)):
+            streams = pack.read(activity_id, types)
+            if streams is not None:
+                yield activity_id, streams
+    
+    def contains(self, athlete_id):
+        """activity_id vivants présents dans le pack"""
+        pack = self.open_pack(athlete_id)
+        if pack is None:
+            return set()
+        return {activity_id for activity_id, entry in pack.index.items() if entry is not None}
+    
+    def verify(self, athlete_id):
+        """Contrôle d'intégrité : structure, bornes et CRC de chaque enregistrement"""
+        path = self.pack_path(athlete_id)
+        pack = StreamPack(path)
+        try:
+            corrupted = []
+            offset = FILE_HEADER.size if pack.valid_end else pack.size
+            while offset < pack.valid_end:
+                record = pack.read_record_header(offset)
+                activity_id, _, _, length, crc, columns = record
+                if pack.record_crc(offset, length, len(columns)) != crc:
+                    corrupted.append(activity_id)
+                offset += length
+            
+            live = sum(1 for entry in pack.index.values() if entry is not None)
+            return {
+                'athlete_id': athlete_id,
+                'path': path,
+                'size_bytes': pack.size,
+                'records': pack.records,
+                'live_activities': live,
+                'dead_records': pack.records - live,
+                'corrupted_activities': corrupted,
+                'errors': [{'offset': error_offset, 'error': message} for error_offset, message in pack.errors],
+                'trailing_bytes': pack.size - pack.valid_end,
+                'ok': not corrupted and not pack.errors
+            }
+        finally:
+            pack.close()
+    
+    def compact(self, athlete_id):
+        """
+        Réécrire le pack avec le dernier enregistrement valide de chaque activité vivante
+        (enregistrements remplacés, suppressions, fin tronquée et CRC invalides éliminés)
+        """
+        path = self.pack_path(athlete_id)
+        if not os.path.exists(path):
+            return None
+        
+        with open(path, 'rb') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                pack = StreamPack(path)
+                try:
+                    before = pack.size
+                    fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+                    kept = 0
+                    dropped_corrupted = 0
+                    with os.fdopen(fd, 'wb') as out:
+                        out.write(FILE_HEADER.pack(FILE_MAGIC, VERSION, 0))
+                        for activity_id in sorted(pack.index):
+                            entry = pack.index[activity_id]
+                            if entry is None:
+                                continue
+                            offset = entry[0]
+                            _, _, _, length, crc, columns = pack.read_record_header(offset)
+                            if pack.record_crc(offset, length, len(columns)) != crc:
+                                dropped_corrupted += 1
+                                continue
+                            out.write(pack.map[offset:offset + length])
+                            kept += 1
+                        out.flush()
+                        os.fsync(out.fileno())
+                    os.replace(tmp_path, path)
+                finally:
+                    pack.close()
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        
+        after = os.path.getsize(path)
+        return {
+            'athlete_id': athlete_id,
+            'live_activities': kept,
+            'dropped_corrupted': dropped_corrupted,
+            'size_before_bytes': before,
+            'size_after_bytes': after,
+            'reclaimed_bytes': before - after
+        }
+
+
+def get_stream_store():
+    """Store mmap de l'application Flask courante (None si désactivé)"""
+    if not current_app.config['STREAM_STORE_ENABLED']:
+        return None
+    store = current_app.extensions.get('stream_store')
+    if store is None:
+        store = StreamStore(current_app.config['STREAM_STORE_DIR'])
+        current_app.extensions['stream_store'] = store
+    return store
@@ -0,0 +1,256 @@
+from flask import current_app
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, Athlete, ActivitySummary
+from models.streams import ActivityStreams
+from services.climbs_service import ClimbsService
+from services.custom_calculations import CustomCalculationsService
+from services.fetch_scheduler import FetchScheduler
+from services.power_curve_service import PowerCurveService
+from services.stream_codec import STREAM_SPECS, encode_streams, decode_streams
+from services.strava_service import StravaService
+from services.stream_store import get_stream_store
+from services.training_load_service import TrainingLoadService
+from services.zones_service import ZonesService
+
+
+class StreamsService:
+    """
+    Ingestion et lecture des streams d'activité (tableaux typés compressés en bytea)
+    Une requête Strava par activité : l'ingestion avance par lots dans le budget partagé.
+    """
+    
+    def __init__(self):
+        self.batch_size = current_app.config['STREAMS_INGEST_BATCH_SIZE']
+    
+    @staticmethod
+    def parse_strava_streams(payload):
+        """Réponse key_by_type -> dict type -> tableau NumPy (types connus uniquement)"""
+        streams = {}
+        for name, stream in (payload or {}).items():
+            if name in STREAM_SPECS and isinstance(stream, dict) and stream.get('data'):
+                streams[name] = np.asarray(stream['data'], dtype=np.float64)
+        return streams
+    
+    @staticmethod
+    def build_streams_row(activity_id, strava_id, streams, json_size):
+        sample_count = len(next(iter(streams.values()))) if streams else 0
+        data = encode_streams(streams) if streams else None
+        return {
+            'activity_id': activity_id,
+            'strava_id': strava_id,
+            'data': data,
+            'stream_types': ','.join(streams.keys()),
+            'sample_count': sample_count,
+            'json_size_bytes': json_size,
+            'stored_size_bytes': len(data) if data else 0
+        }
+    
+    def store_streams_rows(self, rows):
+        """Enregistrer des streams (une requête pour le lot, remplace une version précédente)"""
+        if not rows:
+            return 0
+        
+        table = ActivityStreams.__table__
+        stmt = pg_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['activity_id'],
+            set_={column: stmt.excluded[column] for column in rows[0] if column != 'activity_id'}
+        )
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(rows)
+    
+    def activities_without_streams(self, athlete_id, limit):
+        """Activités dont les streams n'ont pas encore été récupérés (les plus utiles d'abord)"""
+        return [
+            (item.activity_id, item.strava_id)
+            for item in FetchScheduler().ranked_items(athlete_id, kinds=('streams',), limit=limit)
+        ]
+    
+    def ingest_athlete_streams(self, athlete_id, limit=None):
+        """Récupérer et stocker les streams d'un lot d'activités sans streams"""
+        athlete = Athlete.query.get(athlete_id)
+        if not athlete:
+            return {'error': 'Athlete not found'}
+        
+        strava_service = StravaService()
+        try:
+            strava_service.ensure_valid_token(athlete)
+        except Exception as e:
+            return {'error': f'Failed to refresh token: {str(e)}'}
+        
+        pending = self.activities_without_streams(athlete_id, limit or self.batch_size)
+        result = self.ingest_activities_streams(athlete, pending, strava_service)
+        result['remaining'] = len(self.activities_without_streams(athlete_id, 1)) > 0
+        return result
+    
+    def ingest_activities_streams(self, athlete, pending, strava_service=None):
+        """
+        Récupérer, stocker et analyser les streams d'activités données [(activity_id, strava_id)]
+        (token de l'athlète déjà valide)
+        """
+        athlete_id = athlete.id
+        strava_service = strava_service or StravaService()
+        activity_ids = {strava_id: activity_id for activity_id, strava_id in pending}
+        fetched = strava_service.fetch_activities_streams(activity_ids.keys(), athlete.access_token)
+        
+        activities = {
+            activity.id: activity for activity in
+            ActivitySummary.query.filter(ActivitySummary.id.in_(list(activity_ids.values()))).all()
+        }
+        calc_service = CustomCalculationsService()
+        zones_service = ZonesService()
+        ftp_history, max_heartrate = zones_service.get_thresholds(athlete_id)
+        ftp_entries = {
+            activity.id: zones_service.ftp_entry_for_day(ftp_history, activity.start_date_local.date())
+            for activity in activities.values()
+        }
+        
+        rows = []
+        power_curves = {}
+        power_metrics = {}
+        zone_times = {}
+        climbs = {}
+        distance_records = {}
+        failed = 0
+        for strava_id, (payload, json_size) in fetched.items():
+            if payload is None:
+                # Échec : l'activité reste sans streams et sera retentée au prochain lot
+                failed += 1
+                continue
+            streams = self.parse_strava_streams(payload)
+            rows.append(self.build_streams_row(activity_ids[strava_id], strava_id, streams, json_size))
+            power_curves[activity_ids[strava_id]] = PowerCurveService.compute_power_curve(streams)
+            power_metrics[activity_ids[strava_id]] = calc_service.stream_power_metrics(streams)
+            ftp_entry = ftp_entries.get(activity_ids[strava_id])
+            zone_times[activity_ids[strava_id]] = zones_service.compute_zone_seconds(
+                streams, ftp_entry.ftp if ftp_entry else None, max_heartrate
+            )
+            climbs[activity_ids[strava_id]] = ClimbsService.compute_climbs(streams)
+            activity = activities.get(activity_ids[strava_id])
+            if activity is not None and activity.type in ['Run', 'Walk'] and 'distance' in streams:
+                distance_records[activity.id] = calc_service.detect_distance_records(activity, streams)
+        
+        self.store_streams_rows(rows)
+        PowerCurveService().store_power_curves(power_curves)
+        calc_service.store_stream_power_metrics(power_metrics)
+        calc_service.store_distance_records(distance_records)
+        zones_service.store_zone_times(zone_times, ftp_entries, max_heartrate)
+        ClimbsService.store_climbs(climbs)
+        TrainingLoadService().refresh(athlete_id)
+        self.write_to_store(athlete_id, rows)
+        
+        return {
+            'activities_processed': len(pending),
+            'streams_stored': sum(1 for row in rows if row['sample_count']),
+            'without_streams': sum(1 for row in rows if not row['sample_count']),
+            'failed': failed,
+            'json_bytes': sum(row['json_size_bytes'] for row in rows),
+            'stored_bytes': sum(row['stored_size_bytes'] for row in rows),
+            'power_curves': sum(1 for curve in power_curves.values() if curve),
+            'distance_records': len(distance_records),
+            'zone_times': sum(1 for zones in zone_times.values() if zones),
+            'climbs': sum(len(activity_climbs) for activity_climbs in climbs.values())
+        }
+    
+    @staticmethod
+    def write_to_store(athlete_id, rows):
+        """Copier des streams enregistrés dans le store mmap (valeurs identiques au décodage en base)"""
+        store = get_stream_store()
+        if store is None:
+            return 0
+        return store.write_many(athlete_id, {
+            row['activity_id']: decode_streams(row['data']) for row in rows if row['data']
+        })
+    
+    def export_athlete_streams(self, athlete_id, batch_size=200):
+        """Remplir le store mmap avec les streams en base absents du pack de l'athlète"""
+        store = get_stream_store()
+        if store is None:
+            return 0
+        
+        present = store.contains(athlete_id)
+        exported = 0
+        last_activity_id = 0
+        while True:
+            batch = db.session.query(ActivityStreams.activity_id, ActivityStreams.data)\
+                .join(ActivitySummary, ActivitySummary.id == ActivityStreams.activity_id)\
+                .filter(ActivitySummary.athlete_id == athlete_id)\
+                .filter(ActivityStreams.data.isnot(None))\
+                .filter(ActivityStreams.activity_id > last_activity_id)\
+                .order_by(ActivityStreams.activity_id)\
+                .limit(batch_size).all()
+            if not batch:
+                break
+            
+            exported += store.write_many(athlete_id, {
+                activity_id: decode_streams(bytes(data))
+                for activity_id, data in batch if activity_id not in present
+            })
+            last_activity_id = batch[-1].activity_id
+        
+        return exported
+    
+    @staticmethod
+    def iter_athlete_streams(athlete_id, types=None, activity_ids=None):
+        """
+        Parcourir (activity_id, streams) d'un athlète : vues sans copie du store mmap,
+        décodage depuis la base pour les activités absentes du pack
+        """
+        store = get_stream_store()
+        stored = store.contains(athlete_id) if store else set()
+        if stored:
+            wanted = sorted(stored if activity_ids is None else stored & set(activity_ids))
+            yield from store.iter_activities(athlete_id, types, wanted)
+        
+        query = db.session.query(ActivityStreams.activity_id, ActivityStreams.data)\
+            .join(ActivitySummary, ActivitySummary.id == ActivityStreams.activity_id)\
+            .filter(ActivitySummary.athlete_id == athlete_id)\
+            .filter(ActivityStreams.data.isnot(None))
+        if activity_ids is not None:
+            query = query.filter(ActivityStreams.activity_id.in_(list(activity_ids)))
+        for activity_id, data in query.yield_per(100):
+            if activity_id not in stored:
+                yield activity_id, decode_streams(bytes(data), types)
+    
+    @staticmethod
+    def load_streams(activity_id, types=None):
+        """Streams d'une activité en tableaux NumPy (None si non récupérés)"""
+        row = db.session.query(ActivityStreams.data)\
+            .filter(ActivityStreams.activity_id == activity_id).first()
+        if row is None:
+            return None
+        if not row.data:
+            return {}
+        return decode_streams(bytes(row.data), types)
+    
+    @staticmethod
+    def get_athlete_streams_stats(athlete_id):
+        """Couverture et volume de stockage des streams d'un athlète"""
+        stats = db.session.query(
+            db.func.count(ActivityStreams.activity_id),
+            db.func.count(ActivityStreams.data),
+            db.func.coalesce(db.func.sum(ActivityStreams.sample_count), 0),
+            db.func.coalesce(db.func.sum(ActivityStreams.json_size_bytes), 0),
+            db.func.coalesce(db.func.sum(ActivityStreams.stored_size_bytes), 0)
+        ).join(ActivitySummary, ActivitySummary.id == ActivityStreams.activity_id)\
+         .filter(ActivitySummary.athlete_id == athlete_id).first()
+        
+        total_activities = ActivitySummary.query.filter_by(athlete_id=athlete_id).count()
+        fetched, with_data, samples, json_bytes, stored_bytes = stats
+        hours = samples / 3600
+        
+        return {
+            'total_activities': total_activities,
+            'streams_fetched': fetched,
+            'activities_with_streams': with_data,
+            'pending': total_activities - fetched,
+            'json_bytes': int(json_bytes),
+            'stored_bytes': int(stored_bytes),
+            'stored_kb_per_hour': round(int(stored_bytes) / 1024 / hours, 1) if hours else None
+        }
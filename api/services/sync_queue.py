@@ -0,0 +1,267 @@
+from datetime import datetime, timedelta
+import traceback
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+from models.database import db, Athlete
+from models.streams import ActivityStreams
+from models.sync import SyncJob, AthleteSyncState
+from services.fetch_scheduler import FetchScheduler
+from services.route_map_service import RouteMapService
+from services.strava_service import StravaService
+from services.streams_service import StreamsService
+from services.webhook_service import StravaWebhookService
+
+# Verrou consultatif PostgreSQL : un seul worker vide la file des récupérations à la fois
+FETCH_SCHEDULER_LOCK_ID = 718001
+
+
+class SyncQueueService:
+    """
+    File de synchronisation durable (table sync_jobs)
+    Les endpoints HTTP mettent en file et répondent immédiatement ; les workers
+    (python worker.py, sur un ou plusieurs nœuds) réclament les jobs avec SKIP LOCKED.
+    """
+    
+    ACTIVE_STATUSES = ('queued', 'running')
+    
+    def __init__(self):
+        self.max_attempts = current_app.config['SYNC_JOB_MAX_ATTEMPTS']
+        # Un job 'running' sans heartbeat depuis ce délai est considéré abandonné (worker mort)
+        self.stale_after = timedelta(seconds=current_app.config['SYNC_JOB_STALE_SECONDS'])
+        self.should_stop = None
+        self.handlers = {
+            'athlete_sync': self.run_athlete_sync,
+            'athlete_reconcile': self.run_athlete_reconcile,
+            'webhook_event': self.run_webhook_event,
+            'streams_ingest': self.run_streams_ingest
+        }
+    
+    def enqueue(self, athlete_id, job_type='athlete_sync', payload=None, dedupe=True):
+        """Mettre un job en file (réutilise le job actif existant du même type si dedupe)"""
+        if dedupe:
+            existing = SyncJob.query.filter(
+                SyncJob.athlete_id == athlete_id,
+                SyncJob.job_type == job_type,
+                SyncJob.status.in_(self.ACTIVE_STATUSES)
+            ).order_by(SyncJob.created_at).first()
+            if existing:
+                return existing
+        
+        job = SyncJob(athlete_id=athlete_id, job_type=job_type, payload=payload or {})
+        db.session.add(job)
+        db.session.commit()
+        return job
+    
+    def claim_next(self, worker_id):
+        """Réclamer le prochain job disponible (ou abandonné) sans bloquer les autres workers"""
+        now = datetime.utcnow()
+        job = SyncJob.query.filter(
+            or_(
+                and_(SyncJob.status == 'queued', SyncJob.run_after <= now),
+                and_(SyncJob.status == 'running', SyncJob.heartbeat_at < now - self.stale_after)
+            )
+        ).order_by(SyncJob.created_at)\
+         .with_for_update(skip_locked=True)\
+         .first()
+        
+        if not job:
+            db.session.rollback()
+            return None
+        
+        job.status = 'running'
+        job.attempts += 1
+        job.worker_id = worker_id
+        job.started_at = now
+        job.heartbeat_at = now
+        job.error = None
+        db.session.commit()
+        return job
+    
+    def heartbeat(self, job_id, engine=None):
+        """Signaler que le job est toujours vivant (utilisable depuis un thread via l'engine)"""
+        table = SyncJob.__table__
+        stmt = update(table).where(table.c.id == job_id).where(table.c.status == 'running')\
+            .values(heartbeat_at=datetime.utcnow())
+        with (engine or db.engine).begin() as conn:
+            conn.execute(stmt)
+    
+    def run(self, job, should_stop=None):
+        """
+        Exécuter un job réclamé et enregistrer son résultat
+        should_stop() : arrêt du worker demandé, les handlers qui le supportent s'interrompent
+        après leur dernier checkpoint et le job est remis en file sans compter d'essai
+        """
+        handler = self.handlers.get(job.job_type)
+        self.should_stop = should_stop
+        try:
+            if not handler:
+                raise ValueError(f"Type de job inconnu: {job.job_type}")
+            
+            result = handler(job)
+            if isinstance(result, dict) and 'error' in result:
+                raise RuntimeError(result['error'])
+            
+            if isinstance(result, dict) and result.get('interrupted'):
+                job.status = 'queued'
+                job.attempts -= 1
+                job.worker_id = None
+                job.result = result
+                db.session.commit()
+                return job
+            
+            job.status = 'completed'
+            job.result = result
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            
+        except Exception as e:
+            print(f"Erreur job {job.id} ({job.job_type}): {str(e)}")
+            traceback.print_exc()
+            db.session.rollback()
+            
+            job.error = str(e)
+            if job.attempts < self.max_attempts:
+                # Nouvel essai avec backoff exponentiel
+                job.status = 'queued'
+                job.run_after = datetime.utcnow() + timedelta(minutes=2 ** job.attempts)
+            else:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+            db.session.commit()
+        
+        return job
+    
+    def enqueue_due_reconciles(self):
+        """Mettre en file une réconciliation pour chaque athlète dont la dernière passe est trop ancienne"""
+        interval = timedelta(hours=current_app.config['SYNC_RECONCILE_INTERVAL_HOURS'])
+        due_before = datetime.utcnow() - interval
+        
+        athlete_ids = [athlete_id for (athlete_id,) in db.session.query(Athlete.id)
+                       .outerjoin(AthleteSyncState, AthleteSyncState.athlete_id == Athlete.id)
+                       .filter(Athlete.refresh_token.isnot(None))
+                       .filter(or_(AthleteSyncState.last_reconcile_at.is_(None),
+                                   AthleteSyncState.last_reconcile_at < due_before))
+                       .all()]
+        
+        for athlete_id in athlete_ids:
+            self.enqueue(athlete_id, job_type='athlete_reconcile')
+        return len(athlete_ids)
+    
+    def update_progress(self, job, stats):
+        """Mettre à jour la progression visible par l'endpoint de statut"""
+        job.pages_fetched = stats.get('pages_fetched', job.pages_fetched)
+        job.activities_inserted = stats.get('activities_inserted', job.activities_inserted)
+        job.activities_enriched = stats.get('activities_enriched', job.activities_enriched)
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+    
+    # ========== HANDLERS ==========
+    
+    def run_athlete_sync(self, job):
+        strava_service = StravaService()
+        result = strava_service.sync_athlete_activities(
+            job.athlete_id,
+            progress_callback=lambda stats: self.update_progress(job, stats),
+            should_stop=self.should_stop
+        )
+        # Nouvelles activités : récupération de leurs streams dans un job séparé
+        if result.get('synchronized_activities'):
+            self.enqueue(job.athlete_id, job_type='streams_ingest')
+            # Tuiles de heatmap invalidées par les nouveaux tracés
+            result['heatmap_tiles'] = RouteMapService().precompute_heatmap(job.athlete_id)
+        return result
+    
+    def run_athlete_reconcile(self, job):
+        strava_service = StravaService()
+        result = strava_service.reconcile_athlete_activities(
+            job.athlete_id,
+            days=(job.payload or {}).get('days')
+        )
+        if result.get('inserted') or result.get('updated') or result.get('deleted'):
+            result['heatmap_tiles'] = RouteMapService().precompute_heatmap(job.athlete_id)
+        return result
+    
+    def run_webhook_event(self, job):
+        return StravaWebhookService().process_event(job.payload['event_id'])
+    
+    def run_streams_ingest(self, job):
+        result = StreamsService().ingest_athlete_streams(job.athlete_id)
+        # Un lot par job pour laisser passer les autres travaux ; le suivant est remis en file
+        if result.get('remaining') and result.get('activities_processed') > result.get('failed'):
+            # Job courant marqué terminé, sinon enqueue le réutiliserait (dédoublonnage)
+            job.status = 'completed'
+            db.session.commit()
+            self.enqueue(job.athlete_id, job_type='streams_ingest')
+        return result
+    
+    # ========== FILE DES RÉCUPÉRATIONS (détails et streams) ==========
+    
+    def run_fetch_batch(self, should_stop=None):
+        """
+        Récupérer un lot de détails / streams en attente, les plus utiles d'abord,
+        dimensionné sur le budget Strava restant (appelé par les workers inoccupés)
+        Retourne None si un autre worker vide déjà la file ou si le budget est épuisé
+        """
+        with db.engine.connect() as lock_conn:
+            if not lock_conn.execute(select(db.func.pg_try_advisory_lock(FETCH_SCHEDULER_LOCK_ID))).scalar():
+                return None
+            try:
+                items = FetchScheduler().next_batch()
+                if not items:
+                    return None
+                return self.fetch_items(items, should_stop)
+            finally:
+                lock_conn.execute(select(db.func.pg_advisory_unlock(FETCH_SCHEDULER_LOCK_ID)))
+    
+    def fetch_items(self, items, should_stop=None):
+        """Exécuter un lot classé, athlète par athlète (détails avant streams : device_watts connu)"""
+        by_athlete = {}
+        for item in items:
+            by_athlete.setdefault(item.athlete_id, {'detail': [], 'streams': []})[item.kind].append(item)
+        
+        strava_service = StravaService()
+        streams_service = StreamsService()
+        scheduler = FetchScheduler()
+        stats = {'requests': len(items), 'details_stored': 0, 'streams_stored': 0, 'failed': 0}
+        for athlete_id, pending in by_athlete.items():
+            if should_stop and should_stop():
+                break
+            
+            athlete = Athlete.query.get(athlete_id)
+            try:
+                strava_service.ensure_valid_token(athlete)
+            except Exception as e:
+                print(f"Erreur token athlète {athlete_id}, récupérations reportées: {str(e)}")
+                scheduler.record_failures(pending['detail'] + pending['streams'])
+                stats['failed'] += len(pending['detail']) + len(pending['streams'])
+                continue
+            
+            if pending['detail']:
+                activity_ids = {item.strava_id: item.activity_id for item in pending['detail']}
+                details = strava_service.fetch_detailed_activities(activity_ids.keys(), athlete.access_token)
+                stats['details_stored'] += strava_service.insert_strava_metrics_rows([
+                    strava_service.build_strava_metrics_row(activity_ids[strava_id], detail)
+                    for strava_id, detail in details.items() if detail
+                ])
+                failed = [item for item in pending['detail'] if not details.get(item.strava_id)]
+                scheduler.record_failures(failed, strava_service.fetch_statuses)
+                scheduler.clear_failures([item for item in pending['detail'] if details.get(item.strava_id)])
+                stats['failed'] += len(failed)
+            
+            if pending['streams']:
+                result = streams_service.ingest_activities_streams(
+                    athlete, [(item.activity_id, item.strava_id) for item in pending['streams']], strava_service
+                )
+                stats['streams_stored'] += result['streams_stored'] + result['without_streams']
+                fetched = {activity_id for (activity_id,) in db.session.query(ActivityStreams.activity_id)
+                           .filter(ActivityStreams.activity_id.in_([item.activity_id for item in pending['streams']]))}
+                failed = [item for item in pending['streams'] if item.activity_id not in fetched]
+                scheduler.record_failures(failed, strava_service.fetch_statuses)
+                scheduler.clear_failures([item for item in pending['streams'] if item.activity_id in fetched])
+                stats['failed'] += len(failed)
+        
+        return stats
+    
+    @staticmethod
+    def get_job(job_id):
+        return SyncJob.query.get(job_id)
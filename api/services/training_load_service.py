@@ -0,0 +1,171 @@
+from datetime import date, timedelta
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, ActivitySummary
+from models.custom_metrics import ActivityCustomMetrics
+from models.training_load import AthleteDailyLoad, AthleteLoadState, CTL_DAYS, ATL_DAYS
+
+# Lignes par INSERT ... ON CONFLICT lors d'un recalcul
+LOAD_UPSERT_CHUNK = 1000
+
+
+class TrainingLoadService:
+    """
+    Série quotidienne CTL / ATL / TSB tenue à jour de façon incrémentale :
+    les écritures qui changent un TSS marquent le jour concerné, le recalcul repart
+    de la veille de ce jour (valeurs stockées) au lieu de relire tout l'historique
+    """
+    
+    @staticmethod
+    def mark_dirty(athlete_id, day):
+        """Série à recalculer à partir de `day` (sans commit : dans la transaction de l'appelant)"""
+        table = AthleteLoadState.__table__
+        stmt = pg_insert(table).values(athlete_id=athlete_id, dirty_from=day)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['athlete_id'],
+            # LEAST ignore NULL : le jour le plus ancien l'emporte
+            set_={'dirty_from': db.func.least(table.c.dirty_from, stmt.excluded.dirty_from)}
+        )
+        db.session.execute(stmt)
+    
+    @staticmethod
+    def mark_activities_dirty(activity_ids):
+        """mark_dirty pour le jour de chaque activité (une requête, avant suppression éventuelle)"""
+        activity_ids = list(activity_ids)
+        if not activity_ids:
+            return
+        table = AthleteLoadState.__table__
+        stmt = pg_insert(table).from_select(
+            ['athlete_id', 'dirty_from'],
+            select(ActivitySummary.athlete_id, db.func.min(db.func.date(ActivitySummary.start_date_local)))
+            .where(ActivitySummary.id.in_(activity_ids))
+            .group_by(ActivitySummary.athlete_id)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['athlete_id'],
+            set_={'dirty_from': db.func.least(table.c.dirty_from, stmt.excluded.dirty_from)}
+        )
+        db.session.execute(stmt)
+    
+    @staticmethod
+    def daily_tss(athlete_id, start_day=None):
+        """{jour: (TSS, nombre d'activités)} depuis start_day (un agrégat SQL)"""
+        day = db.func.date(ActivitySummary.start_date_local)
+        query = db.session.query(
+            day,
+            db.func.coalesce(db.func.sum(ActivityCustomMetrics.custom_tss), 0),
+            db.func.count(ActivitySummary.id)
+        ).outerjoin(ActivityCustomMetrics, ActivityCustomMetrics.activity_id == ActivitySummary.id)\
+            .filter(ActivitySummary.athlete_id == athlete_id)
+        if start_day is not None:
+            query = query.filter(ActivitySummary.start_date_local >= start_day)
+        return {row_day: (float(tss), count) for row_day, tss, count in query.group_by(day).all()}
+    
+    def refresh(self, athlete_id, today=None):
+        """
+        Mettre la série à jour jusqu'à aujourd'hui : depuis le premier jour marqué,
+        ou le lendemain du dernier jour calculé (décroissance des jours sans activité)
+        Retourne le nombre de jours recalculés
+        """
+        today = today or date.today()
+        try:
+            # Verrou de la ligne d'état : un marquage concurrent attend la fin du recalcul
+            db.session.execute(
+                pg_insert(AthleteLoadState.__table__).values(athlete_id=athlete_id)
+                .on_conflict_do_nothing(index_elements=['athlete_id'])
+            )
+            state = db.session.query(AthleteLoadState)\
+                .filter(AthleteLoadState.athlete_id == athlete_id).with_for_update().one()
+            
+            start_day = None
+            if state.computed_through is not None:
+                start_day = state.computed_through + timedelta(days=1)
+                if state.dirty_from is not None:
+                    start_day = min(start_day, state.dirty_from)
+                if start_day > today and state.dirty_from is None:
+                    db.session.commit()
+                    return 0
+            
+            days = self.recompute_from(athlete_id, start_day, today)
+            state.computed_through = today
+            state.dirty_from = None
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return days
+    
+    def recompute_from(self, athlete_id, start_day, today):
+        """
+        Recalculer les jours start_day -> max(aujourd'hui, dernière activité) à partir des
+        CTL / ATL stockés la veille ; tout l'historique si start_day est None ou sans veille
+        (sans commit)
+        """
+        seed = None
+        if start_day is not None:
+            seed = db.session.query(AthleteDailyLoad)\
+                .filter(AthleteDailyLoad.athlete_id == athlete_id)\
+                .filter(AthleteDailyLoad.day == start_day - timedelta(days=1)).first()
+        
+        if seed is None:
+            AthleteDailyLoad.query.filter_by(athlete_id=athlete_id).delete(synchronize_session=False)
+            daily = self.daily_tss(athlete_id)
+            if not daily:
+                return 0
+            start_day = min(daily)
+            ctl = atl = 0.0
+        else:
+            daily = self.daily_tss(athlete_id, start_day)
+            ctl, atl = seed.ctl, seed.atl
+        
+        end_day = max([today] + list(daily))
+        rows = []
+        day = start_day
+        while day <= end_day:
+            tss, count = daily.get(day, (0.0, 0))
+            tsb = ctl - atl
+            ctl += (tss - ctl) / CTL_DAYS
+            atl += (tss - atl) / ATL_DAYS
+            rows.append({
+                'athlete_id': athlete_id,
+                'day': day,
+                'tss': tss,
+                'activity_count': count,
+                'ctl': ctl,
+                'atl': atl,
+                'tsb': tsb
+            })
+            day += timedelta(days=1)
+        
+        table = AthleteDailyLoad.__table__
+        for offset in range(0, len(rows), LOAD_UPSERT_CHUNK):
+            stmt = pg_insert(table).values(rows[offset:offset + LOAD_UPSERT_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['athlete_id', 'day'],
+                set_={column: stmt.excluded[column] for column in ('tss', 'activity_count', 'ctl', 'atl', 'tsb')}
+            )
+            db.session.execute(stmt)
+        # Activités futures supprimées : jours devenus inutiles
+        AthleteDailyLoad.query.filter(AthleteDailyLoad.athlete_id == athlete_id)\
+            .filter(AthleteDailyLoad.day > end_day).delete(synchronize_session=False)
+        
+        return len(rows)
+    
+    def get_range(self, athlete_id, start_day=None, end_day=None):
+        """Série quotidienne sur une période (lecture par la clé primaire athlete_id, day)"""
+        self.refresh(athlete_id)
+        query = AthleteDailyLoad.query.filter(AthleteDailyLoad.athlete_id == athlete_id)
+        if start_day is not None:
+            query = query.filter(AthleteDailyLoad.day >= start_day)
+        if end_day is not None:
+            query = query.filter(AthleteDailyLoad.day <= end_day)
+        return [row.to_dict() for row in query.order_by(AthleteDailyLoad.day).all()]
+    
+    def get_current(self, athlete_id):
+        """CTL / ATL / TSB du jour (None sans activité)"""
+        self.refresh(athlete_id)
+        row = AthleteDailyLoad.query.filter(AthleteDailyLoad.athlete_id == athlete_id)\
+            .filter(AthleteDailyLoad.day <= date.today())\
+            .order_by(AthleteDailyLoad.day.desc()).first()
+        return row.to_dict() if row else None
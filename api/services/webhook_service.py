@@ -0,0 +1,144 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, Athlete
+from models.sync import SyncJob
+from models.webhook import StravaWebhookEvent
+from services.strava_service import StravaService
+
+
+class StravaWebhookService:
+    """
+    Ingestion des événements push Strava
+    La réception se limite à enregistrer l'événement et mettre un job en file (réponse < 2 s
+    exigée par Strava) ; le travail ciblé sur une seule activité est fait par les workers.
+    """
+    
+    REQUIRED_FIELDS = ('object_type', 'object_id', 'aspect_type', 'owner_id', 'event_time')
+    
+    def __init__(self):
+        self.verify_token = current_app.config['STRAVA_WEBHOOK_VERIFY_TOKEN']
+        self.subscription_id = current_app.config['STRAVA_WEBHOOK_SUBSCRIPTION_ID']
+    
+    def validate_subscription(self, mode, token, challenge):
+        """Poignée de main de validation de l'abonnement (GET hub.mode / hub.verify_token / hub.challenge)"""
+        if mode != 'subscribe' or not challenge:
+            return None
+        if not self.verify_token or token != self.verify_token:
+            return None
+        return challenge
+    
+    def record_event(self, payload):
+        """
+        Enregistrer un événement reçu et mettre en file son traitement
+        Retourne l'événement, ou None si c'est une relivraison déjà enregistrée
+        """
+        missing = [field for field in self.REQUIRED_FIELDS if payload.get(field) is None]
+        if missing:
+            raise ValueError(f"Champs manquants: {', '.join(missing)}")
+        
+        if self.subscription_id and payload.get('subscription_id') not in (None, self.subscription_id):
+            raise ValueError(f"Abonnement inconnu: {payload.get('subscription_id')}")
+        
+        athlete = Athlete.query.filter_by(strava_id=payload['owner_id']).first()
+        
+        table = StravaWebhookEvent.__table__
+        stmt = pg_insert(table).values(
+            subscription_id=payload.get('subscription_id'),
+            object_type=payload['object_type'],
+            object_id=payload['object_id'],
+            aspect_type=payload['aspect_type'],
+            owner_id=payload['owner_id'],
+            updates=payload.get('updates') or {},
+            event_time=payload['event_time'],
+            athlete_id=athlete.id if athlete else None,
+            status='received' if athlete else 'ignored',
+            received_at=datetime.utcnow()
+        ).on_conflict_do_nothing(constraint='uq_strava_webhook_event').returning(table.c.id)
+        
+        try:
+            event_id = db.session.execute(stmt).scalar()
+            if event_id is None:
+                db.session.rollback()
+                return None
+            
+            event = StravaWebhookEvent.query.get(event_id)
+            if athlete:
+                job = SyncJob(athlete_id=athlete.id, job_type='webhook_event', payload={'event_id': event_id})
+                db.session.add(job)
+                db.session.flush()
+                event.job_id = job.id
+                event.status = 'queued'
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return event
+    
+    def process_event(self, event_id):
+        """Traiter un événement enregistré (appelé par le worker)"""
+        event = StravaWebhookEvent.query.get(event_id)
+        if not event:
+            return {'error': f'Webhook event {event_id} not found'}
+        
+        try:
+            result = self.dispatch(event)
+            event.status = 'failed' if 'error' in result else 'processed'
+            event.result = result
+            event.error = result.get('error')
+        except Exception as e:
+            db.session.rollback()
+            event.status = 'failed'
+            event.error = str(e)
+            result = {'error': str(e)}
+        
+        event.processed_at = datetime.utcnow()
+        db.session.commit()
+        return result
+    
+    def dispatch(self, event):
+        if event.object_type == 'athlete':
+            if event.is_deauthorization():
+                return self.handle_deauthorization(event)
+            return {'ignored': 'athlete update'}
+        
+        if event.object_type != 'activity':
+            return {'ignored': f'object_type {event.object_type}'}
+        
+        strava_service = StravaService()
+        if event.aspect_type == 'create':
+            return strava_service.sync_single_activity_enhanced(event.object_id, event.athlete_id)
+        if event.aspect_type == 'update':
+            # Titre, type, visibilité... : réécriture de la ligne existante
+            return strava_service.sync_single_activity_enhanced(
+                event.object_id, event.athlete_id, update_existing=True
+            )
+        if event.aspect_type == 'delete':
+            deleted = strava_service.delete_activities_by_strava_ids([event.object_id])
+            return {'activity_id': event.object_id, 'deleted': deleted}
+        
+        return {'ignored': f'aspect_type {event.aspect_type}'}
+    
+    def handle_deauthorization(self, event):
+        """L'athlète a révoqué l'accès : oublier ses tokens et annuler ses jobs en attente"""
+        athlete = Athlete.query.get(event.athlete_id)
+        if not athlete:
+            return {'error': 'Athlete not found'}
+        
+        athlete.access_token = None
+        athlete.refresh_token = None
+        athlete.token_expires_at = None
+        
+        cancelled = SyncJob.query.filter(
+            SyncJob.athlete_id == athlete.id,
+            SyncJob.status == 'queued'
+        ).update({'status': 'failed', 'error': 'Athlete deauthorized', 'finished_at': datetime.utcnow()},
+                 synchronize_session=False)
+        db.session.commit()
+        
+        return {'athlete_id': athlete.id, 'deauthorized': True, 'cancelled_jobs': cancelled}
+    
+    @staticmethod
+    def get_recent_events(limit=50):
+        return StravaWebhookEvent.query.order_by(StravaWebhookEvent.received_at.desc()).limit(limit).all()
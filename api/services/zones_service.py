@@ -0,0 +1,204 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.database import db, ActivitySummary
+from models.custom_metrics import AthleteSettings, AthleteFtpHistory
+from models.streams import ActivityStreams
+from models.zones import ActivityZoneTime, POWER_ZONE_FRACTIONS, HEARTRATE_ZONE_FRACTIONS, ZONE_COLUMNS
+from services.ftp_history_service import FtpHistoryService
+from services.stream_analysis import moving_1hz, time_in_zones
+from services.stream_codec import decode_streams
+
+ZONE_PERIODS = ('week', 'month')
+
+
+class ZonesService:
+    """
+    Temps passé par zone de puissance et de FC, calculé seconde par seconde
+    depuis les streams (et non plus une zone unique par activité d'après l'IF moyen)
+    Zones de puissance : FTP en vigueur à la date de l'activité (comme IF / TSS)
+    """
+    
+    def get_thresholds(self, athlete_id):
+        """Historique FTP (par date d'effet) et FC max de l'athlète (None si non renseignée)"""
+        history = FtpHistoryService().get_history(athlete_id)
+        settings = AthleteSettings.query.get(athlete_id)
+        return history, settings.max_heartrate if settings else None
+    
+    @staticmethod
+    def ftp_entry_for_day(history, day):
+        """Ligne d'historique en vigueur le jour `day` (même règle que FtpHistoryService.entry_for_day)"""
+        if not history:
+            return None
+        index = bisect_right([entry.effective_date for entry in history], day)
+        return history[index - 1] if index else history[0]
+    
+    @staticmethod
+    def compute_zone_seconds(streams, ftp, max_heartrate):
+        """Streams décodés -> {'power': [s1..s5], 'heartrate': [s1..s5]} (types disponibles)"""
+        if not streams or 'time' not in streams:
+            return {}
+        
+        zones = {}
+        if 'watts' in streams and ftp:
+            watts = moving_1hz(streams['time'], streams['watts'])
+            zones['power'] = time_in_zones(watts, [ftp * fraction for fraction in POWER_ZONE_FRACTIONS])
+        if 'heartrate' in streams and max_heartrate:
+            heartrate = moving_1hz(streams['time'], streams['heartrate'])
+            # Décrochages de la ceinture (0 bpm) exclus
+            heartrate = heartrate[heartrate > 0]
+            zones['heartrate'] = time_in_zones(
+                heartrate, [max_heartrate * fraction for fraction in HEARTRATE_ZONE_FRACTIONS]
+            )
+        return zones
+    
+    def store_zone_times(self, zones_by_activity, ftp_entries, max_heartrate):
+        """
+        Enregistrer {activity_id: zones} pour un athlète (une requête pour le lot)
+        ftp_entries : {activity_id: ligne d'historique FTP utilisée pour les zones de puissance}
+        """
+        zones_by_activity = {activity_id: zones for activity_id, zones in zones_by_activity.items() if zones}
+        if not zones_by_activity:
+            return 0
+        
+        activities = dict(
+            db.session.query(ActivitySummary.id, ActivitySummary)
+            .filter(ActivitySummary.id.in_(list(zones_by_activity.keys()))).all()
+        )
+        rows = []
+        for activity_id, zones in zones_by_activity.items():
+            if activity_id not in activities:
+                continue
+            ftp_entry = ftp_entries.get(activity_id)
+            for zone_type, seconds in zones.items():
+                power = zone_type == 'power'
+                row = {
+                    'activity_id': activity_id,
+                    'zone_type': zone_type,
+                    'athlete_id': activities[activity_id].athlete_id,
+                    'start_date_local': activities[activity_id].start_date_local,
+                    'threshold': ftp_entry.ftp if power else max_heartrate,
+                    'ftp_version': ftp_entry.id if power else None,
+                    'calculated_at': datetime.utcnow()
+                }
+                row.update(zip(ZONE_COLUMNS, seconds))
+                rows.append(row)
+        
+        if not rows:
+            return 0
+        
+        stmt = pg_insert(ActivityZoneTime.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['activity_id', 'zone_type'],
+            set_={column: stmt.excluded[column] for column in ZONE_COLUMNS + ['threshold', 'ftp_version', 'calculated_at']}
+        )
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return len(rows)
+    
+    def recompute_for_athlete(self, athlete_id, only_stale=True, batch_size=200):
+        """
+        Calculer les temps en zones des activités avec streams : manquants ou
+        calculés avec d'anciens seuils (only_stale), ou tout l'historique
+        Zones de puissance périmées : version de FTP différente de celle en vigueur à la date
+        """
+        history, max_heartrate = self.get_thresholds(athlete_id)
+        
+        query = db.session.query(ActivityStreams.activity_id, ActivityStreams.data, ActivitySummary.start_date_local)\
+            .join(ActivitySummary, ActivitySummary.id == ActivityStreams.activity_id)\
+            .filter(ActivitySummary.athlete_id == athlete_id)\
+            .filter(ActivityStreams.sample_count > 0)
+        
+        if only_stale:
+            # Version en vigueur : la plus récente avant la date, sinon la plus ancienne de l'historique
+            day = db.func.date(ActivityZoneTime.start_date_local)
+            ftp_version = select(AthleteFtpHistory.id)\
+                .where(AthleteFtpHistory.athlete_id == ActivityZoneTime.athlete_id)\
+                .order_by(AthleteFtpHistory.effective_date > day, db.func.abs(day - AthleteFtpHistory.effective_date))\
+                .limit(1).scalar_subquery()
+            computed_ids = db.session.query(ActivityZoneTime.activity_id)\
+                .filter(ActivityZoneTime.athlete_id == athlete_id)
+            stale_ids = computed_ids.filter(db.or_(
+                db.and_(ActivityZoneTime.zone_type == 'power', ActivityZoneTime.ftp_version.is_distinct_from(ftp_version)),
+                db.and_(ActivityZoneTime.zone_type == 'heartrate', ActivityZoneTime.threshold != max_heartrate)
+            ))
+            query = query.filter(db.or_(
+                ActivityStreams.activity_id.notin_(computed_ids),
+                ActivityStreams.activity_id.in_(stale_ids)
+            ))
+        
+        computed = 0
+        last_activity_id = 0
+        while True:
+            batch = query.filter(ActivityStreams.activity_id > last_activity_id)\
+                .order_by(ActivityStreams.activity_id).limit(batch_size).all()
+            if not batch:
+                break
+            
+            ftp_entries = {
+                activity_id: self.ftp_entry_for_day(history, start_date_local.date())
+                for activity_id, _, start_date_local in batch
+            }
+            zones_by_activity = {
+                activity_id: self.compute_zone_seconds(
+                    decode_streams(bytes(data), ('time', 'watts', 'heartrate')),
+                    ftp_entries[activity_id].ftp, max_heartrate
+                )
+                for activity_id, data, _ in batch
+            }
+            self.store_zone_times(zones_by_activity, ftp_entries, max_heartrate)
+            computed += sum(1 for zones in zones_by_activity.values() if zones)
+            last_activity_id = batch[-1].activity_id
+        
+        return computed
+    
+    @staticmethod
+    def get_zone_distribution(athlete_id, period='week', days=90, zone_type='power'):
+        """
+        Répartition du temps par zone et par semaine/mois : un seul agrégat SQL
+        sur activity_zone_time
+        """
+        if period not in ZONE_PERIODS:
+            raise ValueError(f'Période inconnue: {period}')
+        
+        bucket = db.func.date_trunc(period, ActivityZoneTime.start_date_local).label('period_start')
+        rows = db.session.query(
+            bucket,
+            db.func.count(ActivityZoneTime.activity_id),
+            *[db.func.sum(getattr(ActivityZoneTime, column)) for column in ZONE_COLUMNS]
+        ).filter(ActivityZoneTime.athlete_id == athlete_id)\
+            .filter(ActivityZoneTime.zone_type == zone_type)\
+            .filter(ActivityZoneTime.start_date_local >= datetime.utcnow() - timedelta(days=days))\
+            .group_by(bucket).order_by(bucket).all()
+        
+        distribution = []
+        for period_start, activities, *seconds in rows:
+            seconds = [int(value or 0) for value in seconds]
+            total = sum(seconds)
+            distribution.append({
+                'period_start': period_start.strftime('%Y-%m-%d'),
+                'activities': activities,
+                'total_seconds': total,
+                'zones_seconds': seconds,
+                'zones_percentage': [round(value / total * 100, 1) if total else 0 for value in seconds]
+            })
+        return distribution
+    
+    @staticmethod
+    def get_total_zone_seconds(athlete_id, days, zone_type='power'):
+        """Total des secondes par zone sur la période (None si aucun calcul)"""
+        totals = db.session.query(
+            *[db.func.sum(getattr(ActivityZoneTime, column)) for column in ZONE_COLUMNS]
+        ).filter(ActivityZoneTime.athlete_id == athlete_id)\
+            .filter(ActivityZoneTime.zone_type == zone_type)\
+            .filter(ActivityZoneTime.start_date_local >= datetime.utcnow() - timedelta(days=days)).first()
+        
+        if not totals or totals[0] is None:
+            return None
+        return [int(value or 0) for value in totals]
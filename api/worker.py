@@ -0,0 +1,146 @@
+# Fichier: api/worker.py
+"""
+Worker de synchronisation en arrière-plan
+
+Réclame les jobs de la table sync_jobs avec SELECT ... FOR UPDATE SKIP LOCKED :
+autant de workers que nécessaire peuvent tourner en parallèle, sur un ou plusieurs nœuds.
+Inoccupés, ils vident la file des récupérations détails / streams classée par valeur.
+Usage : python worker.py
+"""
+import os
+import signal
+import socket
+import threading
+import time
+from app import create_app
+from models.database import db
+from services.custom_calculations import CustomCalculationsService
+from services.stats_views_service import StatsViewsService
+from services.sync_queue import SyncQueueService
+
+
+class JobHeartbeat(threading.Thread):
+    """Heartbeat périodique pendant l'exécution d'un job (y compris pendant les attentes de rate limit)"""
+    
+    def __init__(self, queue, job_id, engine, interval=30):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.engine = engine
+        self.interval = interval
+        self.stopped = threading.Event()
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.queue.heartbeat(self.job_id, self.engine)
+            except Exception as e:
+                print(f"Erreur heartbeat job {self.job_id}: {str(e)}")
+    
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    app = create_app()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    stopping = threading.Event()
+    
+    def request_stop(signum, frame):
+        print(f"Worker {worker_id}: arrêt demandé, interruption du job en cours au prochain checkpoint...")
+        stopping.set()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    
+    with app.app_context():
+        db.create_all()
+        converted = StatsViewsService().ensure_materialized()
+        if converted:
+            print(f"Worker {worker_id}: vues matérialisées créées ({', '.join(converted)})")
+        queue = SyncQueueService()
+        poll_seconds = app.config['SYNC_WORKER_POLL_SECONDS']
+        reconcile_check_seconds = app.config['SYNC_RECONCILE_CHECK_SECONDS']
+        fetch_scheduler_enabled = app.config['FETCH_SCHEDULER_ENABLED']
+        stats_views_enabled = app.config['STATS_VIEWS_REFRESH_ENABLED']
+        stats_views_check_seconds = app.config['STATS_VIEWS_CHECK_SECONDS']
+        ftp_recompute_batch = app.config['FTP_RECOMPUTE_BATCH_ATHLETES']
+        next_reconcile_check = 0
+        next_stats_views_check = 0
+        print(f"Worker {worker_id} démarré")
+        
+        while not stopping.is_set():
+            # Planification périodique des réconciliations (dédupliquées entre workers par enqueue)
+            if time.time() >= next_reconcile_check:
+                try:
+                    scheduled = queue.enqueue_due_reconciles()
+                    if scheduled:
+                        print(f"Worker {worker_id}: {scheduled} réconciliation(s) planifiée(s)")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Erreur planification des réconciliations: {str(e)}")
+                next_reconcile_check = time.time() + reconcile_check_seconds
+            
+            # REFRESH groupé des vues de statistiques après les lots de synchronisation
+            if stats_views_enabled and time.time() >= next_stats_views_check:
+                try:
+                    refreshed = StatsViewsService().refresh_due()
+                    if refreshed:
+                        print(f"Worker {worker_id}: vues rafraîchies " +
+                              ', '.join(f"{name} ({ms:.0f} ms)" for name, ms in refreshed.items()))
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Erreur rafraîchissement des vues de statistiques: {str(e)}")
+                finally:
+                    db.session.remove()
+                next_stats_views_check = time.time() + stats_views_check_seconds
+            
+            job = queue.claim_next(worker_id)
+            if not job:
+                # Inoccupé : les jobs restent prioritaires, le budget restant va aux récupérations en attente
+                # et aux métriques à recalculer après une modification de l'historique FTP
+                recomputed = {}
+                try:
+                    recomputed = CustomCalculationsService().recalculate_pending_ftp(ftp_recompute_batch)
+                    if recomputed:
+                        print(f"Worker {worker_id}: {sum(recomputed.values())} activité(s) recalculée(s) "
+                              f"avec l'historique FTP ({len(recomputed)} athlète(s))")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Erreur recalcul historique FTP: {str(e)}")
+                finally:
+                    db.session.remove()
+                fetched = None
+                if fetch_scheduler_enabled:
+                    try:
+                        fetched = queue.run_fetch_batch(should_stop=stopping.is_set)
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Erreur file des récupérations: {str(e)}")
+                    finally:
+                        db.session.remove()
+                if fetched:
+                    print(f"Worker {worker_id}: {fetched['details_stored']} détails, "
+                          f"{fetched['streams_stored']} streams récupérés ({fetched['failed']} échecs)")
+                elif not recomputed:
+                    stopping.wait(poll_seconds)
+                continue
+            
+            job_id = job.id
+            print(f"Worker {worker_id}: job {job_id} ({job.job_type}) athlète {job.athlete_id}")
+            heartbeat = JobHeartbeat(queue, job_id, db.engine)
+            heartbeat.start()
+            started = time.time()
+            status = 'unknown'
+            try:
+                status = queue.run(job, should_stop=stopping.is_set).status
+            finally:
+                heartbeat.stop()
+                db.session.remove()
+            print(f"Worker {worker_id}: job {job_id} terminé ({status}) en {time.time() - started:.1f}s")
+    
+    print(f"Worker {worker_id} arrêté")
+
+
+if __name__ == '__main__':
+    main()
@@ -59,18 +59,23 @@ CREATE TABLE IF NOT EXISTS activity_custom_metrics (
     user_ftp INTEGER NOT NULL,           -- FTP utilisateur au moment du calcul
     user_weight DECIMAL(5,2),           -- Poids utilisateur (optionnel)
     
-    -- TSS et intensité personnalisés (basés sur NP Strava + votre FTP)
+    -- TSS et intensité personnalisés (NP du stream watts ou NP Strava + votre FTP)
+    normalized_power INTEGER,           -- NP utilisée (voir calculation_method)
     custom_tss DECIMAL(8,2),            -- TSS recalculé avec VOTRE FTP
     intensity_factor DECIMAL(5,4),      -- IF = NP_Strava / VOTRE_FTP
     training_load DECIMAL(8,2),         -- Charge d'entraînement personnalisée
+    load_duration_hours DOUBLE PRECISION, -- Durée retenue pour le TSS (recalcul ensembliste au changement de FTP)
+    ftp_version INTEGER,                -- Ligne d'historique FTP utilisée (athlete_ftp_history.id)
     
     -- Records de puissance détectés (basés sur durée + puissance Strava)
     best_1min_power INTEGER,            -- Meilleure puissance 1min estimée
     best_5min_power INTEGER,            -- Meilleure puissance 5min estimée  
     best_20min_power INTEGER,           -- Meilleure puissance 20min estimée
     
-    -- Records de distance (basés sur distance + temps existants)
+    -- Records de distance (meilleurs efforts depuis les streams distance/temps)
+    best_400m_time INTEGER,             -- Meilleur temps 400m (secondes)
     best_1km_time INTEGER,              -- Meilleur temps 1km (secondes)
+    best_1mile_time INTEGER,            -- Meilleur temps 1 mile (secondes)
     best_5km_time INTEGER,              -- Meilleur temps 5km (secondes)
     best_10km_time INTEGER,             -- Meilleur temps 10km (secondes)
     best_half_marathon_time INTEGER,    -- Meilleur temps 21.1km (secondes)
@@ -78,7 +83,7 @@ CREATE TABLE IF NOT EXISTS activity_custom_metrics (
     
     -- Métadonnées
     calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    calculation_method VARCHAR(50) DEFAULT 'strava_based', -- Méthode utilisée
+    calculation_method VARCHAR(50) DEFAULT 'strava_based', -- Méthode utilisée ('stream_np' ou 'strava_based')
     
     UNIQUE(activity_id, athlete_id)
 );
@@ -97,9 +102,370 @@ CREATE TABLE IF NOT EXISTS athlete_settings (
     auto_update_ftp BOOLEAN DEFAULT TRUE,        -- Mise à jour auto FTP basée sur performances
     ftp_test_detection BOOLEAN DEFAULT TRUE,     -- Détection auto tests FTP
     
+    ftp_dirty_from DATE,                -- Métriques à recalculer à partir de ce jour (historique FTP modifié)
+    
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ===================================================
+-- SYNCHRONISATION : BUDGET DE REQUÊTES STRAVA PARTAGÉ
+-- ===================================================
+
+-- Compteurs 15 min / jour partagés par tous les workers (verrou FOR UPDATE par requête)
+CREATE TABLE IF NOT EXISTS strava_rate_limit (
+    bucket VARCHAR(50) PRIMARY KEY,           -- Application Strava ('default')
+    
+    short_window_start TIMESTAMP NOT NULL,    -- Début du quart d'heure courant (UTC)
+    short_count INTEGER NOT NULL DEFAULT 0,   -- Requêtes consommées dans la fenêtre 15 min
+    short_limit INTEGER NOT NULL DEFAULT 100, -- Limite 15 min (X-RateLimit-Limit)
+    
+    daily_window_start TIMESTAMP NOT NULL,    -- Minuit UTC du jour courant
+    daily_count INTEGER NOT NULL DEFAULT 0,   -- Requêtes consommées dans la journée
+    daily_limit INTEGER NOT NULL DEFAULT 1000,-- Limite journalière (X-RateLimit-Limit)
+    
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- File de synchronisation en arrière-plan (workers : SELECT ... FOR UPDATE SKIP LOCKED)
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    athlete_id INTEGER NOT NULL REFERENCES athletes(id) ON DELETE CASCADE,
+    job_type VARCHAR(30) NOT NULL DEFAULT 'athlete_sync',
+    payload JSON,
+    
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',  -- queued, running, completed, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- Report après échec (backoff)
+    worker_id VARCHAR(100),                         -- hostname-pid du worker
+    
+    -- Progression
+    pages_fetched INTEGER NOT NULL DEFAULT 0,
+    activities_inserted INTEGER NOT NULL DEFAULT 0,
+    activities_enriched INTEGER NOT NULL DEFAULT 0,
+    
+    result JSON,
+    error TEXT,
+    
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,                         -- Job abandonné si heartbeat trop ancien
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_claim ON sync_jobs(status, run_after, created_at);
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_athlete ON sync_jobs(athlete_id, job_type, status);
+
+-- Curseur persistant de synchronisation incrémentale par athlète
+CREATE TABLE IF NOT EXISTS athlete_sync_state (
+    athlete_id INTEGER PRIMARY KEY REFERENCES athletes(id) ON DELETE CASCADE,
+    
+    last_after_epoch BIGINT,                  -- Paramètre 'after' de la prochaine sync (epoch UTC)
+    last_page INTEGER,                        -- Dernière page validée (checkpoint)
+    resume_after_epoch BIGINT,                -- Curseur d'une synchronisation en cours (NULL si terminée)
+    
+    last_run_started_at TIMESTAMP,
+    last_run_duration_seconds DOUBLE PRECISION,
+    last_success_at TIMESTAMP,
+    last_reconcile_at TIMESTAMP,              -- Dernière passe activités modifiées / supprimées
+    
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Événements push Strava (webhook) : enregistrés à la réception, traités par les workers
+CREATE TABLE IF NOT EXISTS strava_webhook_events (
+    id BIGSERIAL PRIMARY KEY,
+    subscription_id BIGINT,
+    
+    object_type VARCHAR(20) NOT NULL,         -- activity, athlete
+    object_id BIGINT NOT NULL,                -- strava_id de l'activité ou de l'athlète
+    aspect_type VARCHAR(20) NOT NULL,         -- create, update, delete
+    owner_id BIGINT NOT NULL,                 -- strava_id de l'athlète
+    updates JSON,
+    event_time BIGINT NOT NULL,               -- epoch Strava
+    
+    athlete_id INTEGER REFERENCES athletes(id) ON DELETE CASCADE,
+    job_id BIGINT,                            -- Job 'webhook_event' de sync_jobs
+    
+    status VARCHAR(20) NOT NULL DEFAULT 'received',  -- received, queued, processed, ignored, failed
+    result JSON,
+    error TEXT,
+    
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP,
+    
+    -- Strava relivre les événements non acquittés en 2 s
+    CONSTRAINT uq_strava_webhook_event UNIQUE (object_type, object_id, aspect_type, event_time)
+);
+
+CREATE INDEX IF NOT EXISTS idx_strava_webhook_events_status ON strava_webhook_events(status, received_at);
+
+ALTER TABLE athlete_sync_state ADD COLUMN IF NOT EXISTS resume_after_epoch BIGINT;
+
+-- Index de l'archive des réponses Strava brutes (objets gzip sous data/raw, adressés par SHA-256)
+CREATE TABLE IF NOT EXISTS strava_raw_payloads (
+    id BIGSERIAL PRIMARY KEY,
+    strava_id BIGINT NOT NULL,                -- strava_id de l'activité
+    owner_id BIGINT,                          -- strava_id de l'athlète
+    kind VARCHAR(20) NOT NULL,                -- summary, detail
+    sha256 VARCHAR(64) NOT NULL,              -- data/raw/objects/<2>/<62>.json.gz
+    size_bytes INTEGER,                       -- Taille compressée
+    fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    
+    CONSTRAINT uq_strava_raw_payload UNIQUE (strava_id, kind, sha256)
+);
+
+CREATE INDEX IF NOT EXISTS idx_strava_raw_payloads_lookup ON strava_raw_payloads(strava_id, kind, fetched_at);
+CREATE INDEX IF NOT EXISTS idx_strava_raw_payloads_owner ON strava_raw_payloads(owner_id);
+
+-- Streams seconde par seconde : tableaux typés quantifiés, différentiels et compressés (zlib)
+CREATE TABLE IF NOT EXISTS activity_streams (
+    activity_id INTEGER PRIMARY KEY REFERENCES activity_summary(id) ON DELETE CASCADE,
+    strava_id BIGINT NOT NULL,
+    
+    data BYTEA,                               -- NULL si l'activité n'a pas de streams
+    stream_types VARCHAR(200),                -- 'time,watts,heartrate,...'
+    sample_count INTEGER NOT NULL DEFAULT 0,
+    
+    json_size_bytes INTEGER,                  -- Taille de la réponse JSON Strava
+    stored_size_bytes INTEGER,
+    
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Courbe de puissance moyenne maximale par activité (1 s -> 5 h), depuis le stream watts
+CREATE TABLE IF NOT EXISTS activity_power_curve (
+    activity_id INTEGER REFERENCES activity_summary(id) ON DELETE CASCADE,
+    duration_seconds INTEGER NOT NULL,
+    
+    athlete_id INTEGER NOT NULL,
+    start_date TIMESTAMP NOT NULL,            -- Fenêtres glissantes sans jointure
+    watts INTEGER NOT NULL,
+    
+    calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (activity_id, duration_seconds)
+);
+
+CREATE INDEX IF NOT EXISTS idx_activity_power_curve_athlete ON activity_power_curve(athlete_id, duration_seconds, start_date);
+
+-- Enveloppe puissance-durée maintenue par athlète (window_days = 0 : historique complet)
+CREATE TABLE IF NOT EXISTS athlete_power_envelope (
+    athlete_id INTEGER REFERENCES athletes(id) ON DELETE CASCADE,
+    window_days INTEGER NOT NULL,
+    duration_seconds INTEGER NOT NULL,
+    
+    watts INTEGER NOT NULL,
+    activity_id INTEGER NOT NULL,             -- Activité source (reconstruite à la suppression)
+    start_date TIMESTAMP NOT NULL,            -- Date de la source (expiration des fenêtres)
+    
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (athlete_id, window_days, duration_seconds)
+);
+
+CREATE INDEX IF NOT EXISTS idx_athlete_power_envelope_activity ON athlete_power_envelope(activity_id);
+
+-- Meilleurs efforts 400 m et 1 mile (bases existantes)
+ALTER TABLE activity_custom_metrics ADD COLUMN IF NOT EXISTS best_400m_time INTEGER;
+ALTER TABLE activity_custom_metrics ADD COLUMN IF NOT EXISTS best_1mile_time INTEGER;
+
+-- Normalized Power calculée depuis le stream watts (bases existantes)
+ALTER TABLE activity_custom_metrics ADD COLUMN IF NOT EXISTS normalized_power INTEGER;
+
+-- Durée retenue pour le TSS : recalcul IF / TSS en SQL au changement de FTP (bases existantes)
+ALTER TABLE activity_custom_metrics ADD COLUMN IF NOT EXISTS load_duration_hours DOUBLE PRECISION;
+
+-- Version de FTP des métriques et jours à recalculer (historique FTP, bases existantes)
+ALTER TABLE activity_custom_metrics ADD COLUMN IF NOT EXISTS ftp_version INTEGER;
+ALTER TABLE athlete_settings ADD COLUMN IF NOT EXISTS ftp_dirty_from DATE;
+
+-- Temps passé par zone de puissance / FC par activité (secondes, depuis les streams)
+CREATE TABLE IF NOT EXISTS activity_zone_time (
+    activity_id INTEGER REFERENCES activity_summary(id) ON DELETE CASCADE,
+    zone_type VARCHAR(10) NOT NULL,           -- 'power' ou 'heartrate'
+    
+    athlete_id INTEGER NOT NULL,
+    start_date_local TIMESTAMP NOT NULL,      -- Agrégats semaine/mois sans jointure
+    threshold INTEGER NOT NULL,               -- FTP ou FC max utilisé pour les bornes
+    ftp_version INTEGER,                      -- Ligne d'historique FTP utilisée (zones de puissance)
+    
+    zone_1_seconds INTEGER NOT NULL DEFAULT 0,
+    zone_2_seconds INTEGER NOT NULL DEFAULT 0,
+    zone_3_seconds INTEGER NOT NULL DEFAULT 0,
+    zone_4_seconds INTEGER NOT NULL DEFAULT 0,
+    zone_5_seconds INTEGER NOT NULL DEFAULT 0,
+    
+    calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (activity_id, zone_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_activity_zone_time_athlete ON activity_zone_time(athlete_id, zone_type, start_date_local);
+ALTER TABLE activity_zone_time ADD COLUMN IF NOT EXISTS ftp_version INTEGER;
+
+-- Consultations d'activités (priorité de la file des récupérations Strava)
+CREATE TABLE IF NOT EXISTS activity_views (
+    activity_id INTEGER PRIMARY KEY REFERENCES activity_summary(id) ON DELETE CASCADE,
+    athlete_id INTEGER NOT NULL,
+    
+    view_count INTEGER NOT NULL DEFAULT 1,
+    last_viewed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_activity_views_athlete ON activity_views(athlete_id, last_viewed_at);
+
+-- Récupérations Strava en échec : reportées (délai doublé), abandonnées après plusieurs 4xx
+CREATE TABLE IF NOT EXISTS activity_fetch_failures (
+    activity_id INTEGER REFERENCES activity_summary(id) ON DELETE CASCADE,
+    kind VARCHAR(10) NOT NULL,                -- 'detail' ou 'streams'
+    athlete_id INTEGER NOT NULL,
+    
+    attempts INTEGER NOT NULL DEFAULT 1,
+    last_status INTEGER,                      -- NULL : erreur réseau ou token
+    last_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    next_retry_at TIMESTAMP,                  -- NULL : abandonnée (activité privée ou supprimée)
+    
+    PRIMARY KEY (activity_id, kind)
+);
+
+-- Tracés des activités (map.summary_polyline décodée en int32 lat/lng entrelacés)
+CREATE TABLE IF NOT EXISTS activity_routes (
+    activity_id INTEGER PRIMARY KEY REFERENCES activity_summary(id) ON DELETE CASCADE,
+    athlete_id INTEGER NOT NULL,
+    
+    summary_polyline TEXT NOT NULL,
+    coords BYTEA NOT NULL,
+    point_count INTEGER NOT NULL,
+    
+    -- Emprise du tracé
+    min_lat DOUBLE PRECISION NOT NULL,
+    min_lng DOUBLE PRECISION NOT NULL,
+    max_lat DOUBLE PRECISION NOT NULL,
+    max_lng DOUBLE PRECISION NOT NULL,
+    
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_activity_routes_athlete_id ON activity_routes(athlete_id);
+
+-- Index spatial : tuiles Web Mercator (zoom 14) traversées par chaque tracé
+CREATE TABLE IF NOT EXISTS activity_route_tiles (
+    athlete_id INTEGER NOT NULL,
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    activity_id INTEGER REFERENCES activity_summary(id) ON DELETE CASCADE,
+    
+    PRIMARY KEY (athlete_id, tile_x, tile_y, activity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_activity_route_tiles_activity ON activity_route_tiles(activity_id);
+
+-- Tuiles de heatmap pré-calculées par athlète (PNG 256x256)
+CREATE TABLE IF NOT EXISTS athlete_heatmap_tiles (
+    athlete_id INTEGER NOT NULL,
+    zoom INTEGER NOT NULL,
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    
+    png BYTEA NOT NULL,
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    max_count INTEGER NOT NULL DEFAULT 0,
+    
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (athlete_id, zoom, tile_x, tile_y)
+);
+
+-- Montées détectées dans les streams distance / altitude (services/stream_analysis.py)
+CREATE TABLE IF NOT EXISTS activity_climbs (
+    id SERIAL PRIMARY KEY,
+    activity_id INTEGER NOT NULL REFERENCES activity_summary(id) ON DELETE CASCADE,
+    climb_index INTEGER NOT NULL,
+    
+    athlete_id INTEGER NOT NULL,
+    start_date_local TIMESTAMP NOT NULL,
+    
+    start_distance_m FLOAT NOT NULL,
+    end_distance_m FLOAT NOT NULL,
+    length_m FLOAT NOT NULL,
+    elevation_gain_m FLOAT NOT NULL,
+    start_altitude_m FLOAT,
+    end_altitude_m FLOAT,
+    average_grade FLOAT NOT NULL,
+    max_grade FLOAT,
+    duration_s INTEGER,
+    vam FLOAT,
+    category VARCHAR(2),
+    
+    start_lat FLOAT,
+    start_lng FLOAT,
+    end_lat FLOAT,
+    end_lng FLOAT,
+    
+    calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    CONSTRAINT uq_activity_climbs_activity_index UNIQUE (activity_id, climb_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_activity_climbs_athlete_grade ON activity_climbs(athlete_id, average_grade);
+CREATE INDEX IF NOT EXISTS idx_activity_climbs_athlete_gain ON activity_climbs(athlete_id, elevation_gain_m);
+
+-- Série quotidienne CTL / ATL / TSB (services/training_load_service.py)
+CREATE TABLE IF NOT EXISTS athlete_daily_load (
+    athlete_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    
+    tss FLOAT NOT NULL DEFAULT 0,
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    ctl FLOAT NOT NULL,
+    atl FLOAT NOT NULL,
+    tsb FLOAT NOT NULL,
+    
+    PRIMARY KEY (athlete_id, day)
+);
+
+-- Avancement de la série : dernier jour calculé, premier jour à recalculer
+CREATE TABLE IF NOT EXISTS athlete_load_state (
+    athlete_id INTEGER PRIMARY KEY,
+    computed_through DATE,
+    dirty_from DATE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Agrégats jour / semaine / mois par type de sport (services/rollup_service.py)
+CREATE TABLE IF NOT EXISTS athlete_activity_rollups (
+    athlete_id INTEGER NOT NULL,
+    period VARCHAR(5) NOT NULL,          -- 'day', 'week' ou 'month'
+    period_start DATE NOT NULL,
+    activity_type VARCHAR(50) NOT NULL,
+    
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    distance_km FLOAT NOT NULL DEFAULT 0,
+    moving_hours FLOAT NOT NULL DEFAULT 0,
+    elevation_m FLOAT NOT NULL DEFAULT 0,
+    tss FLOAT NOT NULL DEFAULT 0,
+    
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (athlete_id, period, period_start, activity_type)
+);
+
+-- Historique des FTP par date d'effet : TSS / IF de chaque activité avec le FTP en vigueur à sa date
+CREATE TABLE IF NOT EXISTS athlete_ftp_history (
+    id SERIAL PRIMARY KEY,              -- Version référencée par activity_custom_metrics.ftp_version
+    athlete_id INTEGER NOT NULL REFERENCES athletes(id) ON DELETE CASCADE,
+    effective_date DATE NOT NULL,       -- En vigueur jusqu'à la ligne suivante
+    ftp INTEGER NOT NULL,
+    threshold_heartrate INTEGER,
+    source VARCHAR(20) DEFAULT 'manual', -- 'manual', 'settings' ou 'initial' (reprise des métriques existantes)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    CONSTRAINT uq_athlete_ftp_history_date UNIQUE (athlete_id, effective_date)
+);
+
+-- Empreinte des champs modifiables sur Strava (upsert uniquement si changement)
+ALTER TABLE activity_summary ADD COLUMN IF NOT EXISTS sync_hash VARCHAR(32);
+
 -- Index optimisés pour les nouvelles données
 CREATE INDEX IF NOT EXISTS idx_activity_summary_athlete_date 
 ON activity_summary(athlete_id, start_date_local);
@@ -145,9 +511,12 @@ CREATE INDEX IF NOT EXISTS idx_custom_metrics_if ON activity_custom_metrics(inte
 -- ===================================================
 -- VUES ENRICHIES AVEC MÉTRIQUES STRAVA ET PERSONNALISÉES
 -- ===================================================
+-- Vues matérialisées (activités enrichies, records, calendrier) : rafraîchies
+-- CONCURRENTLY par les workers après les lots de synchronisation
+-- (services/stats_views_service.py, écritures en attente dans stats_view_changes)
 
 -- Vue enrichie avec métriques Strava
-CREATE OR REPLACE VIEW activity_with_strava_metrics AS
+CREATE MATERIALIZED VIEW IF NOT EXISTS activity_with_strava_metrics AS
 SELECT 
     a.*,
     -- Métriques Strava natives
@@ -196,7 +565,7 @@ FROM activity_summary a
 LEFT JOIN activity_strava_metrics sm ON a.id = sm.activity_id;
 
 -- Vue enrichie avec calculs personnalisés
-CREATE OR REPLACE VIEW activity_with_custom_metrics AS
+CREATE MATERIALIZED VIEW IF NOT EXISTS activity_with_custom_metrics AS
 SELECT 
     a.*,
     sm.weighted_average_watts,
@@ -240,7 +609,7 @@ LEFT JOIN activity_strava_metrics sm ON a.id = sm.activity_id
 LEFT JOIN activity_custom_metrics cm ON a.id = cm.activity_id;
 
 -- Vue résumé records personnels
-CREATE OR REPLACE VIEW athlete_personal_records AS
+CREATE MATERIALIZED VIEW IF NOT EXISTS athlete_personal_records AS
 SELECT 
     athlete_id,
     
@@ -337,7 +706,7 @@ LEFT JOIN activity_custom_metrics cm ON a.id = cm.activity_id
 GROUP BY a.athlete_id, a.day_name, a.day_of_week;
 
 -- Vue pour le calendrier des activités enrichie
-CREATE OR REPLACE VIEW calendar_view AS
+CREATE MATERIALIZED VIEW IF NOT EXISTS calendar_view AS
 SELECT 
     a.athlete_id,
     a.start_date_local::date as activity_date,
@@ -364,7 +733,7 @@ LEFT JOIN activity_custom_metrics cm ON a.id = cm.activity_id
 GROUP BY a.athlete_id, a.start_date_local::date, a.year, a.month, a.month_name, a.day, a.day_name;
 
 -- Vue pour les records personnels enrichie
-CREATE OR REPLACE VIEW personal_records AS
+CREATE MATERIALIZED VIEW IF NOT EXISTS personal_records AS
 SELECT 
     a.athlete_id,
     a.type,
@@ -396,6 +765,36 @@ LEFT JOIN activity_strava_metrics sm ON a.id = sm.activity_id
 LEFT JOIN activity_custom_metrics cm ON a.id = cm.activity_id
 GROUP BY a.athlete_id, a.type;
 
+-- Index uniques des vues matérialisées (requis par REFRESH ... CONCURRENTLY) et lecture par athlète
+CREATE UNIQUE INDEX IF NOT EXISTS ux_activity_with_strava_metrics_id ON activity_with_strava_metrics(id);
+CREATE INDEX IF NOT EXISTS ix_activity_with_strava_metrics_athlete_id_start_date_local ON activity_with_strava_metrics(athlete_id, start_date_local);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_activity_with_custom_metrics_id ON activity_with_custom_metrics(id);
+CREATE INDEX IF NOT EXISTS ix_activity_with_custom_metrics_athlete_id_start_date_local ON activity_with_custom_metrics(athlete_id, start_date_local);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_athlete_personal_records_athlete_id ON athlete_personal_records(athlete_id);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_calendar_view_athlete_id_activity_date ON calendar_view(athlete_id, activity_date);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_personal_records_athlete_id_type ON personal_records(athlete_id, type);
+
+-- Dernier REFRESH de chaque vue matérialisée (écrit uniquement par le worker qui rafraîchit)
+CREATE TABLE IF NOT EXISTS stats_view_refresh (
+    view_name VARCHAR(64) PRIMARY KEY,
+    last_refreshed_at TIMESTAMP,
+    last_refresh_ms DOUBLE PRECISION,
+    refresh_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Écritures pas encore reflétées par les vues : une ligne par transaction d'écriture,
+-- supprimée par le REFRESH qui l'a prise en compte (pas de ligne partagée entre workers)
+CREATE TABLE IF NOT EXISTS stats_view_changes (
+    id BIGSERIAL PRIMARY KEY,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO stats_view_refresh (view_name, refresh_count, last_refreshed_at)
+SELECT view_name, 0, NOW()
+FROM unnest(ARRAY['activity_with_strava_metrics', 'activity_with_custom_metrics',
+                  'athlete_personal_records', 'calendar_view', 'personal_records']) AS view_name
+ON CONFLICT (view_name) DO NOTHING;
+
 -- ===================================================
 -- FONCTIONS UTILITAIRES
 -- ===================================================
@@ -505,9 +904,9 @@ COMMENT ON COLUMN activity_strava_metrics.trainer IS 'TRUE = activité sur home
 COMMENT ON COLUMN activity_strava_metrics.commute IS 'TRUE = trajet domicile-travail';
 
 COMMENT ON COLUMN activity_custom_metrics.custom_tss IS 'TSS recalculé avec FTP utilisateur au lieu de estimation Strava';
-COMMENT ON COLUMN activity_custom_metrics.intensity_factor IS 'IF = Normalized Power Strava / FTP utilisateur';
+COMMENT ON COLUMN activity_custom_metrics.intensity_factor IS 'IF = Normalized Power (stream watts ou Strava) / FTP utilisateur';
 COMMENT ON COLUMN activity_custom_metrics.best_1min_power IS 'Estimation meilleure puissance 1min basée sur NP et durée';
-COMMENT ON COLUMN activity_custom_metrics.best_1km_time IS 'Temps détecté pour distance 1km si activité correspond';
+COMMENT ON COLUMN activity_custom_metrics.best_1km_time IS 'Meilleur effort 1km trouvé dans le stream distance/temps';
 
 -- Statistiques pour l'optimiseur de requêtes
 CREATE STATISTICS IF NOT EXISTS activity_summary_stats 